@@ -5,7 +5,8 @@ from django.shortcuts import render, redirect
 from django.urls import path
 from django.contrib import messages
 from django.template.response import TemplateResponse
-from .models import User, NewsArticle, FetchLog
+from bson import ObjectId
+from .models import User, NewsArticle, FetchLog, SentimentLabel, SchedulerLock
 from .news_fetcher import NewsAggregator
 from datetime import datetime
 
@@ -68,6 +69,8 @@ def news_articles_view(request):
     # Get articles
     skip = (page - 1) * per_page
     articles = NewsArticle.get_all(filters=filters, limit=per_page, skip=skip)
+    for article in articles:
+        article['id'] = article['_id']  # Templates can't read underscore keys
     
     # Get total count
     total_count = NewsArticle.get_collection().count_documents(filters)
@@ -129,28 +132,74 @@ def fetch_news_view(request):
     return redirect('/admin/news-articles/')
 
 
+def label_article_view(request):
+    """Correct an article's sentiment; the correction becomes a training label"""
+    if request.method == 'POST':
+        article_id = request.POST.get('article_id')
+        sentiment = request.POST.get('sentiment', '').lower()
+        article = NewsArticle.get_by_id(article_id) if article_id and ObjectId.is_valid(article_id) else None
+        
+        if article and sentiment in SentimentLabel.LABELS:
+            NewsArticle.update_sentiment(article_id, sentiment)
+            description = article.get('description')
+            text = f"{article['title']}. {description}" if description else article['title']
+            SentimentLabel.upsert_many([(article_id, text, sentiment)], source='admin')
+            messages.success(request, f'✓ Sentiment set to {sentiment} and saved as a training label')
+        else:
+            messages.error(request, '✗ Invalid article or sentiment')
+    
+    return redirect(request.META.get('HTTP_REFERER') or '/admin/news-articles/')
+
+
 def fetch_history_view(request):
-    """Display news fetch history"""
+    """Display news fetch history and today's usage of each provider's quota"""
+    from .fetch_planner import FetchPlanner
+    
     logs = FetchLog.get_all(limit=50)
     
     context = {
         **admin.site.each_context(request),
         'title': 'Fetch History',
         'logs': logs,
+        'providers': list(FetchPlanner().status().values()),
     }
     return TemplateResponse(request, 'admin/fetch_history.html', context)
 
 
+def scheduler_locks_view(request):
+    """Display scheduler job leases (which replica runs / last ran each job)"""
+    from .scheduler import scheduler
+    
+    now = datetime.utcnow()
+    locks = SchedulerLock.get_all()
+    for lock in locks:
+        lock['job_id'] = lock['_id']  # Templates can't read underscore keys
+        lock['active'] = lock['expires_at'] > now and not lock.get('released_at')
+    
+    jobs = [
+        {'id': job.id, 'name': job.name, 'next_run_time': job.next_run_time}
+        for job in scheduler.get_jobs()
+    ] if scheduler.running else []
+    
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Scheduler Locks',
+        'locks': locks,
+        'jobs': jobs,
+        'now': now,
+    }
+    return TemplateResponse(request, 'admin/scheduler_locks.html', context)
+
+
 def analytics_view(request):
-    """Display most viewed articles"""
-    # Get top 50 most viewed articles
+    """Display trending articles (time-decayed views, likes and saves)"""
+    # Get top 50 trending articles (precomputed by the trending job)
     articles = NewsArticle.get_all(
-        sort_by='view_count',
+        filters={'trending_score': {'$gt': 0}},
+        sort_by='trending_score',
         sort_order=-1,
         limit=50
     )
-    # Filter out articles with 0 views
-    articles = [a for a in articles if a.get('view_count', 0) > 0]
     
     context = {
         **admin.site.each_context(request),
@@ -168,11 +217,14 @@ original_get_urls = AdminSite.get_urls
 def custom_get_urls(self):
     urls = original_get_urls(self)
     from django.urls import path
+    # admin_view: staff login required, CSRF protected, never cached
     custom_urls = [
-        path('news-articles/', news_articles_view, name='news_articles'),
-        path('news-articles/fetch/', fetch_news_view, name='fetch_news'),
-        path('fetch-history/', fetch_history_view, name='fetch_history'),
-        path('analytics/', analytics_view, name='analytics'),
+        path('news-articles/', self.admin_view(news_articles_view), name='news_articles'),
+        path('news-articles/fetch/', self.admin_view(fetch_news_view), name='fetch_news'),
+        path('news-articles/label/', self.admin_view(label_article_view), name='label_article'),
+        path('fetch-history/', self.admin_view(fetch_history_view), name='fetch_history'),
+        path('analytics/', self.admin_view(analytics_view), name='analytics'),
+        path('scheduler-locks/', self.admin_view(scheduler_locks_view), name='scheduler_locks'),
     ]
     return custom_urls + urls
 
@@ -0,0 +1,62 @@
+"""
+Compact Bloom filter used as a per-user "already seen" article set
+Fixed-size bit array + double hashing, serializable to raw bytes for MongoDB
+"""
+
+import math
+import hashlib
+
+
+class BloomFilter:
+    """
+    Probabilistic set membership: no false negatives, tunable false positive rate
+    A false positive only means an unseen article is skipped, which is acceptable
+    for recommendation exclusion.
+    """
+
+    def __init__(self, num_bits, num_hashes, capacity, bits=None, count=0):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.capacity = capacity
+        self.bits = bytearray(bits) if bits is not None else bytearray((num_bits + 7) // 8)
+        self.count = count
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate=0.01):
+        """Size the filter for `capacity` items at the given false positive rate"""
+        capacity = max(capacity, 1)
+        num_bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        num_hashes = max(1, int(round(num_bits / capacity * math.log(2))))
+        return cls(num_bits, num_hashes, capacity)
+
+    @property
+    def is_full(self):
+        """True once more items were added than the filter was sized for"""
+        return self.count > self.capacity
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(str(item).encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item):
+        """Add an item; returns True if it was not (probably) present before"""
+        added = False
+        for pos in self._positions(item):
+            byte, mask = pos >> 3, 1 << (pos & 7)
+            if not self.bits[byte] & mask:
+                self.bits[byte] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def __len__(self):
+        return self.count
+
+    def to_bytes(self):
+        return bytes(self.bits)
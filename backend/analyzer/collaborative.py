@@ -0,0 +1,235 @@
+"""
+Collaborative Filtering Recommender
+Implicit-feedback matrix factorization (ALS) trained offline on interaction logs
+
+Interactions from article_views / article_likes / article_saves are folded into a
+sparse user x article matrix using the same weights as the category engine
+(save=5, like=3, view=1). Training produces compact float32 factor arrays that are
+saved to disk; online scoring is a single dot product plus top-k selection.
+"""
+
+import os
+import time
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+
+from .models import UserInteraction
+
+logger = logging.getLogger(__name__)
+
+
+def build_interaction_matrix(interactions):
+    """
+    Build a sparse user x article matrix from interaction dicts
+    Returns: (csr_matrix, user_ids, item_ids)
+    """
+    user_index = {}
+    item_index = {}
+    rows, cols, values = [], [], []
+
+    for interaction in interactions:
+        user_id = interaction.get('user_id')
+        article_id = interaction.get('article_id')
+        if user_id is None or not article_id:
+            continue
+
+        rows.append(user_index.setdefault(user_id, len(user_index)))
+        cols.append(item_index.setdefault(str(article_id), len(item_index)))
+        values.append(UserInteraction.WEIGHTS.get(interaction.get('interaction_type'), 1))
+
+    # Duplicate (user, item) pairs are summed by the COO -> CSR conversion
+    matrix = sparse.coo_matrix(
+        (np.asarray(values, dtype=np.float32), (rows, cols)),
+        shape=(len(user_index), len(item_index))
+    ).tocsr()
+
+    user_ids = np.array(list(user_index.keys()))
+    item_ids = np.array(list(item_index.keys()))
+    return matrix, user_ids, item_ids
+
+
+def _als_step(confidence, fixed, regularization):
+    """
+    Solve one side of implicit ALS (Hu, Koren & Volinsky 2008)
+    confidence: csr matrix (n_solve x n_fixed) of raw interaction weights * alpha
+    fixed: factor matrix of the other side (n_fixed x k)
+    """
+    n_solve = confidence.shape[0]
+    k = fixed.shape[1]
+    solved = np.zeros((n_solve, k), dtype=np.float32)
+
+    gram = fixed.T @ fixed + regularization * np.eye(k, dtype=np.float32)
+
+    for row in range(n_solve):
+        start, end = confidence.indptr[row], confidence.indptr[row + 1]
+        if start == end:
+            continue
+        cols = confidence.indices[start:end]
+        conf = confidence.data[start:end]
+        factors = fixed[cols]
+
+        # A = Y^T Y + Y_u^T (C_u - I) Y_u + lambda I ; b = Y_u^T C_u p_u  (p_u = 1)
+        a = gram + (factors.T * conf) @ factors
+        b = factors.T @ (conf + 1.0)
+        solved[row] = np.linalg.solve(a, b)
+
+    return solved
+
+
+def train_als(matrix, factors=32, iterations=10, regularization=0.1, alpha=10.0, seed=42):
+    """
+    Factorize a sparse interaction matrix with implicit-feedback ALS
+    Returns: (user_factors, item_factors) as float32 arrays
+    """
+    rng = np.random.default_rng(seed)
+    n_users, n_items = matrix.shape
+
+    user_factors = (rng.standard_normal((n_users, factors)) * 0.01).astype(np.float32)
+    item_factors = (rng.standard_normal((n_items, factors)) * 0.01).astype(np.float32)
+
+    confidence = (matrix * alpha).tocsr().astype(np.float32)
+    confidence_t = confidence.T.tocsr()
+
+    for _ in range(iterations):
+        user_factors = _als_step(confidence, item_factors, regularization)
+        item_factors = _als_step(confidence_t, user_factors, regularization)
+
+    return user_factors, item_factors
+
+
+class CFModel:
+    """Trained user and item factors with an id -> row lookup"""
+
+    def __init__(self, user_ids, item_ids, user_factors, item_factors, trained_at=None):
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.trained_at = trained_at
+        self._user_rows = {self._user_key(user_id): row for row, user_id in enumerate(user_ids)}
+
+    @staticmethod
+    def _user_key(user_id):
+        return str(user_id)
+
+    def has_user(self, user_id):
+        return self._user_key(user_id) in self._user_rows
+
+    def recommend(self, user_id, limit=20, exclude=None):
+        """
+        Score every known article for a user and return the top `limit` article ids
+        Articles in `exclude` (e.g. already seen) are skipped
+        """
+        row = self._user_rows.get(self._user_key(user_id))
+        if row is None or limit <= 0 or len(self.item_ids) == 0:
+            return []
+
+        exclude = exclude or set()
+        scores = self.item_factors @ self.user_factors[row]
+
+        # Over-select so excluded items can be dropped without a full sort
+        k = min(len(scores), limit + len(exclude))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        result = []
+        for idx in top:
+            article_id = self.item_ids[idx]
+            if article_id in exclude:
+                continue
+            result.append(str(article_id))
+            if len(result) >= limit:
+                break
+        return result
+
+    def save(self, path):
+        """Write factors atomically so readers never see a partial file"""
+        path = Path(path)
+        tmp_path = path.with_suffix('.tmp.npz')
+        np.savez_compressed(
+            tmp_path,
+            user_ids=np.array([self._user_key(u) for u in self.user_ids]),
+            item_ids=self.item_ids.astype(str),
+            user_factors=self.user_factors.astype(np.float32),
+            item_factors=self.item_factors.astype(np.float32),
+            trained_at=np.array(self.trained_at.isoformat() if self.trained_at else '')
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            trained_at = str(data['trained_at'])
+            return cls(
+                user_ids=data['user_ids'],
+                item_ids=data['item_ids'],
+                user_factors=data['user_factors'],
+                item_factors=data['item_factors'],
+                trained_at=datetime.fromisoformat(trained_at) if trained_at else None
+            )
+
+
+def train_cf_model(days=None, factors=None, iterations=None):
+    """
+    Train the CF model on recent interaction logs and save it to CF_MODEL_PATH
+    Returns the trained CFModel, or None if there is not enough data
+    """
+    days = days or settings.CF_TRAINING_DAYS
+    factors = factors or settings.CF_FACTORS
+    iterations = iterations or settings.CF_ITERATIONS
+
+    start = time.time()
+    since = datetime.utcnow() - timedelta(days=days)
+    matrix, user_ids, item_ids = build_interaction_matrix(UserInteraction.iter_all(since=since))
+
+    if matrix.nnz == 0:
+        logger.info("No interactions available, skipping CF training")
+        return None
+
+    user_factors, item_factors = train_als(
+        matrix,
+        factors=factors,
+        iterations=iterations,
+        regularization=settings.CF_REGULARIZATION,
+        alpha=settings.CF_ALPHA
+    )
+
+    model = CFModel(user_ids, item_ids, user_factors, item_factors, trained_at=datetime.utcnow())
+    model.save(settings.CF_MODEL_PATH)
+
+    logger.info(
+        f"CF model trained on {matrix.nnz} interactions "
+        f"({matrix.shape[0]} users x {matrix.shape[1]} articles) in {time.time() - start:.1f}s"
+    )
+    return model
+
+
+_cf_model = None
+_cf_model_mtime = None
+
+
+def get_cf_model():
+    """
+    Get the trained CF model, reloading it when the file on disk changes
+    Returns None if no model has been trained yet
+    """
+    global _cf_model, _cf_model_mtime
+    path = Path(settings.CF_MODEL_PATH)
+
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+    if _cf_model is None or mtime != _cf_model_mtime:
+        try:
+            _cf_model = CFModel.load(path)
+            _cf_model_mtime = mtime
+        except Exception as e:
+            logger.error(f"Error loading CF model: {e}")
+    return _cf_model
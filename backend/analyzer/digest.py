@@ -0,0 +1,169 @@
+"""
+Daily digest generation with shared queries
+
+One DigestRun is created per scheduler run:
+- The top articles of each category are queried once and shared by every user
+- Subscribed profiles are streamed with a single cursor
+- Users are looked up in chunks (one query per chunk, not per profile)
+- Each digest is assembled in memory from the shared article sets, with one
+  article per story cluster
+- Templates are compiled once; each article's card HTML is rendered once per run
+  and every digest body is a single join of cached cards, so rendering cost
+  scales with unique articles rather than users x articles
+"""
+
+import logging
+from html import escape
+from string import Template
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING
+
+from .models import User, UserProfile, NewsArticle
+from .story_clusters import dedupe_by_cluster
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATEGORIES = ['general', 'technology']
+# Sentiments are stored lowercase by the analyzers; older rows may be capitalized
+DIGEST_SENTIMENTS = ['positive', 'neutral', 'Positive', 'Neutral']
+
+
+DIGEST_TEMPLATE = Template("""
+            <html>
+                <body>
+                    <h1>Your Daily AI News Digest</h1>
+                    <p>Here are the top stories for you today based on your preferences:</p>
+                    <br>
+                    $articles_html
+                    <br>
+                    <p><a href="http://localhost:5173">View more on AI News Analyzer</a></p>
+                    <p style="font-size: 10px; color: #999;">
+                        You received this email because you subscribed to daily digests.
+                        <a href="http://localhost:5173/profile">Manage preferences</a>
+                    </p>
+                </body>
+            </html>
+            """)
+
+CARD_TEMPLATE = Template("""
+                <div style="margin-bottom: 20px; border-bottom: 1px solid #eee; padding-bottom: 10px;">
+                    <h3><a href="$url">$title</a></h3>
+                    <p style="color: #666; font-size: 12px;">
+                        $source | $category |
+                        Sentiment: <strong>$sentiment</strong>
+                    </p>
+                    <p>$description</p>
+                </div>
+                """)
+
+
+def render_card(article):
+    """HTML card of one article (fields are HTML-escaped)"""
+    return CARD_TEMPLATE.substitute(
+        url=escape(article.get('url') or ''),
+        title=escape(article.get('title') or ''),
+        source=escape(article.get('source') or ''),
+        category=escape((article.get('category') or '').title()),
+        sentiment=escape(article.get('sentiment') or ''),
+        description=escape(article.get('description') or '')
+    )
+
+
+def digest_categories(profile):
+    """Notification categories, falling back to favorites, then the defaults"""
+    return (
+        profile.get('notification_categories')
+        or profile.get('favorite_categories')
+        or DEFAULT_CATEGORIES
+    )
+
+
+class DigestRun:
+    """Shared state for one digest run"""
+
+    def __init__(self, per_category=3, hours=24, user_chunk_size=500):
+        self.per_category = per_category
+        self.since = datetime.utcnow() - timedelta(hours=hours)
+        self.user_chunk_size = user_chunk_size
+        self._articles_by_category = {}
+        self._cards = {}  # article id -> rendered card HTML
+
+    def category_articles(self, category):
+        """Top recent positive/neutral articles of a category, one per story (queried once per run)"""
+        if category not in self._articles_by_category:
+            articles = NewsArticle.get_all(
+                filters={
+                    'category': category,
+                    'published_at': {'$gte': self.since},
+                    # Prefer positive/neutral news for digest
+                    'sentiment': {'$in': DIGEST_SENTIMENTS}
+                },
+                # Extra candidates so several versions of one story don't crowd out the rest
+                limit=self.per_category * 3,
+                sort_by='sentiment_confidence'
+            )
+            self._articles_by_category[category] = dedupe_by_cluster(articles, limit=self.per_category)
+        return self._articles_by_category[category]
+
+    def articles_for(self, profile):
+        """A user's digest articles, deduplicated by URL and story cluster"""
+        unique = {}
+        for category in digest_categories(profile):
+            for article in self.category_articles(category):
+                unique.setdefault(article['url'], article)
+        return dedupe_by_cluster(unique.values())
+
+    def card_html(self, article):
+        """Card HTML of an article, rendered once per run"""
+        html = self._cards.get(article['_id'])
+        if html is None:
+            html = self._cards[article['_id']] = render_card(article)
+        return html
+
+    def render(self, articles):
+        """HTML body of a digest: one join of cached cards into the compiled template"""
+        return DIGEST_TEMPLATE.substitute(articles_html=''.join(map(self.card_html, articles)))
+
+    @staticmethod
+    def subscribed_profiles_query():
+        # Frequency: simplified for now to just daily (missing means daily)
+        return {
+            'notification_enabled': {'$ne': False},
+            'notification_frequency': {'$in': ['daily', None]},
+        }
+
+    def iter_recipients(self, query=None):
+        """Yield (user, profile) for every active user subscribed to daily digests"""
+        for _, recipients in self.iter_recipient_chunks(query):
+            yield from recipients
+
+    def iter_recipient_chunks(self, query=None):
+        """
+        Yield (last profile user_id, [(user, profile), ...]) per chunk of profiles, in user_id order
+        Profiles come from one cursor; users are fetched per chunk of profiles
+        """
+        projection = {'user_id': 1, 'notification_categories': 1, 'favorite_categories': 1}
+        cursor = UserProfile.get_collection().find(
+            query or self.subscribed_profiles_query(), projection
+        ).sort('user_id', ASCENDING).batch_size(self.user_chunk_size)
+
+        chunk = []
+        for profile in cursor:
+            chunk.append(profile)
+            if len(chunk) >= self.user_chunk_size:
+                yield chunk[-1]['user_id'], list(self._with_users(chunk))
+                chunk = []
+        if chunk:
+            yield chunk[-1]['user_id'], list(self._with_users(chunk))
+
+    @staticmethod
+    def _with_users(profiles):
+        users = User.objects.filter(
+            id__in=[profile['user_id'] for profile in profiles], is_active=True
+        ).only('id', 'email', 'username')
+        users_by_id = {user.id: user for user in users}
+        for profile in profiles:
+            user = users_by_id.get(profile['user_id'])
+            if user:
+                yield user, profile
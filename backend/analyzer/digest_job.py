@@ -0,0 +1,165 @@
+"""
+Sharded, resumable daily digest job
+
+A run (one per day, run_id 'daily_digest:<date>') is split into user_id ranges
+stored in the digest_shards collection. Workers, in this process or on other
+replicas, claim shards with a lease and process them chunk by chunk:
+
+1. Skip users that already have an EmailLog entry for this run (idempotency)
+2. Send the chunk through the EmailDispatcher and wait for it
+3. Checkpoint the last user_id and renew the lease
+
+A restarted run skips finished shards and resumes running ones from their
+checkpoint once the previous owner's lease expires.
+"""
+
+import os
+import uuid
+import socket
+import logging
+import threading
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection
+
+from .models import UserProfile, DigestShard, EmailLog
+from .digest import DigestRun
+from .email_dispatch import EmailDispatcher, EmailMessage, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+SUBJECT = "Your Daily AI News Digest"
+
+
+def daily_run_id(date=None):
+    """Run id of the daily digest for a date (today by default)"""
+    return f"daily_digest:{(date or datetime.utcnow()).strftime('%Y-%m-%d')}"
+
+
+def user_id_ranges(num_shards):
+    """
+    Split subscribed users into num_shards equal-width user_id ranges
+    The first and last ranges are open-ended so users added mid-run are covered
+    """
+    collection = UserProfile.get_collection()
+    query = DigestRun.subscribed_profiles_query()
+    first = collection.find_one(query, {'user_id': 1}, sort=[('user_id', 1)])
+    last = collection.find_one(query, {'user_id': 1}, sort=[('user_id', -1)])
+    if not first:
+        return [(None, None)]
+
+    low, high = first['user_id'], last['user_id'] + 1
+    width = max(-(-(high - low) // num_shards), 1)
+    bounds = list(range(low, high, width))[1:]
+    edges = [None] + bounds + [None]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def is_incomplete(run_id):
+    """True if the run was started but still has unfinished shards"""
+    summary = DigestShard.summary(run_id)
+    return summary['shards'] > 0 and summary['done'] < summary['shards']
+
+
+class DigestJob:
+    """Processes the shards of one digest run with a pool of worker threads"""
+
+    def __init__(self, email_service, run_id=None, num_shards=None, workers=None, lease_seconds=None):
+        self.email_service = email_service
+        self.run_id = run_id or daily_run_id()
+        self.num_shards = num_shards or settings.DIGEST_SHARDS
+        self.workers = workers or settings.DIGEST_WORKERS
+        self.lease_seconds = lease_seconds or settings.DIGEST_SHARD_LEASE_SECONDS
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Shared by all workers: one article query and one card render per run
+        self.content = DigestRun()
+        self.bucket = TokenBucket(settings.EMAIL_RATE_LIMIT, settings.EMAIL_RATE_BURST)
+        self.sent_count = 0
+        self._lock = threading.Lock()
+
+    def run(self):
+        """Create the run's shards (once) and work until none is left to claim"""
+        DigestShard.create_run(self.run_id, user_id_ranges(self.num_shards))
+
+        threads = [
+            threading.Thread(target=self._worker, name=f'digest-worker-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        summary = DigestShard.summary(self.run_id)
+        logger.info(
+            f"Digest run {self.run_id}: {summary['done']}/{summary['shards']} shards done, "
+            f"{self.sent_count} sent by this worker pool, {summary['sent_count']} in total"
+        )
+        return self.sent_count
+
+    def _worker(self):
+        sender = {"name": self.email_service.sender_name, "email": self.email_service.sender_email}
+        try:
+            with EmailDispatcher(self.email_service.api_instance, sender, bucket=self.bucket) as dispatcher:
+                while True:
+                    shard = DigestShard.claim(self.run_id, self.owner, self.lease_seconds)
+                    if not shard:
+                        return
+                    try:
+                        self._process_shard(shard, dispatcher)
+                    except Exception as e:
+                        # Lease expires and the shard is resumed from its checkpoint
+                        logger.error(f"Error in digest shard {shard['shard']} of {self.run_id}: {e}")
+        finally:
+            connection.close()  # Thread-local Django DB connection
+
+    def _shard_query(self, shard):
+        user_range = {}
+        if shard['user_id_min'] is not None:
+            user_range['$gte'] = shard['user_id_min']
+        if shard['user_id_max'] is not None:
+            user_range['$lt'] = shard['user_id_max']
+        if shard.get('last_user_id') is not None:
+            user_range['$gt'] = shard['last_user_id']
+        query = DigestRun.subscribed_profiles_query()
+        if user_range:
+            query['user_id'] = user_range
+        return query
+
+    def _process_shard(self, shard, dispatcher):
+        if shard.get('last_user_id') is not None:
+            logger.info(f"Resuming digest shard {shard['shard']} after user {shard['last_user_id']}")
+
+        for last_user_id, recipients in self.content.iter_recipient_chunks(self._shard_query(shard)):
+            already_sent = EmailLog.sent_user_ids(self.run_id, [user.id for user, _ in recipients])
+            sent_before = dispatcher.sent_count
+
+            for user, profile in recipients:
+                if user.id in already_sent:
+                    continue
+                articles = self.content.articles_for(profile)
+                if not articles:
+                    continue
+                dispatcher.submit(EmailMessage(
+                    user_id=user.id,
+                    email=user.email,
+                    name=user.username,
+                    subject=SUBJECT,
+                    html_content=self.content.render(articles),
+                    email_type='daily_digest',
+                    article_ids=[a['_id'] for a in articles],
+                    run_id=self.run_id
+                ))
+
+            # Emails and their logs are written before progress is recorded
+            dispatcher.drain()
+            sent = dispatcher.sent_count - sent_before
+            with self._lock:
+                self.sent_count += sent
+
+            if not DigestShard.checkpoint(self.run_id, shard['shard'], self.owner, last_user_id, sent, self.lease_seconds):
+                logger.warning(f"Lost lease on digest shard {shard['shard']} of {self.run_id}, stopping")
+                return
+
+        DigestShard.complete(self.run_id, shard['shard'], self.owner)
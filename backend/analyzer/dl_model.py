@@ -31,9 +31,11 @@ def text_to_sequence(text, vocab, max_length=50):
     return seq
 
 class SentimentAnalyzer:
-    def __init__(self):
-        self.model_path = Path(__file__).parent / 'sentiment_cnn.pth'
-        self.vocab_path = Path(__file__).parent / 'vocab.pkl'
+    def __init__(self, model_dir=None):
+        base_dir = Path(model_dir) if model_dir else Path(__file__).parent
+        self.version = base_dir.name if model_dir else 'base'
+        self.model_path = base_dir / 'sentiment_cnn.pth'
+        self.vocab_path = base_dir / 'vocab.pkl'
         self.max_length = 50
         self.model = None
         self.vocab = None
@@ -56,25 +58,39 @@ class SentimentAnalyzer:
         self.model.eval()
     
     def predict(self, text):
-        seq = torch.tensor([text_to_sequence(text, self.vocab, self.max_length)]).to(self.device)
-        
-        with torch.no_grad():
-            output = self.model(seq)
-            probs = torch.softmax(output, dim=1)[0]
-            sentiment_idx = torch.argmax(probs).item()
-            confidence = probs[sentiment_idx].item()
-        
+        return self.predict_batch([text])[0]
+    
+    def predict_batch(self, texts, batch_size=256):
+        """Predict sentiment for many texts, one forward pass per `batch_size` texts"""
         sentiment_map = {0: 'negative', 1: 'neutral', 2: 'positive'}
+        results = []
+        
+        for start in range(0, len(texts), batch_size):
+            chunk = texts[start:start + batch_size]
+            seqs = torch.tensor([text_to_sequence(text, self.vocab, self.max_length) for text in chunk]).to(self.device)
+            
+            with torch.no_grad():
+                probs = torch.softmax(self.model(seqs), dim=1)
+                confidences, indices = probs.max(dim=1)
+            
+            for sentiment_idx, confidence in zip(indices.tolist(), confidences.tolist()):
+                results.append({
+                    'sentiment': sentiment_map[sentiment_idx],
+                    'confidence': round(confidence, 2),
+                    'model_version': self.version
+                })
         
-        return {
-            'sentiment': sentiment_map[sentiment_idx],
-            'confidence': round(confidence, 2)
-        }
+        return results
 
-_analyzer = None
+_text_models = None
 
 def get_analyzer():
-    global _analyzer
-    if _analyzer is None:
-        _analyzer = SentimentAnalyzer()
-    return _analyzer
\ No newline at end of file
+    """
+    Get the current text analyzer
+    Promoted versions are loaded in the background and swapped in (see model_registry)
+    """
+    global _text_models
+    if _text_models is None:
+        from .model_registry import ModelHandle
+        _text_models = ModelHandle('text', SentimentAnalyzer)
+    return _text_models.get()
@@ -0,0 +1,212 @@
+"""
+Concurrent, rate-limited email dispatch through Brevo
+
+- Messages with identical content (e.g. digests of users with the same categories)
+  are grouped into one send_transac_email call using message_versions
+  (one version per recipient, up to EMAIL_BATCH_SIZE recipients per call)
+- API calls run on a bounded worker pool; submit() blocks when it is saturated
+- A token bucket caps API calls per second (EMAIL_RATE_LIMIT, EMAIL_RATE_BURST)
+- 429/5xx responses are retried with exponential backoff
+- EmailLog entries are written in bulk
+
+Point BREVO_API_HOST at brevo_stub_server.py to exercise this without sending mail.
+"""
+
+import time
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import sib_api_v3_sdk
+from sib_api_v3_sdk.rest import ApiException
+from django.conf import settings
+
+from .models import EmailLog
+
+logger = logging.getLogger(__name__)
+
+EmailMessage = namedtuple(
+    'EmailMessage',
+    ['user_id', 'email', 'name', 'subject', 'html_content', 'email_type', 'article_ids', 'run_id'],
+    defaults=(None,)
+)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, at most `capacity` stored"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(rate, 1))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available, then take them"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def create_api_instance():
+    """TransactionalEmailsApi configured from settings (BREVO_API_HOST overrides the endpoint)"""
+    configuration = sib_api_v3_sdk.Configuration()
+    configuration.api_key['api-key'] = settings.BREVO_API_KEY
+    if settings.BREVO_API_HOST:
+        configuration.host = settings.BREVO_API_HOST
+    # One pooled connection per worker
+    configuration.connection_pool_maxsize = max(settings.EMAIL_WORKERS, 1)
+    return sib_api_v3_sdk.TransactionalEmailsApi(sib_api_v3_sdk.ApiClient(configuration))
+
+
+class EmailDispatcher:
+    """
+    Queue of outgoing emails, sent by a worker pool under a rate limit
+
+        with EmailDispatcher() as dispatcher:
+            dispatcher.submit(EmailMessage(...))
+        dispatcher.sent_count
+    """
+
+    def __init__(self, api_instance=None, sender=None, workers=None, rate=None, burst=None,
+                 batch_size=None, log_batch_size=500, max_retries=3, bucket=None):
+        self.api_instance = api_instance or create_api_instance()
+        self.sender = sender or {'name': settings.BREVO_SENDER_NAME, 'email': settings.BREVO_SENDER_EMAIL}
+        self.workers = workers or settings.EMAIL_WORKERS
+        self.batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+        # Pass a shared bucket to keep one global rate across several dispatchers
+        self.bucket = bucket or TokenBucket(rate or settings.EMAIL_RATE_LIMIT, burst or settings.EMAIL_RATE_BURST)
+        self.log_batch_size = log_batch_size
+        self.max_retries = max_retries
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='email-dispatch')
+        # Bounded backlog: at most 2 batches per worker queued or in flight
+        self._slots = threading.BoundedSemaphore(self.workers * 2)
+        self._groups = {}  # content key -> pending messages with that content
+        self._futures = set()
+        self._logs = []
+        self._lock = threading.Lock()
+        self.sent_count = 0
+        self.failed_count = 0
+        self.api_calls = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @staticmethod
+    def _content_key(message):
+        digest = hashlib.sha1(message.html_content.encode('utf-8')).hexdigest()
+        return (message.subject, digest)
+
+    def submit(self, message):
+        """Queue a message; full batches are handed to the worker pool"""
+        key = self._content_key(message)
+        group = self._groups.setdefault(key, [])
+        group.append(message)
+        if len(group) >= self.batch_size:
+            self._dispatch(self._groups.pop(key))
+
+    def flush(self):
+        """Dispatch all partially filled batches"""
+        groups, self._groups = list(self._groups.values()), {}
+        for group in groups:
+            self._dispatch(group)
+
+    def drain(self):
+        """Send everything queued so far, wait for it and write its logs (keeps the pool open)"""
+        self.flush()
+        futures, self._futures = self._futures, set()
+        for future in futures:
+            future.result()
+        self._write_logs(force=True)
+
+    def close(self):
+        """Send everything still queued, wait for the workers and write the remaining logs"""
+        self.flush()
+        self._executor.shutdown(wait=True)
+        self._write_logs(force=True)
+        logger.info(
+            f"Email dispatch finished: {self.sent_count} sent, {self.failed_count} failed, {self.api_calls} API calls"
+        )
+
+    def _dispatch(self, messages):
+        self._slots.acquire()  # Backpressure when the pool is saturated
+        future = self._executor.submit(self._send_batch, messages)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.add(future)
+
+    def _build_request(self, messages):
+        first = messages[0]
+        if len(messages) == 1:
+            return sib_api_v3_sdk.SendSmtpEmail(
+                to=[{'email': first.email, 'name': first.name}],
+                sender=self.sender,
+                subject=first.subject,
+                html_content=first.html_content
+            )
+        # Same content for every recipient: one call, one version per recipient
+        return sib_api_v3_sdk.SendSmtpEmail(
+            sender=self.sender,
+            subject=first.subject,
+            html_content=first.html_content,
+            message_versions=[
+                sib_api_v3_sdk.SendSmtpEmailMessageVersions(to=[{'email': m.email, 'name': m.name}])
+                for m in messages
+            ]
+        )
+
+    def _send_batch(self, messages):
+        request = self._build_request(messages)
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                self.api_instance.send_transac_email(request)
+                break
+            except ApiException as e:
+                if e.status in RETRY_STATUSES and attempt < self.max_retries:
+                    time.sleep(2 ** attempt)
+                    continue
+                logger.error(f"Exception when calling TransactionalEmailsApi->send_transac_email: {e}")
+                with self._lock:
+                    self.api_calls += attempt + 1
+                    self.failed_count += len(messages)
+                return
+            except Exception as e:
+                logger.error(f"Error sending email batch: {e}")
+                with self._lock:
+                    self.api_calls += attempt + 1
+                    self.failed_count += len(messages)
+                return
+
+        with self._lock:
+            self.api_calls += attempt + 1
+            self.sent_count += len(messages)
+            self._logs.extend(
+                (m.user_id, m.email_type, m.article_ids, m.run_id) for m in messages if m.email_type
+            )
+        self._write_logs()
+
+    def _write_logs(self, force=False):
+        with self._lock:
+            if not self._logs or (not force and len(self._logs) < self.log_batch_size):
+                return
+            logs, self._logs = self._logs, []
+        try:
+            EmailLog.create_many(logs)
+        except Exception as e:
+            logger.error(f"Error writing email logs: {e}")
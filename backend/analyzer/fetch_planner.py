@@ -0,0 +1,141 @@
+"""
+Quota-aware news fetch planning
+
+The scheduler calls FetchPlanner.run() every FETCH_PLAN_INTERVAL_MINUTES. Each run
+plans a few (provider, category) requests instead of calling every provider:
+
+1. Pacing: a provider may use its daily budget (FETCH_DAILY_BUDGETS minus
+   FETCH_BUDGET_RESERVE for manual fetches) in proportion to the elapsed part of
+   the UTC day, so requests are spread across the day instead of spent at once
+2. Yield: the pace is scaled by the provider's recent new articles per request
+   relative to the best provider (never below FETCH_MIN_RATE), so high-yield
+   providers are polled more often and low-yield ones save their quota
+3. Duplicates: after FETCH_DUPLICATE_STREAK requests in a row without a new
+   article a provider is skipped, with exponential backoff
+4. Categories: each request goes to the category the provider fetched least
+   recently, preferring categories not already planned in this run
+
+Usage and yield come from ProviderQuota / ProviderFetch, which NewsAggregator
+records for every request (scheduled or manual).
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from django.conf import settings
+
+from .models import ProviderQuota, ProviderFetch
+from .news_fetcher import NewsAggregator, PROVIDERS
+
+logger = logging.getLogger(__name__)
+
+
+def provider_yield(fetches, prior, prior_weight=3):
+    """New articles per request over recent fetches, smoothed towards `prior`"""
+    new_count = sum(fetch['new_count'] for fetch in fetches)
+    return (new_count + prior * prior_weight) / (len(fetches) + prior_weight)
+
+
+def duplicate_streak(fetches):
+    """Number of most recent fetches (newest first) in a row that brought no new article"""
+    streak = 0
+    for fetch in fetches:
+        if fetch['new_count']:
+            break
+        streak += 1
+    return streak
+
+
+class FetchPlanner:
+    """Plans and runs the fetches of one scheduler tick within per-provider budgets"""
+
+    def __init__(self, aggregator=None, budgets=None, categories=None, interval_minutes=None, history=20):
+        self.aggregator = aggregator or NewsAggregator()
+        self.budgets = budgets or settings.FETCH_DAILY_BUDGETS
+        self.categories = categories or settings.FETCH_CATEGORIES
+        self.interval = timedelta(minutes=interval_minutes or settings.FETCH_PLAN_INTERVAL_MINUTES)
+        self.history = history
+
+    def providers(self):
+        """Providers with an API key and a budget"""
+        return [p for p in PROVIDERS if self.aggregator.is_configured(p) and self.budgets.get(p)]
+
+    def status(self, now=None):
+        """Per-provider usage, yield, duplicate streak and requests allowed in this tick"""
+        now = now or datetime.utcnow()
+        providers = self.providers()
+        if not providers:
+            return {}
+
+        used = ProviderQuota.used_today(providers)
+        recent = {p: ProviderFetch.recent(p, limit=self.history) for p in providers}
+
+        # Prior for providers with little history: the average raw yield of all providers
+        fetches = [fetch for p in providers for fetch in recent[p]]
+        prior = sum(f['new_count'] for f in fetches) / len(fetches) if fetches else 1.0
+        yields = {p: provider_yield(recent[p], prior) for p in providers}
+        best_yield = max(yields.values())
+
+        # Part of the day that has elapsed by the end of this tick
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        day_fraction = min((now - midnight + self.interval) / timedelta(days=1), 1.0)
+
+        status = {}
+        for provider in providers:
+            budget = int(self.budgets[provider] * (1 - settings.FETCH_BUDGET_RESERVE))
+            rate = max(yields[provider] / best_yield, settings.FETCH_MIN_RATE) if best_yield > 0 else 1.0
+            allowed = max(int(budget * rate * day_fraction) - used[provider], 0)
+
+            streak = duplicate_streak(recent[provider])
+            backoff_until = None
+            if streak >= settings.FETCH_DUPLICATE_STREAK:
+                backoff = min(
+                    settings.FETCH_BACKOFF_MINUTES * 2 ** (streak - settings.FETCH_DUPLICATE_STREAK),
+                    settings.FETCH_MAX_BACKOFF_MINUTES
+                )
+                backoff_until = recent[provider][0]['fetched_at'] + timedelta(minutes=backoff)
+                if backoff_until > now:
+                    allowed = 0
+
+            status[provider] = {
+                'provider': provider,
+                'budget': self.budgets[provider],
+                'used': used[provider],
+                'yield': round(yields[provider], 2),
+                'rate': round(rate, 2),
+                'duplicate_streak': streak,
+                'backoff_until': backoff_until,
+                'allowed': min(allowed, settings.FETCH_MAX_REQUESTS_PER_TICK),
+            }
+        return status
+
+    def plan(self, now=None):
+        """List of (provider, category) requests for this tick, highest-yield providers first"""
+        now = now or datetime.utcnow()
+        status = self.status(now)
+
+        plan = []
+        planned_categories = set()
+        for provider in sorted(status, key=lambda p: status[p]['yield'], reverse=True):
+            allowed = status[provider]['allowed']
+            if not allowed:
+                continue
+            last_fetched = ProviderFetch.last_fetch_by_category(provider, since=now - timedelta(days=1))
+            order = {category: index for index, category in enumerate(self.categories)}
+            for _ in range(allowed):
+                category = min(self.categories, key=lambda c: (
+                    c in planned_categories, last_fetched.get(c, datetime.min), order[c]
+                ))
+                plan.append((provider, category))
+                planned_categories.add(category)
+                last_fetched[category] = now
+        return plan
+
+    def run(self):
+        """Plan this tick's requests and fetch them; returns the number of new articles"""
+        plan = self.plan()
+        if not plan:
+            logger.info("Fetch planner: no provider has budget left for this tick")
+            return 0
+        logger.info(f"Fetch planner: {', '.join(f'{p}/{c}' for p, c in plan)}")
+        return self.aggregator.fetch_many(plan)
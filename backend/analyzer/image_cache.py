@@ -0,0 +1,129 @@
+"""
+Image Sentiment Cache
+Two-level cache so duplicate images cost one lookup instead of a download + inference
+
+Level 1: image URL -> result (TTL, wire services reuse URLs across articles)
+Level 2: content SHA-256 -> result (same bytes served under different URLs)
+
+Both levels are bounded in-memory LRUs backed by the image_sentiment_cache
+MongoDB collection, so results survive restarts and are shared across replicas.
+Keys are prefixed with the model version, so a new model never reads old results.
+"""
+
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Thread-safe bounded LRU with optional per-entry TTL"""
+
+    def __init__(self, max_entries, ttl_seconds=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+def content_digest(data):
+    """SHA-256 of raw image bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ImageSentimentCache:
+    """URL and content-digest caches for ImageSentimentAnalyzer results"""
+
+    def __init__(self, max_entries=None, url_ttl=None, digest_ttl=None, persist=None, version='base'):
+        self.version = version
+        max_entries = max_entries or settings.IMAGE_CACHE_MAX_ENTRIES
+        self.url_ttl = url_ttl or settings.IMAGE_CACHE_URL_TTL
+        self.digest_ttl = digest_ttl or settings.IMAGE_CACHE_DIGEST_TTL
+        self.persist = settings.IMAGE_CACHE_PERSIST if persist is None else persist
+        self.by_url = LRUCache(max_entries, ttl_seconds=self.url_ttl)
+        self.by_digest = LRUCache(max_entries)
+
+    def _url_key(self, url):
+        return f'{self.version}:url:{url}'
+
+    def _digest_key(self, digest):
+        return f'{self.version}:sha256:{digest}'
+
+    def _lookup(self, memory, keys):
+        """Memory first, then one MongoDB query for the misses"""
+        found = {}
+        missing = []
+        for key in keys:
+            value = memory.get(key)
+            if value is not None:
+                found[key] = value
+            else:
+                missing.append(key)
+
+        if missing and self.persist:
+            from .models import ImageSentimentCacheEntry
+            try:
+                stored = ImageSentimentCacheEntry.get_many(missing)
+            except Exception as e:
+                logger.error(f"Image cache lookup error: {e}")
+                stored = {}
+            for key, value in stored.items():
+                memory.put(key, value)
+                found[key] = value
+        return found
+
+    def get_many_by_url(self, urls):
+        """Return {url: result} for cached URLs"""
+        found = self._lookup(self.by_url, [self._url_key(url) for url in urls])
+        return {url: found[self._url_key(url)] for url in urls if self._url_key(url) in found}
+
+    def get_many_by_digest(self, digests):
+        """Return {digest: result} for cached content digests"""
+        found = self._lookup(self.by_digest, [self._digest_key(d) for d in digests])
+        return {d: found[self._digest_key(d)] for d in digests if self._digest_key(d) in found}
+
+    def put_many(self, entries):
+        """entries: iterable of (url or None, digest or None, result)"""
+        persisted = []
+        for url, digest, result in entries:
+            if url:
+                self.by_url.put(self._url_key(url), result)
+                persisted.append((self._url_key(url), result, self.url_ttl))
+            if digest:
+                self.by_digest.put(self._digest_key(digest), result)
+                persisted.append((self._digest_key(digest), result, self.digest_ttl))
+
+        if persisted and self.persist:
+            from .models import ImageSentimentCacheEntry
+            try:
+                ImageSentimentCacheEntry.put_many(persisted)
+            except Exception as e:
+                logger.error(f"Image cache write error: {e}")
@@ -1,23 +1,36 @@
 import torch
 import torch.nn as nn
-from torchvision import models, transforms
+import numpy as np
+from torchvision import models
 from PIL import Image
 import requests
 from io import BytesIO
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import os
+from .image_cache import content_digest
 
 class ImageSentimentAnalyzer:
-    def __init__(self):
-        self.model_path = Path(__file__).parent / 'image_sentiment.pth'
+    download_workers = 8  # Concurrent image downloads/decodes
+    batch_size = 32       # Images per forward pass
+    image_size = 224      # ResNet input resolution
+    max_image_bytes = 10 * 1024 * 1024  # Reject larger downloads/files
+    max_image_pixels = 50_000_000       # Reject larger images before decoding
+
+    def __init__(self, model_dir=None, cache=None):
+        base_dir = Path(model_dir) if model_dir else Path(__file__).parent
+        self.version = base_dir.name if model_dir else 'base'
+        self.model_path = base_dir / 'image_sentiment.pth'
         self.device = torch.device('cpu') # Force CPU for inference stability
         self.model = None
-        self.transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+        # ImageNet normalization, applied in place on a reused batch buffer
+        self.mean = torch.tensor([0.485, 0.456, 0.406]).view(1, 3, 1, 1) * 255
+        self.std = torch.tensor([0.229, 0.224, 0.225]).view(1, 3, 1, 1) * 255
+        self._local = threading.local()  # Per-thread preallocated batch buffers
         self.classes = ['negative', 'neutral', 'positive'] # Assuming these are the classes from training
+        self.session = requests.Session()  # Reuse connections across downloads
+        self.cache = cache  # Optional ImageSentimentCache (URL + content digest), keyed per model version
         self.load_model()
 
     def create_model(self):
@@ -40,56 +53,203 @@ class ImageSentimentAnalyzer:
         except Exception as e:
             print(f"Error loading image model: {e}")
 
-    def predict(self, image_source):
+    @staticmethod
+    def _is_url(image_source):
+        return isinstance(image_source, str) and not (image_source.startswith('/') or image_source.startswith('.'))
+
+    def _read_bytes(self, image_source):
         """
-        Predict sentiment from image.
-        image_source: can be a URL string, file path string, or a PIL Image object
+        Read raw image bytes.
+        image_source: URL string or file path string
+        """
+        # Check if it's a file path
+        if not self._is_url(image_source):
+            if os.path.getsize(image_source) > self.max_image_bytes:
+                raise ValueError(f"Image exceeds {self.max_image_bytes} bytes")
+            with open(image_source, 'rb') as f:
+                return f.read()
+        # Treat as URL, streaming so oversized responses are cut off early
+        with self.session.get(image_source, timeout=10, stream=True) as response:
+            response.raise_for_status()
+            if int(response.headers.get('Content-Length') or 0) > self.max_image_bytes:
+                raise ValueError(f"Image exceeds {self.max_image_bytes} bytes")
+            buffer = BytesIO()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                buffer.write(chunk)
+                if buffer.tell() > self.max_image_bytes:
+                    raise ValueError(f"Image exceeds {self.max_image_bytes} bytes")
+            return buffer.getvalue()
+
+    def _decode(self, data):
+        """
+        Decode straight to ~image_size instead of native resolution.
+        JPEG draft mode lets libjpeg decode at 1/2, 1/4 or 1/8 scale (DCT scaling),
+        then a reducing resize reaches exactly image_size x image_size.
         """
-        if not self.model:
-            return {'sentiment': 'neutral', 'confidence': 0.0}
+        img = Image.open(BytesIO(data))
+        width, height = img.size
+        if width * height > self.max_image_pixels:
+            raise ValueError(f"Image too large ({width}x{height})")
+        img.draft('RGB', (self.image_size, self.image_size))
+        return self._resize(img.convert('RGB'))
+
+    def _resize(self, img):
+        size = (self.image_size, self.image_size)
+        if img.size == size:
+            return img
+        return img.resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+    def _batch_buffer(self, n):
+        """Preallocated float buffer reused across batches (one per thread)"""
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or buffer.shape[0] < n:
+            buffer = torch.empty((max(n, self.batch_size), 3, self.image_size, self.image_size))
+            self._local.buffer = buffer
+        return buffer[:n]
+
+    def _to_batch(self, images):
+        """Copy resized RGB images into the reused buffer and normalize in place"""
+        batch = self._batch_buffer(len(images))
+        for i, img in enumerate(images):
+            batch[i].copy_(torch.from_numpy(np.array(img, dtype=np.uint8)).permute(2, 0, 1))
+        return batch.sub_(self.mean).div_(self.std)
 
+    def _safe_read(self, image_source):
+        """Returns (raw bytes, sha256 digest), or (None, None) on failure"""
         try:
-            img = None
-            
-            # Check if it's a PIL Image
-            if hasattr(image_source, 'convert'):
-                img = image_source.convert('RGB')
-            # Check if it's a file path
-            elif isinstance(image_source, str) and (image_source.startswith('/') or image_source.startswith('.')):
-                from PIL import Image
-                img = Image.open(image_source).convert('RGB')
-            # Treat as URL
-            elif isinstance(image_source, str):
-                from PIL import Image
-                response = requests.get(image_source, timeout=10, stream=True)
-                response.raise_for_status()
-                img = Image.open(BytesIO(response.content)).convert('RGB')
-            else:
-                return {'sentiment': 'neutral', 'confidence': 0.0}
-
-            # Preprocess
-            img_tensor = self.transform(img).unsqueeze(0).to(self.device)
-
-            # Inference
-            with torch.no_grad():
-                outputs = self.model(img_tensor)
-                probs = torch.softmax(outputs, dim=1)[0]
-                sentiment_idx = torch.argmax(probs).item()
-                confidence = probs[sentiment_idx].item()
-
-            return {
-                'sentiment': self.classes[sentiment_idx],
-                'confidence': round(confidence, 2)
-            }
+            data = self._read_bytes(image_source)
+            return data, content_digest(data)
+        except Exception as e:
+            print(f"Image analysis error: {e}")
+            return None, None
 
+    def _safe_decode(self, source_or_data):
+        try:
+            # Check if it's a PIL Image
+            if hasattr(source_or_data, 'convert'):
+                return self._resize(source_or_data.convert('RGB'))
+            return self._decode(source_or_data)
         except Exception as e:
             print(f"Image analysis error: {e}")
-            return {'sentiment': 'neutral', 'confidence': 0.0}
+            return None
+
+    def predict(self, image_source):
+        """
+        Predict sentiment from image.
+        image_source: can be a URL string, file path string, raw image bytes or a PIL Image object
+        """
+        return self.predict_batch([image_source])[0]
+
+    def predict_batch(self, image_sources):
+        """
+        Predict sentiment for many images at once.
+        1. URL cache lookup (no download for known URLs)
+        2. Concurrent download/read by a bounded worker pool
+        3. Content-digest cache lookup (same bytes under another URL)
+        4. Concurrent decode, then ResNet18 in batches of `batch_size`
+        Failed images fall back to neutral for that item only.
+        """
+        neutral = {'sentiment': 'neutral', 'confidence': 0.0, 'model_version': self.version}
+        results = [dict(neutral) for _ in image_sources]
+        if not self.model or not image_sources:
+            return results
+
+        pending = [
+            idx for idx, source in enumerate(image_sources)
+            if hasattr(source, 'convert') or isinstance(source, (str, bytes))
+        ]
+
+        # 1. URL cache
+        if self.cache:
+            urls = [image_sources[idx] for idx in pending if self._is_url(image_sources[idx])]
+            cached = self.cache.get_many_by_url(urls) if urls else {}
+            for idx in pending:
+                if isinstance(image_sources[idx], str) and image_sources[idx] in cached:
+                    results[idx] = {**cached[image_sources[idx]], 'model_version': self.version}
+            pending = [idx for idx in pending if not (isinstance(image_sources[idx], str) and image_sources[idx] in cached)]
+
+        if not pending:
+            return results
+
+        workers = min(self.download_workers, len(pending))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # 2. Download/read concurrently (I/O bound); PIL images need no reading
+            to_read = [idx for idx in pending if isinstance(image_sources[idx], str)]
+            payloads = {idx: image_sources[idx] for idx in pending if not isinstance(image_sources[idx], str)}
+            # In-memory bytes (e.g. uploads) only need hashing
+            digests = {
+                idx: content_digest(data)
+                for idx, data in payloads.items() if isinstance(data, bytes)
+            }
+            for idx, (data, digest) in zip(to_read, executor.map(self._safe_read, [image_sources[i] for i in to_read])):
+                if data is not None:
+                    payloads[idx] = data
+                    digests[idx] = digest
+
+            # 3. Content-digest cache
+            if self.cache and digests:
+                cached = self.cache.get_many_by_digest(list(set(digests.values())))
+                hits = [idx for idx, digest in digests.items() if digest in cached]
+                for idx in hits:
+                    results[idx] = {**cached[digests[idx]], 'model_version': self.version}
+                    payloads.pop(idx, None)
+                # Remember the URL too, so the next occurrence skips the download
+                self.cache.put_many(
+                    (image_sources[idx] if self._is_url(image_sources[idx]) else None, None, cached[digests[idx]])
+                    for idx in hits
+                )
+
+            # 4. Decode concurrently
+            order = sorted(payloads)
+            images = list(executor.map(self._safe_decode, [payloads[idx] for idx in order]))
+
+        loaded = [(idx, img) for idx, img in zip(order, images) if img is not None]
+        scored = []
+
+        for start in range(0, len(loaded), self.batch_size):
+            chunk = loaded[start:start + self.batch_size]
+            try:
+                # Preprocess + single forward pass for the whole chunk
+                batch = self._to_batch([img for _, img in chunk]).to(self.device)
+                with torch.no_grad():
+                    probs = torch.softmax(self.model(batch), dim=1)
+                    confidences, indices = probs.max(dim=1)
+            except Exception as e:
+                print(f"Image analysis error: {e}")
+                continue
+
+            for (idx, _), sentiment_idx, confidence in zip(chunk, indices.tolist(), confidences.tolist()):
+                results[idx] = {
+                    'sentiment': self.classes[sentiment_idx],
+                    'confidence': round(confidence, 2),
+                    'model_version': self.version
+                }
+                scored.append(idx)
+
+        if self.cache and scored:
+            self.cache.put_many(
+                (image_sources[idx] if self._is_url(image_sources[idx]) else None, digests.get(idx), results[idx])
+                for idx in scored
+            )
+
+        return results
+
+def _load_image_analyzer(model_dir):
+    from .image_cache import ImageSentimentCache
+    analyzer = ImageSentimentAnalyzer(model_dir)
+    # Results from different model versions never share cache entries
+    analyzer.cache = ImageSentimentCache(version=analyzer.version)
+    return analyzer
 
-_image_analyzer = None
+_image_models = None
 
 def get_image_analyzer():
-    global _image_analyzer
-    if _image_analyzer is None:
-        _image_analyzer = ImageSentimentAnalyzer()
-    return _image_analyzer
+    """
+    Get the current image analyzer
+    Promoted versions are loaded in the background and swapped in (see model_registry)
+    """
+    global _image_models
+    if _image_models is None:
+        from .model_registry import ModelHandle
+        _image_models = ModelHandle('image', _load_image_analyzer)
+    return _image_models.get()
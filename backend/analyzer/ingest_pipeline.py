@@ -0,0 +1,393 @@
+"""
+Streaming news ingest pipeline
+
+Fetched articles flow through overlapping stages connected by bounded queues,
+so provider requests, model inference and database writes run at the same time:
+
+    fetch (one request per (provider, category), INGEST_FETCH_WORKERS threads)
+      -> dedup  (URLs seen in this run + one $in query per micro-batch)
+      -> near_dup (MinHash LSH near duplicates, linked to their canonical article once it is stored)
+      -> cluster (story cluster of each article, see story_clusters.py)
+      -> text   (batched text model forward passes)
+      -> image  (batched image download and scoring, INGEST_IMAGE_WORKERS threads)
+      -> write  (combined sentiment, one unordered bulk insert per micro-batch)
+
+Batching stages take what is queued, up to their batch size, waiting at most
+INGEST_BATCH_WAIT seconds for a batch to fill. A full queue blocks the stage
+feeding it (backpressure). Each stage reports items in/out, busy time,
+throughput and queue backlog; a summary is logged at the end of every run.
+
+Near duplicates of an article of the same run wait until that article is
+written. If it is lost (a failed text, image or write batch), they go through
+cluster -> text -> image -> write again as articles of their own.
+"""
+
+import time
+import queue
+import logging
+import threading
+
+from django.conf import settings
+
+from .models import NewsArticle, RecommendationFeed, ProviderFetch, StoryCluster
+from .near_duplicates import NearDuplicateDetector
+from .story_clusters import StoryClusterer
+
+logger = logging.getLogger(__name__)
+
+DONE = object()  # End-of-stream marker, one per worker of the receiving stage
+
+
+class Stage:
+    """A pool of worker threads that process items from a bounded input queue in micro-batches"""
+
+    def __init__(self, name, func, workers=1, batch_size=1, max_wait=None, queue_size=None):
+        self.name = name
+        self.func = func  # func(items, emit)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_wait = settings.INGEST_BATCH_WAIT if max_wait is None else max_wait
+        self.inbox = queue.Queue(maxsize=queue_size or settings.INGEST_QUEUE_SIZE)
+        self.downstream = None
+
+        self.received = 0
+        self.emitted = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.max_backlog = 0
+        self.started_at = None
+        self.finished_at = None
+        self._running = 0
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._running = self.workers
+        self._threads = [
+            threading.Thread(target=self._work, name=f'ingest-{self.name}-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def put(self, item):
+        self.inbox.put(item)  # Blocks while the queue is full
+        backlog = self.inbox.qsize()
+        if backlog > self.max_backlog:
+            self.max_backlog = backlog
+
+    def emit(self, item):
+        with self._lock:
+            self.emitted += 1
+        if self.downstream:
+            self.downstream.put(item)
+
+    def _next_batch(self):
+        """Block for one item, then take what arrives within max_wait (up to batch_size)"""
+        item = self.inbox.get()
+        if item is DONE:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self.inbox.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _work(self):
+        done = False
+        while not done:
+            batch, done = self._next_batch()
+            if not batch:
+                continue
+            started = time.monotonic()
+            try:
+                self.func(batch, self.emit)
+            except Exception as e:
+                logger.error(f"Ingest stage '{self.name}' failed on {len(batch)} items: {e}")
+                with self._lock:
+                    self.errors += len(batch)
+            with self._lock:
+                self.received += len(batch)
+                self.busy_seconds += time.monotonic() - started
+
+        with self._lock:
+            self._running -= 1
+            last = self._running == 0
+        if last:
+            self.finished_at = time.monotonic()
+            # Our last worker is done: end the stream for every downstream worker
+            if self.downstream:
+                for _ in range(self.downstream.workers):
+                    self.downstream.put(DONE)
+
+    def metrics(self):
+        elapsed = ((self.finished_at or time.monotonic()) - self.started_at) if self.started_at else 0.0
+        return {
+            'stage': self.name,
+            'workers': self.workers,
+            'received': self.received,
+            'emitted': self.emitted,
+            'errors': self.errors,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'items_per_second': round(self.received / elapsed, 1) if elapsed else 0.0,
+            'backlog': self.inbox.qsize(),
+            'max_backlog': self.max_backlog,
+        }
+
+
+class IngestPipeline:
+    """
+    One ingest run over a list of (provider, category) requests
+
+        saved_count = IngestPipeline(NewsAggregator()).run([('gnews', 'technology'), ...])
+        pipeline.metrics()
+    """
+
+    def __init__(self, aggregator, report_seconds=10):
+        self.aggregator = aggregator
+        self.report_seconds = report_seconds
+        self.stages = self._make_stages()
+
+        self._requests = []  # [provider, category, fetched count, new count]
+        self._seen_urls = set()
+        self._near_duplicates = NearDuplicateDetector()
+        self._pending_duplicates = {}  # url of an article not written yet -> its near-duplicate items
+        self._duplicate_links = {}  # stored canonical url -> near-duplicate urls
+        self._clusterer = StoryClusterer()
+        self._saved_categories = set()
+        self.saved_count = 0
+        self._lock = threading.Lock()
+
+    def _make_stages(self, first='fetch', prefix=''):
+        """The stages from `first` to write, each linked to the next one"""
+        specs = [
+            ('fetch', self._fetch, {'workers': settings.INGEST_FETCH_WORKERS, 'max_wait': 0}),
+            ('dedup', self._dedup, {'batch_size': settings.INGEST_DEDUP_BATCH}),
+            ('near_dup', self._near_dedup, {'batch_size': settings.INGEST_DEDUP_BATCH}),
+            ('cluster', self._cluster, {'batch_size': settings.INGEST_DEDUP_BATCH}),
+            ('text', self._score_texts, {'batch_size': settings.INGEST_TEXT_BATCH}),
+            ('image', self._score_images, {'workers': settings.INGEST_IMAGE_WORKERS,
+                                           'batch_size': settings.INGEST_IMAGE_BATCH}),
+            ('write', self._write, {'batch_size': settings.INGEST_WRITE_BATCH}),
+        ]
+        names = [name for name, _, _ in specs]
+        stages = [Stage(prefix + name, func, **options) for name, func, options in specs[names.index(first):]]
+        for stage, downstream in zip(stages, stages[1:]):
+            stage.downstream = downstream
+        return stages
+
+    @staticmethod
+    def _run_stages(stages, items):
+        """Feed items to the first stage and wait until the last one is done"""
+        for stage in stages:
+            stage.start()
+        source = stages[0]
+        for item in items:
+            source.put(item)
+        for _ in range(source.workers):
+            source.put(DONE)
+        for stage in stages:
+            stage.join()
+
+    def run(self, plan):
+        """Ingest the requests in `plan`; returns the number of new articles saved"""
+        self._requests = [[provider, category, 0, 0] for provider, category in plan]
+        started = time.monotonic()
+
+        stopped = threading.Event()
+        reporter = threading.Thread(target=self._report, args=(stopped,), name='ingest-report', daemon=True)
+        reporter.start()
+
+        self._run_stages(self.stages, range(len(self._requests)))
+
+        # Near duplicates whose canonical article was lost are ingested as articles
+        orphans = self._take_orphans()
+        if orphans:
+            logger.warning(f"{len(orphans)} articles with near duplicates were not stored, ingesting a duplicate instead")
+            retry = self._make_stages(first='cluster', prefix='retry_')
+            self.stages.extend(retry)
+            self._run_stages(retry, orphans)
+            lost = sum(map(len, self._pending_duplicates.values()))
+            if lost:
+                logger.warning(f"Dropped {lost} near duplicates of articles that could not be stored")
+        stopped.set()
+        reporter.join()
+
+        # Advance high-water marks only once the fetched articles are stored
+        failed = [stage.name for stage in self.stages if stage.errors]
+        if failed:
+            logger.warning(f"Ingest errors in {', '.join(failed)}: keeping the previous high-water marks")
+        else:
+            self.aggregator.commit_cursors()
+
+        # Yield of each request: the new articles that came from it (replays don't count)
+        for provider, category, fetched_count, new_count in self._requests:
+            if self.aggregator.is_configured(provider) and not self.aggregator.cache.replaying:
+                ProviderFetch.create(provider, category, fetched_count, new_count)
+
+        # Near duplicates are recognized by URL from now on
+        if self._duplicate_links:
+            NewsArticle.link_duplicates(self._duplicate_links)
+            logger.info(
+                f"Linked {sum(map(len, self._duplicate_links.values()))} near-duplicate articles "
+                f"to {len(self._duplicate_links)} canonical articles"
+            )
+
+        # Feeds built on these categories are now stale
+        if self._saved_categories:
+            invalidated = RecommendationFeed.invalidate_categories(self._saved_categories)
+            logger.info(f"Invalidated {invalidated} cached recommendation feeds")
+
+        logger.info(
+            f"Ingested {len(self._requests)} requests in {time.monotonic() - started:.1f}s, "
+            f"saved {self.saved_count} new unique articles"
+        )
+        for metrics in self.metrics():
+            logger.info(
+                "  {stage}: {received} in / {emitted} out, {items_per_second}/s, "
+                "busy {busy_seconds}s, max backlog {max_backlog}, errors {errors}".format(**metrics)
+            )
+        return self.saved_count
+
+    def metrics(self):
+        """Per-stage throughput and backlog"""
+        return [stage.metrics() for stage in self.stages]
+
+    def _report(self, stopped):
+        while not stopped.wait(self.report_seconds):
+            backlog = ', '.join(f"{stage.name}={stage.inbox.qsize()}" for stage in self.stages)
+            logger.info(f"Ingest backlog: {backlog}; saved {self.saved_count} so far")
+
+    # ----- Stages (items are dicts: request index, fetched article, model results) -----
+
+    def _fetch(self, indexes, emit):
+        for index in indexes:
+            provider, category = self._requests[index][:2]
+            articles = self.aggregator._request(provider, category)
+            self._requests[index][2] = len(articles)
+            for article_data in articles:
+                emit({'request': index, 'article': article_data})
+
+    def _dedup(self, items, emit):
+        # Skip articles without URL (required field) or with a URL already seen in this run
+        unique = {}
+        for item in items:
+            url = item['article'].get('url')
+            if url and url not in self._seen_urls and url not in unique:
+                unique[url] = item
+        self._seen_urls.update(unique)
+
+        # Check which URLs already exist (as articles or linked near duplicates) in one query
+        existing = set()
+        if unique:
+            urls = list(unique.keys())
+            for doc in NewsArticle.get_collection().find(
+                {'$or': [{'url': {'$in': urls}}, {'duplicate_urls': {'$in': urls}}]},
+                {'url': 1, 'duplicate_urls': 1}
+            ):
+                existing.add(doc['url'])
+                existing.update(doc.get('duplicate_urls') or [])
+        for url, item in unique.items():
+            if url not in existing:
+                emit(item)
+
+    def _take_orphans(self):
+        """
+        Near duplicates whose canonical article never reached the database: the first
+        of each group is ingested as an article, the others wait for it in turn
+        """
+        with self._lock:
+            groups = [items for items in self._pending_duplicates.values() if items]
+            self._pending_duplicates = {}
+            orphans = []
+            for first, *rest in groups:
+                orphans.append(first)
+                self._pending_duplicates[first['article']['url']] = rest
+        return orphans
+
+    def _near_dedup(self, items, emit):
+        results = self._near_duplicates.check_many([item['article'] for item in items])
+        for item, (fields, canonical) in zip(items, results):
+            item['minhash'] = fields
+            with self._lock:
+                if canonical is None:
+                    self._pending_duplicates[item['article']['url']] = []
+                elif canonical in self._pending_duplicates:
+                    # Same story as an article of this run: linked once that one is stored
+                    self._pending_duplicates[canonical].append(item)
+                    continue
+                else:
+                    # Same story as a stored article: link it instead of analyzing and storing it again
+                    self._duplicate_links.setdefault(canonical, []).append(item['article']['url'])
+                    continue
+            emit(item)
+
+    def _cluster(self, items, emit):
+        for item, fields in zip(items, self._clusterer.assign_many([item['article'] for item in items])):
+            item['story'] = fields
+            emit(item)
+
+    def _score_texts(self, items, emit):
+        results = self.aggregator._analyze_texts([
+            (item['article'].get('title', ''), item['article'].get('description', ''))
+            for item in items
+        ])
+        for item, result in zip(items, results):
+            item['text'] = result
+            emit(item)
+
+    def _score_images(self, items, emit):
+        with_image = [item for item in items if item['article'].get('image_url')]
+        if with_image:
+            results = self.aggregator._analyze_images([item['article']['image_url'] for item in with_image])
+            for item, result in zip(with_image, results):
+                item['image'] = result
+        for item in items:
+            emit(item)
+
+    def _write(self, items, emit):
+        fields = []
+        for item in items:
+            article_fields = self.aggregator._article_fields(
+                item['article'], self.aggregator._combine_results(item['text'], item.get('image'))
+            )
+            article_fields.update(item.get('minhash') or {})
+            article_fields.update(item.get('story') or {})
+            fields.append(article_fields)
+        created = NewsArticle.create_many(fields)
+
+        clusters = {}
+        for article in created:
+            if article and article.get('cluster_id'):
+                clusters.setdefault(article['cluster_id'], []).append(article)
+        StoryCluster.add_members(clusters)
+
+        with self._lock:
+            for item, article in zip(items, created):
+                # Not created means already stored under this URL: its near duplicates can be linked too
+                duplicates = self._pending_duplicates.pop(item['article']['url'], None)
+                if duplicates:
+                    self._duplicate_links.setdefault(item['article']['url'], []).extend(
+                        duplicate['article']['url'] for duplicate in duplicates
+                    )
+                if article:
+                    self.saved_count += 1
+                    self._saved_categories.add(article['category'])
+                    self._requests[item['request']][3] += 1
+        for item, article in zip(items, created):
+            if article:
+                emit(article)
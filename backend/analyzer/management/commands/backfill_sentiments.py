@@ -0,0 +1,122 @@
+"""
+Backfill (or re-score) article sentiments
+
+    python manage.py backfill_sentiments              # articles without a sentiment
+    python manage.py backfill_sentiments --rescore    # articles scored by another model version
+    python manage.py backfill_sentiments --reset      # ignore the saved checkpoint
+
+Articles are read in _id order one page at a time (keyset pagination, no long-lived
+cursor and no full list in memory), scored through the batched text and image
+paths by a small worker pool, and written back with one bulk_write per page.
+The last _id written is checkpointed in Mongo, so an interrupted run resumes there.
+"""
+
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from pymongo import ASCENDING, UpdateOne
+
+from analyzer.models import NewsArticle, JobCheckpoint
+from analyzer.news_fetcher import NewsAggregator
+from analyzer.dl_model import get_analyzer
+from analyzer.image_model import get_image_analyzer
+
+
+class Command(BaseCommand):
+    help = 'Score articles with missing sentiment (or re-score after a model change), resumably'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rescore', action='store_true',
+                            help='Re-score articles whose model_version differs from the current models')
+        parser.add_argument('--batch-size', type=int, default=256, help='Articles per page')
+        parser.add_argument('--workers', type=int, default=2, help='Pages scored concurrently')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many articles')
+        parser.add_argument('--reset', action='store_true', help='Start from the beginning')
+
+    def handle(self, *args, **options):
+        text_version = get_analyzer().version
+        image_version = get_image_analyzer().version
+
+        if options['rescore']:
+            query = {'$or': [
+                {'model_version.text': {'$ne': text_version}},
+                {'image_url': {'$nin': [None, '']}, 'model_version.image': {'$ne': image_version}},
+            ]}
+            # A new model version starts a new job (and checkpoint)
+            job_id = f'backfill_sentiments:rescore:{text_version}:{image_version}'
+        else:
+            query = {'$or': [{'sentiment': None}, {'sentiment': {'$exists': False}}]}
+            job_id = 'backfill_sentiments:missing'
+
+        if options['reset']:
+            JobCheckpoint.clear(job_id)
+        checkpoint = JobCheckpoint.get(job_id) or {}
+        last_id = checkpoint.get('last_id')
+        processed = checkpoint.get('processed', 0)
+        if last_id:
+            self.stdout.write(f"Resuming {job_id} after {last_id} ({processed} already processed)")
+
+        self.stdout.write(f"Scoring with text model {text_version}, image model {image_version}")
+        aggregator = NewsAggregator()
+        collection = NewsArticle.get_collection()
+        projection = {'title': 1, 'description': 1, 'image_url': 1}
+        batch_size = options['batch_size']
+        limit = options['limit']
+
+        start = time.time()
+        run_count = 0
+        pending = deque()  # Futures in _id order, so the checkpoint never skips a page
+
+        def score_page(articles):
+            results = aggregator._analyze_multimodal_batch(articles)
+            operations = [
+                UpdateOne({'_id': article['_id']}, {'$set': {
+                    'sentiment': result['sentiment'],
+                    'sentiment_confidence': result['confidence'],
+                    'text_sentiment': result['text_sentiment'],
+                    'text_confidence': result['text_confidence'],
+                    'image_sentiment': result['image_sentiment'],
+                    'image_confidence': result['image_confidence'],
+                    'model_version': result['model_version'],
+                }})
+                for article, result in zip(articles, results)
+            ]
+            collection.bulk_write(operations, ordered=False)
+            return articles[-1]['_id'], len(articles)
+
+        def drain(max_pending):
+            nonlocal processed, run_count
+            while len(pending) > max_pending:
+                page_last_id, count = pending.popleft().result()
+                processed += count
+                run_count += count
+                JobCheckpoint.save(job_id, page_last_id, processed)
+                elapsed = time.time() - start
+                self.stdout.write(
+                    f"{processed} processed ({run_count / max(elapsed, 1e-9):.1f} articles/s, {elapsed:.0f}s)"
+                )
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            read_count = 0
+            while limit is None or read_count < limit:
+                page_query = dict(query)
+                if last_id:
+                    page_query['_id'] = {'$gt': last_id}
+                page_size = batch_size if limit is None else min(batch_size, limit - read_count)
+                articles = list(collection.find(page_query, projection).sort('_id', ASCENDING).limit(page_size))
+                if not articles:
+                    break
+
+                last_id = articles[-1]['_id']
+                read_count += len(articles)
+                pending.append(executor.submit(score_page, articles))
+                # Bounded read-ahead: at most `workers` pages in flight
+                drain(options['workers'])
+            drain(0)
+
+        elapsed = time.time() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Finished: {run_count} articles in {elapsed:.1f}s ({run_count / max(elapsed, 1e-9):.1f} articles/s)"
+        ))
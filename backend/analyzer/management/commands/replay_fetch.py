@@ -0,0 +1,57 @@
+"""
+Replay recorded provider responses (offline, deterministic)
+
+    FETCH_CACHE_MODE=record python manage.py runserver   # record responses while fetching
+    python manage.py replay_fetch                        # parse every recorded response
+    python manage.py replay_fetch --provider gnews       # only one provider
+    python manage.py replay_fetch --ingest               # also run them through the ingest pipeline
+
+Responses are read from FETCH_CACHE_DIR (or --cache-dir) without network access or
+API keys. High-water marks are ignored and left unchanged, so the same recordings
+always yield the same articles; without --ingest nothing is written.
+"""
+
+from django.core.management.base import BaseCommand
+
+from analyzer.news_fetcher import NewsAggregator, PROVIDERS, PROVIDER_CATEGORIES
+from analyzer.response_cache import ResponseCache
+
+
+class Command(BaseCommand):
+    help = 'Parse (and optionally ingest) recorded provider responses without network access'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--provider', choices=PROVIDERS, default=None, help='Only this provider')
+        parser.add_argument('--cache-dir', default=None, help='Recorded responses (default: FETCH_CACHE_DIR)')
+        parser.add_argument('--ingest', action='store_true',
+                            help='Run the replayed articles through the ingest pipeline (writes to MongoDB)')
+
+    def handle(self, *args, **options):
+        cache = ResponseCache(root=options['cache_dir'], mode='replay')
+        aggregator = NewsAggregator(cache=cache)
+
+        plan = []
+        for entry in cache.entries(options['provider']):
+            # Recordings hold the provider's category name; the plan uses ours
+            ours = {v: k for k, v in PROVIDER_CATEGORIES.get(entry['provider'], {}).items()}
+            request = (entry['provider'], ours.get(entry['category'], entry['category']))
+            if request not in plan:
+                plan.append(request)
+
+        if not plan:
+            self.stdout.write(f"No recorded responses in {cache.root}")
+            return
+
+        if options['ingest']:
+            saved_count = aggregator.fetch_many(plan)
+            self.stdout.write(self.style.SUCCESS(f"Replayed {len(plan)} responses, saved {saved_count} new articles"))
+            return
+
+        total = 0
+        for provider, category in plan:
+            articles = aggregator._request(provider, category)
+            total += len(articles)
+            self.stdout.write(f"{provider} ({category or 'all'}): {len(articles)} articles")
+            for article in articles:
+                self.stdout.write(f"    {article['published_at']:%Y-%m-%d %H:%M}  {article.get('title')}")
+        self.stdout.write(self.style.SUCCESS(f"Replayed {len(plan)} responses, {total} articles"))
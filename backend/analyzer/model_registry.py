@@ -0,0 +1,215 @@
+"""
+Local model registry with versioned artifacts and hot swapping
+
+Layout (settings.MODEL_STORE_DIR):
+    <name>/<version>/<artifact files>
+    <name>/<version>/metadata.json   version, created_at, sha256 of every artifact, metrics
+    <name>/CURRENT                   active version (swapped atomically with os.replace)
+
+Analyzers are served through a ModelHandle: the first load is synchronous; later
+versions are loaded and checksum-verified in a background thread and swapped in
+by reference, so in-flight predictions finish on the model they started with.
+Without a promoted version the bundled model files are used (version 'base').
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+BASE_VERSION = 'base'
+
+
+class ChecksumError(Exception):
+    """An artifact on disk doesn't match the checksum recorded at registration"""
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """Versioned model artifacts on local disk"""
+
+    def __init__(self, root=None):
+        self.root = Path(root or settings.MODEL_STORE_DIR)
+
+    def _pointer(self, name):
+        return self.root / name / 'CURRENT'
+
+    def version_dir(self, name, version):
+        return self.root / name / version
+
+    def versions(self, name):
+        """Registered versions, oldest first"""
+        model_root = self.root / name
+        if not model_root.is_dir():
+            return []
+        return sorted(p.name for p in model_root.iterdir() if p.is_dir() and not p.name.startswith('.'))
+
+    def current_version(self, name):
+        """Promoted version, or None if only the bundled model exists"""
+        try:
+            version = self._pointer(name).read_text().strip()
+        except FileNotFoundError:
+            return None
+        return version if version and self.version_dir(name, version).is_dir() else None
+
+    def metadata(self, name, version):
+        path = self.version_dir(name, version) / 'metadata.json'
+        return json.loads(path.read_text()) if path.exists() else {}
+
+    def register(self, name, artifacts, metadata=None, version=None, promote=False):
+        """
+        Copy artifacts into a new version directory
+        - artifacts: {file name in the version dir: source path}
+        - metadata: extra fields stored in metadata.json (e.g. metrics)
+        The version only becomes visible once complete (directory rename)
+        Returns: the version name
+        """
+        version = version or datetime.utcnow().strftime('v%Y%m%d%H%M%S')
+        final_dir = self.version_dir(name, version)
+        if final_dir.exists():
+            raise ValueError(f"Model {name} version {version} already exists")
+
+        staging_dir = self.root / name / f'.{version}.tmp'
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        staging_dir.mkdir(parents=True)
+
+        files = {}
+        for file_name, source in artifacts.items():
+            shutil.copyfile(source, staging_dir / file_name)
+            files[file_name] = file_sha256(staging_dir / file_name)
+
+        meta = {
+            **(metadata or {}),
+            'name': name,
+            'version': version,
+            'created_at': datetime.utcnow().isoformat(),
+            'files': files,
+        }
+        (staging_dir / 'metadata.json').write_text(json.dumps(meta, indent=2))
+        os.replace(staging_dir, final_dir)
+        logger.info(f"Registered model {name} {version}")
+
+        if promote:
+            self.promote(name, version)
+        return version
+
+    def promote(self, name, version):
+        """Atomically make a registered version the current one"""
+        if not self.version_dir(name, version).is_dir():
+            raise ValueError(f"Model {name} version {version} is not registered")
+        pointer = self._pointer(name)
+        tmp_path = pointer.with_suffix('.tmp')
+        tmp_path.write_text(version)
+        os.replace(tmp_path, pointer)
+        logger.info(f"Promoted model {name} {version}")
+
+    def verify(self, name, version):
+        """Check artifact checksums; returns the version directory"""
+        model_dir = self.version_dir(name, version)
+        for file_name, expected in self.metadata(name, version).get('files', {}).items():
+            if file_sha256(model_dir / file_name) != expected:
+                raise ChecksumError(f"{name} {version}: checksum mismatch for {file_name}")
+        return model_dir
+
+
+class ModelHandle:
+    """
+    Serves the current version of a model, swapping new versions in by reference
+    - loader(model_dir) builds the analyzer; model_dir is None for the bundled model
+    - The registry pointer is re-checked at most every `check_interval` seconds
+    """
+
+    def __init__(self, name, loader, registry=None, check_interval=None):
+        self.name = name
+        self.loader = loader
+        self.registry = registry or ModelRegistry()
+        self.check_interval = settings.MODEL_RELOAD_CHECK_SECONDS if check_interval is None else check_interval
+        self._model = None
+        self._version = None
+        self._lock = threading.Lock()
+        self._loading = None
+        self._failed = set()
+        self._last_check = 0.0
+
+    @property
+    def version(self):
+        return self._version
+
+    def _load(self, version):
+        model_dir = self.registry.verify(self.name, version) if version else None
+        return self.loader(model_dir)
+
+    def get(self):
+        """Current model (loads synchronously on first use)"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    version = self.registry.current_version(self.name)
+                    try:
+                        model = self._load(version)
+                    except Exception as e:
+                        if version is None:
+                            raise
+                        logger.error(f"Error loading {self.name} model {version}, using bundled model: {e}")
+                        self._failed.add(version)
+                        version, model = None, self._load(None)
+                    self._version = version or BASE_VERSION
+                    self._model = model
+                    self._last_check = time.monotonic()
+            return self._model
+
+        self._maybe_reload()
+        return self._model
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        version = self.registry.current_version(self.name) or BASE_VERSION
+        if version == self._version or version in self._failed:
+            return
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = version
+        threading.Thread(
+            target=self._load_in_background, args=(version,),
+            name=f'{self.name}-model-loader', daemon=True
+        ).start()
+
+    def _load_in_background(self, version):
+        try:
+            model = self._load(None if version == BASE_VERSION else version)
+            # Reference swap: callers holding the old model keep using it
+            self._model, self._version = model, version
+            logger.info(f"Swapped {self.name} model to {version}")
+        except Exception as e:
+            self._failed.add(version)
+            logger.error(f"Error loading {self.name} model {version}, keeping {self._version}: {e}")
+        finally:
+            self._loading = None
+
+    def reload(self):
+        """Synchronously load the current version (e.g. from a management command)"""
+        version = self.registry.current_version(self.name) or BASE_VERSION
+        self._model = self._load(None if version == BASE_VERSION else version)
+        self._version = version
+        return self._model
@@ -3,7 +3,7 @@ from django.db import models
 from pymongo import MongoClient, ASCENDING, DESCENDING
 from django.conf import settings
 from datetime import datetime, timedelta
-from bson import ObjectId
+from bson import ObjectId, Binary
 
 # ============= MongoDB Connection =============
 class MongoDB:
@@ -46,7 +46,9 @@ class UserProfile:
     @classmethod
     def get_collection(cls):
         db = MongoDB.get_instance()
-        return db[cls.collection_name]
+        collection = db[cls.collection_name]
+        collection.create_index([('user_id', ASCENDING)])
+        return collection
     
     @classmethod
     def create(cls, user_id, **kwargs):
@@ -99,12 +101,18 @@ class NewsArticle:
         collection.create_index([('category', ASCENDING)])
         collection.create_index([('sentiment', ASCENDING)])
         collection.create_index([('url', ASCENDING)], unique=True)
+        collection.create_index([('trending_score', DESCENDING)])
+        # Near-duplicate lookup (see near_duplicates.py) and URLs of linked duplicates
+        collection.create_index([('minhash_bands', ASCENDING), ('fetched_at', DESCENDING)])
+        collection.create_index([('duplicate_urls', ASCENDING)])
+        # Story clustering (see story_clusters.py)
+        collection.create_index([('story_bands', ASCENDING), ('fetched_at', DESCENDING)])
+        collection.create_index([('cluster_id', ASCENDING)])
         return collection
     
-    @classmethod
-    def create(cls, **kwargs):
-        collection = cls.get_collection()
-        article = {
+    @staticmethod
+    def _document(**kwargs):
+        return {
             'title': kwargs.get('title'),
             'description': kwargs.get('description'),
             'content': kwargs.get('content'),
@@ -115,12 +123,30 @@ class NewsArticle:
             'category': kwargs.get('category', 'general'),
             'sentiment': kwargs.get('sentiment'),
             'sentiment_confidence': kwargs.get('sentiment_confidence'),
+            # Per-model results (kept so confident text/image agreement can become training labels)
+            'text_sentiment': kwargs.get('text_sentiment'),
+            'text_confidence': kwargs.get('text_confidence'),
+            'image_sentiment': kwargs.get('image_sentiment'),
+            'image_confidence': kwargs.get('image_confidence'),
+            'model_version': kwargs.get('model_version'),  # {'text': version, 'image': version}
+            'minhash': kwargs.get('minhash'),  # MinHash signature of title + description shingles
+            'minhash_bands': kwargs.get('minhash_bands', []),  # LSH band keys
+            'duplicate_urls': [],  # URLs of near duplicates folded into this article
+            'cluster_id': kwargs.get('cluster_id'),  # StoryCluster of the event it covers
+            'story_minhash': kwargs.get('story_minhash'),
+            'story_bands': kwargs.get('story_bands', []),
             'published_at': kwargs.get('published_at', datetime.utcnow()),
             'fetched_at': datetime.utcnow(),
             'view_count': 0,
             'like_count': 0,
-            'save_count': 0
+            'save_count': 0,
+            'trending_score': 0.0
         }
+    
+    @classmethod
+    def create(cls, **kwargs):
+        collection = cls.get_collection()
+        article = cls._document(**kwargs)
         try:
             result = collection.insert_one(article)
             article['_id'] = str(result.inserted_id)
@@ -131,6 +157,49 @@ class NewsArticle:
                 return None
             raise e
     
+    @classmethod
+    def create_many(cls, articles):
+        """
+        Insert several articles (dicts of create() arguments) with one unordered bulk insert
+        Returns the created articles in input order, None where the URL already existed
+        """
+        from pymongo.errors import BulkWriteError
+        
+        docs = [cls._document(**kwargs) for kwargs in articles]
+        if not docs:
+            return []
+        
+        duplicates = set()
+        try:
+            cls.get_collection().insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get('writeErrors', []):
+                if error.get('code') != 11000:
+                    raise
+                duplicates.add(error['index'])
+        
+        created = []
+        for idx, doc in enumerate(docs):
+            if idx in duplicates:
+                created.append(None)
+            else:
+                doc['_id'] = str(doc['_id'])
+                created.append(doc)
+        return created
+    
+    @classmethod
+    def link_duplicates(cls, links):
+        """Add near-duplicate URLs to their canonical articles ({canonical url: [duplicate urls]})"""
+        from pymongo import UpdateOne
+        
+        if not links:
+            return 0
+        result = cls.get_collection().bulk_write([
+            UpdateOne({'url': url}, {'$addToSet': {'duplicate_urls': {'$each': duplicates}}})
+            for url, duplicates in links.items()
+        ], ordered=False)
+        return result.modified_count
+    
     @classmethod
     def get_by_id(cls, article_id):
         collection = cls.get_collection()
@@ -153,11 +222,74 @@ class NewsArticle:
             result.append(article)
         return result
     
+    @classmethod
+    def get_collapsed(cls, filters=None, skip=0, limit=20, sort_by='published_at', sort_order=-1):
+        """
+        Like get_all, but one article per story cluster (the first in sort order),
+        with the number of matching cluster members as `cluster_size`
+        Returns: (articles, total number of collapsed results)
+        """
+        collection = cls.get_collection()
+        sort = {sort_by: sort_order, '_id': sort_order}
+        pipeline = [
+            {'$match': filters or {}},
+            {'$sort': sort},
+            {'$group': {
+                '_id': {'$ifNull': ['$cluster_id', '$_id']},
+                'article': {'$first': '$$ROOT'},
+                'cluster_size': {'$sum': 1}
+            }},
+            {'$replaceRoot': {'newRoot': {'$mergeObjects': ['$article', {'cluster_size': '$cluster_size'}]}}},
+            {'$sort': sort},
+            {'$facet': {
+                'results': [{'$skip': skip}, {'$limit': limit}],
+                'total': [{'$count': 'count'}]
+            }}
+        ]
+        page = next(collection.aggregate(pipeline, allowDiskUse=True), {'results': [], 'total': []})
+        
+        result = []
+        for article in page['results']:
+            article['_id'] = str(article['_id'])
+            article['published_at'] = article['published_at'].isoformat() if isinstance(article['published_at'], datetime) else article['published_at']
+            result.append(article)
+        total = page['total'][0]['count'] if page['total'] else 0
+        return result, total
+    
+    @classmethod
+    def get_by_ids(cls, article_ids):
+        """Fetch several articles in one query, preserving the order of article_ids"""
+        collection = cls.get_collection()
+        object_ids = [ObjectId(article_id) for article_id in article_ids if ObjectId.is_valid(article_id)]
+        if not object_ids:
+            return []
+        
+        by_id = {}
+        for article in collection.find({'_id': {'$in': object_ids}}):
+            article['_id'] = str(article['_id'])
+            article['published_at'] = article['published_at'].isoformat() if isinstance(article['published_at'], datetime) else article['published_at']
+            by_id[article['_id']] = article
+        return [by_id[str(article_id)] for article_id in article_ids if str(article_id) in by_id]
+    
     @classmethod
     def count(cls, filters=None):
         collection = cls.get_collection()
         return collection.count_documents(filters or {})
     
+    @classmethod
+    def update_sentiment(cls, article_id, sentiment, confidence=1.0, source='admin'):
+        """Overwrite an article's sentiment (e.g. an admin correction)"""
+        collection = cls.get_collection()
+        result = collection.update_one(
+            {'_id': ObjectId(article_id)},
+            {'$set': {
+                'sentiment': sentiment,
+                'sentiment_confidence': confidence,
+                'sentiment_source': source
+            }}
+        )
+        return result.modified_count > 0
+    
     @classmethod
     def increment_view_count(cls, article_id):
         collection = cls.get_collection()
@@ -186,6 +318,57 @@ class NewsArticle:
         return result.modified_count > 0
 
 
+class StoryCluster:
+    """
+    MongoDB model for story clusters (articles covering the same event)
+    _id is the cluster_id stored on member articles; the first article is the representative
+    """
+    collection_name = 'story_clusters'
+    
+    @classmethod
+    def get_collection(cls):
+        db = MongoDB.get_instance()
+        collection = db[cls.collection_name]
+        collection.create_index([('updated_at', DESCENDING)])
+        return collection
+    
+    @classmethod
+    def add_members(cls, groups):
+        """Add new articles to their clusters ({cluster_id: [article, ...]}), creating missing clusters"""
+        from pymongo import UpdateOne
+        
+        if not groups:
+            return
+        now = datetime.utcnow()
+        cls.get_collection().bulk_write([
+            UpdateOne(
+                {'_id': cluster_id},
+                {
+                    '$setOnInsert': {
+                        'representative_id': articles[0]['_id'],
+                        'title': articles[0].get('title'),
+                        'category': articles[0].get('category'),
+                        'created_at': now
+                    },
+                    '$push': {'member_ids': {'$each': [article['_id'] for article in articles]}},
+                    '$inc': {'size': len(articles)},
+                    '$set': {'updated_at': now}
+                },
+                upsert=True
+            )
+            for cluster_id, articles in groups.items()
+        ], ordered=False)
+    
+    @classmethod
+    def get_by_id(cls, cluster_id):
+        return cls.get_collection().find_one({'_id': cluster_id})
+    
+    @classmethod
+    def get_members(cls, cluster_id, limit=50):
+        """Member articles of a cluster, newest first"""
+        return NewsArticle.get_all(filters={'cluster_id': cluster_id}, limit=limit)
+
+
 class Article:
     """Legacy model for sentiment analysis results"""
     collection_name = 'articles'
@@ -231,6 +414,7 @@ class ArticleView:
         db = MongoDB.get_instance()
         collection = db[cls.collection_name]
         collection.create_index([('user_id', ASCENDING), ('article_id', ASCENDING)])
+        collection.create_index([('timestamp', DESCENDING)])
         return collection
     
     @classmethod
@@ -242,6 +426,7 @@ class ArticleView:
             'timestamp': datetime.utcnow()
         }
         result = collection.insert_one(view)
+        UserSeenFilter.add(user_id, article_id)
         return result.inserted_id
 
 
@@ -254,6 +439,7 @@ class ArticleLike:
         db = MongoDB.get_instance()
         collection = db[cls.collection_name]
         collection.create_index([('user_id', ASCENDING), ('article_id', ASCENDING)], unique=True)
+        collection.create_index([('timestamp', DESCENDING)])
         return collection
     
     @classmethod
@@ -276,6 +462,7 @@ class ArticleLike:
             }
             collection.insert_one(like)
             NewsArticle.increment_like_count(article_id, 1)
+            UserSeenFilter.add(user_id, article_id)
             return True
     
     @classmethod
@@ -293,6 +480,7 @@ class ArticleSave:
         db = MongoDB.get_instance()
         collection = db[cls.collection_name]
         collection.create_index([('user_id', ASCENDING), ('article_id', ASCENDING)], unique=True)
+        collection.create_index([('timestamp', DESCENDING)])
         return collection
     
     @classmethod
@@ -315,6 +503,7 @@ class ArticleSave:
             }
             collection.insert_one(save)
             NewsArticle.increment_save_count(article_id, 1)
+            UserSeenFilter.add(user_id, article_id)
             return True
     
     @classmethod
@@ -336,6 +525,550 @@ class ArticleSave:
         return articles
 
 
+class UserInteraction:
+    """
+    Unified read-only view over article_views, article_likes and article_saves
+    Each interaction is returned as {user_id, article_id, interaction_type, created_at}
+    """
+    SOURCES = {
+        'view': ArticleView,
+        'like': ArticleLike,
+        'save': ArticleSave,
+    }
+    
+    # Signal strength of each interaction type
+    WEIGHTS = {
+        'save': 5,    # Saves are strongest signal
+        'like': 3,    # Likes are medium signal
+        'view': 1     # Views are weakest signal
+    }
+    
+    @classmethod
+    def get_by_user(cls, user_id, since=None):
+        """Get all interactions of a user, optionally only those after `since`"""
+        query = {'user_id': user_id}
+        if since:
+            query['timestamp'] = {'$gte': since}
+        return list(cls._iter(query))
+    
+    @classmethod
+    def iter_all(cls, since=None):
+        """Stream interactions of all users, optionally only those after `since`"""
+        query = {}
+        if since:
+            query['timestamp'] = {'$gte': since}
+        return cls._iter(query)
+    
+    @classmethod
+    def _iter(cls, query):
+        projection = {'_id': 0, 'user_id': 1, 'article_id': 1, 'timestamp': 1}
+        for interaction_type, model in cls.SOURCES.items():
+            for doc in model.get_collection().find(query, projection):
+                yield {
+                    'user_id': doc.get('user_id'),
+                    'article_id': doc.get('article_id'),
+                    'interaction_type': interaction_type,
+                    'created_at': doc.get('timestamp', datetime.min),
+                }
+
+
+class UserSeenFilter:
+    """
+    Persisted per-user Bloom filter of seen (viewed/liked/saved) article ids
+    Lets recommendations exclude seen articles in memory instead of sending an
+    unbounded $nin list with every query
+    """
+    collection_name = 'user_seen_filters'
+    
+    @classmethod
+    def get_collection(cls):
+        db = MongoDB.get_instance()
+        collection = db[cls.collection_name]
+        collection.create_index([('user_id', ASCENDING)], unique=True)
+        return collection
+    
+    @classmethod
+    def _to_filter(cls, doc):
+        from .bloom import BloomFilter
+        return BloomFilter(
+            num_bits=doc['num_bits'],
+            num_hashes=doc['num_hashes'],
+            capacity=doc['capacity'],
+            bits=doc['bits'],
+            count=doc.get('count', 0)
+        )
+    
+    @classmethod
+    def _save(cls, user_id, bloom, expected_version=None):
+        """Write the filter; with expected_version, only if nobody else wrote in between"""
+        collection = cls.get_collection()
+        query = {'user_id': user_id}
+        if expected_version is not None:
+            query['version'] = expected_version
+        result = collection.update_one(
+            query,
+            {
+                '$set': {
+                    'bits': Binary(bloom.to_bytes()),
+                    'num_bits': bloom.num_bits,
+                    'num_hashes': bloom.num_hashes,
+                    'capacity': bloom.capacity,
+                    'count': bloom.count,
+                    'updated_at': datetime.utcnow()
+                },
+                '$inc': {'version': 1}
+            },
+            upsert=expected_version is None
+        )
+        return result.matched_count > 0 or result.upserted_id is not None
+    
+    @classmethod
+    def rebuild(cls, user_id, capacity=None):
+        """Rebuild a user's filter from the full interaction history"""
+        from .bloom import BloomFilter
+        
+        article_ids = {inter.get('article_id') for inter in UserInteraction.get_by_user(user_id)}
+        capacity = max(capacity or settings.SEEN_FILTER_CAPACITY, len(article_ids) * 2)
+        bloom = BloomFilter.for_capacity(capacity, settings.SEEN_FILTER_ERROR_RATE)
+        for article_id in article_ids:
+            bloom.add(article_id)
+        cls._save(user_id, bloom)
+        return bloom
+    
+    @classmethod
+    def get(cls, user_id):
+        """Get the user's seen-set, building it from history on first use"""
+        doc = cls.get_collection().find_one({'user_id': user_id})
+        if doc is None:
+            return cls.rebuild(user_id)
+        return cls._to_filter(doc)
+    
+    @classmethod
+    def add(cls, user_id, article_id, retries=3):
+        """Mark an article as seen (optimistic read-modify-write)"""
+        collection = cls.get_collection()
+        for _ in range(retries):
+            doc = collection.find_one({'user_id': user_id})
+            if doc is None:
+                # History already contains this interaction
+                cls.rebuild(user_id)
+                return
+            
+            bloom = cls._to_filter(doc)
+            if not bloom.add(article_id):
+                return
+            if bloom.is_full:
+                # Grow instead of letting the false positive rate degrade
+                cls.rebuild(user_id, capacity=bloom.capacity * 2)
+                return
+            if cls._save(user_id, bloom, expected_version=doc.get('version', 0)):
+                return
+
+
+class RecommendationFeed:
+    """Cached ranked recommendation feed per user (article id list with a TTL)"""
+    collection_name = 'recommendation_feeds'
+    
+    @classmethod
+    def get_collection(cls):
+        db = MongoDB.get_instance()
+        collection = db[cls.collection_name]
+        collection.create_index([('user_id', ASCENDING)], unique=True)
+        collection.create_index([('top_categories', ASCENDING)])
+        # Expired feeds are removed by MongoDB's TTL monitor
+        collection.create_index([('expires_at', ASCENDING)], expireAfterSeconds=0)
+        return collection
+    
+    @classmethod
+    def get(cls, user_id):
+        """Get the cached feed for a user, or None if missing or expired"""
+        collection = cls.get_collection()
+        return collection.find_one({
+            'user_id': user_id,
+            'expires_at': {'$gt': datetime.utcnow()}
+        })
+    
+    @classmethod
+    def store(cls, user_id, article_ids, top_categories, preferences, ttl_seconds):
+        collection = cls.get_collection()
+        now = datetime.utcnow()
+        collection.replace_one(
+            {'user_id': user_id},
+            {
+                'user_id': user_id,
+                'article_ids': article_ids,
+                'top_categories': top_categories,
+                'preferences': preferences,
+                'created_at': now,
+                'expires_at': now + timedelta(seconds=ttl_seconds)
+            },
+            upsert=True
+        )
+    
+    @classmethod
+    def invalidate(cls, user_id):
+        collection = cls.get_collection()
+        collection.delete_one({'user_id': user_id})
+    
+    @classmethod
+    def invalidate_categories(cls, categories):
+        """Drop every feed built on any of the given categories"""
+        if not categories:
+            return 0
+        collection = cls.get_collection()
+        result = collection.delete_many({'top_categories': {'$in': list(categories)}})
+        return result.deleted_count
+
+
+class ImageSentimentCacheEntry:
+    """Persisted image sentiment results keyed by '<model version>:url:<url>' or '<model version>:sha256:<digest>'"""
+    collection_name = 'image_sentiment_cache'
+    
+    @classmethod
+    def get_collection(cls):
+        db = MongoDB.get_instance()
+        collection = db[cls.collection_name]
+        collection.create_index([('key', ASCENDING)], unique=True)
+        # Expired entries are removed by MongoDB's TTL monitor
+        collection.create_index([('expires_at', ASCENDING)], expireAfterSeconds=0)
+        return collection
+    
+    @classmethod
+    def get_many(cls, keys):
+        """Return {key: {'sentiment', 'confidence', 'model_version'}} for the non-expired keys found"""
+        if not keys:
+            return {}
+        collection = cls.get_collection()
+        docs = collection.find(
+            {'key': {'$in': list(keys)}, 'expires_at': {'$gt': datetime.utcnow()}},
+            {'_id': 0, 'key': 1, 'sentiment': 1, 'confidence': 1, 'model_version': 1}
+        )
+        return {
+            doc['key']: {
+                'sentiment': doc['sentiment'],
+                'confidence': doc['confidence'],
+                # Entries written before model_version was stored: the key starts with it
+                'model_version': doc.get('model_version') or doc['key'].split(':', 1)[0]
+            }
+            for doc in docs
+        }
+    
+    @classmethod
+    def put_many(cls, entries):
+        """entries: iterable of (key, result, ttl_seconds)"""
+        from pymongo import UpdateOne
+        
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {'key': key},
+                {'$set': {
+                    'key': key,
+                    'sentiment': result['sentiment'],
+                    'confidence': result['confidence'],
+                    'model_version': result.get('model_version'),
+                    'created_at': now,
+                    'expires_at': now + timedelta(seconds=ttl_seconds)
+                }},
+                upsert=True
+            )
+            for key, result, ttl_seconds in entries
+        ]
+        if operations:
+            cls.get_collection().bulk_write(operations, ordered=False)
+
+
+class SentimentLabel:
+    """
+    MongoDB model for labelled article text used to fine-tune the text model
+    Sources:
+    - admin: manual correction (always wins)
+    - agreement: text and image models agreed with high confidence
+    """
+    collection_name = 'sentiment_labels'
+    LABELS = {'negative': 0, 'neutral': 1, 'positive': 2}
+    
+    @classmethod
+    def get_collection(cls):
+        db = MongoDB.get_instance()
+        collection = db[cls.collection_name]
+        collection.create_index([('article_id', ASCENDING)], unique=True)
+        collection.create_index([('created_at', DESCENDING)])
+        return collection
+    
+    @classmethod
+    def upsert_many(cls, labels, source):
+        """
+        labels: iterable of (article_id, text, sentiment)
+        Admin labels overwrite existing ones; agreement labels never replace a label
+        Returns: number of new labels
+        """
+        from pymongo import UpdateOne
+        
+        now = datetime.utcnow()
+        operations = []
+        for article_id, text, sentiment in labels:
+            if sentiment not in cls.LABELS or not text:
+                continue
+            doc = {'text': text, 'sentiment': sentiment, 'source': source, 'created_at': now}
+            operator = '$set' if source == 'admin' else '$setOnInsert'
+            operations.append(UpdateOne({'article_id': str(article_id)}, {operator: doc}, upsert=True))
+        
+        if not operations:
+            return 0
+        result = cls.get_collection().bulk_write(operations, ordered=False)
+        return result.upserted_count
+    
+    @classmethod
+    def count(cls, since=None):
+        query = {'created_at': {'$gte': since}} if since else {}
+        return cls.get_collection().count_documents(query)
+    
+    @classmethod
+    def iter_all(cls):
+        """Yield {article_id, text, sentiment, source} for every label"""
+        projection = {'_id': 0, 'article_id': 1, 'text': 1, 'sentiment': 1, 'source': 1}
+        yield from cls.get_collection().find({}, projection)
+
+
+class ModelTrainingRun:
+    """MongoDB model for model retraining attempts (promoted, rejected or skipped)"""
+    collection_name = 'model_training_runs'
+    
+    @classmethod
+    def get_collection(cls):
+        db = MongoDB.get_instance()
+        collection = db[cls.collection_name]
+        collection.create_index([('model', ASCENDING), ('created_at', DESCENDING)])
+        return collection
+    
+    @classmethod
+    def create(cls, model, status, version=None, metrics=None, label_count=0, error_message=None):
+        collection = cls.get_collection()
+        run = {
+            'model': model,
+            'status': status,
+            'version': version,
+            'metrics': metrics or {},
+            'label_count': label_count,
+            'error_message': error_message,
+            'created_at': datetime.utcnow()
+        }
+        result = collection.insert_one(run)
+        return result.inserted_id
+    
+    @classmethod
+    def get_last(cls, model):
+        collection = cls.get_collection()
+        return collection.find_one({'model': model}, sort=[('created_at', DESCENDING)])
+    
+    @classmethod
+    def get_last_trained(cls, model):
+        """Most recent run that actually trained a candidate (promoted or rejected)"""
+        collection = cls.get_collection()
+        return collection.find_one(
+            {'model': model, 'status': {'$ne': 'skipped'}}, sort=[('created_at', DESCENDING)]
+        )
+    
+    @classmethod
+    def get_all(cls, limit=50):
+        collection = cls.get_collection()
+        return list(collection.find().sort('created_at', DESCENDING).limit(limit))
+
+
+class JobCheckpoint:
+    """MongoDB model for resumable batch job progress (last processed _id per job)"""
+    collection_name = 'job_checkpoints'
+    
+    @classmethod
+    def get_collection(cls):
+        db = MongoDB.get_instance()
+        collection = db[cls.collection_name]
+        collection.create_index([('job_id', ASCENDING)], unique=True)
+        return collection
+    
+    @classmethod
+    def get(cls, job_id):
+        return cls.get_collection().find_one({'job_id': job_id})
+    
+    @classmethod
+    def save(cls, job_id, last_id, processed, **extra):
+        cls.get_collection().update_one(
+            {'job_id': job_id},
+            {'$set': {'last_id': last_id, 'processed': processed, 'updated_at': datetime.utcnow(), **extra}},
+            upsert=True
+        )
+    
+    @classmethod
+    def clear(cls, job_id):
+        cls.get_collection().delete_one({'job_id': job_id})
+
+
+class DigestShard:
+    """
+    MongoDB model for one user-id range of a digest run
+    Workers claim shards with a lease, checkpoint the last processed user_id and
+    renew the lease as they go; an expired lease lets another worker resume the shard.
+    """
+    collection_name = 'digest_shards'
+    
+    @classmethod
+    def get_collection(cls):
+        db = MongoDB.get_instance()
+        collection = db[cls.collection_name]
+        collection.create_index([('run_id', ASCENDING), ('shard', ASCENDING)], unique=True)
+        collection.create_index([('created_at', ASCENDING)], expireAfterSeconds=30 * 24 * 3600)
+        return collection
+    
+    @classmethod
+    def create_run(cls, run_id, ranges):
+        """Create the shards of a run once; ranges: list of (user_id_min, user_id_max) (None = unbounded)"""
+        from pymongo import UpdateOne
+        
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {'run_id': run_id, 'shard': shard},
+                {'$setOnInsert': {
+                    'user_id_min': low,
+                    'user_id_max': high,
+                    'status': 'pending',
+                    'last_user_id': None,
+                    'sent_count': 0,
+                    'owner': None,
+                    'lease_until': None,
+                    'created_at': now
+                }},
+                upsert=True
+            )
+            for shard, (low, high) in enumerate(ranges)
+        ]
+        cls.get_collection().bulk_write(operations, ordered=False)
+    
+    @classmethod
+    def exists(cls, run_id):
+        return cls.get_collection().count_documents({'run_id': run_id}, limit=1) > 0
+    
+    @classmethod
+    def claim(cls, run_id, owner, lease_seconds):
+        """Take a pending shard or one whose lease expired; returns the shard or None"""
+        from pymongo import ReturnDocument
+        
+        now = datetime.utcnow()
+        return cls.get_collection().find_one_and_update(
+            {
+                'run_id': run_id,
+                '$or': [
+                    {'status': 'pending'},
+                    {'status': 'running', 'lease_until': {'$lt': now}}
+                ]
+            },
+            {'$set': {'status': 'running', 'owner': owner, 'lease_until': now + timedelta(seconds=lease_seconds)}},
+            sort=[('shard', ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+    
+    @classmethod
+    def checkpoint(cls, run_id, shard, owner, last_user_id, sent, lease_seconds):
+        """Record progress and renew the lease; False if the lease was lost"""
+        result = cls.get_collection().update_one(
+            {'run_id': run_id, 'shard': shard, 'owner': owner, 'status': 'running'},
+            {
+                '$set': {
+                    'last_user_id': last_user_id,
+                    'lease_until': datetime.utcnow() + timedelta(seconds=lease_seconds),
+                    'updated_at': datetime.utcnow()
+                },
+                '$inc': {'sent_count': sent}
+            }
+        )
+        return result.matched_count > 0
+    
+    @classmethod
+    def complete(cls, run_id, shard, owner):
+        cls.get_collection().update_one(
+            {'run_id': run_id, 'shard': shard, 'owner': owner},
+            {'$set': {'status': 'done', 'lease_until': None, 'updated_at': datetime.utcnow()}}
+        )
+    
+    @classmethod
+    def summary(cls, run_id):
+        """{'shards', 'done', 'sent_count'} for a run"""
+        shards = list(cls.get_collection().find({'run_id': run_id}, {'status': 1, 'sent_count': 1}))
+        return {
+            'shards': len(shards),
+            'done': sum(1 for shard in shards if shard['status'] == 'done'),
+            'sent_count': sum(shard.get('sent_count', 0) for shard in shards),
+        }
+
+
+class SchedulerLock:
+    """
+    MongoDB model for scheduler job leases (one document per job, _id = job id)
+    Only the replica holding an unexpired lease runs the job; expired leases are
+    taken over by the next acquire and removed by the TTL index
+    """
+    collection_name = 'scheduler_locks'
+    
+    @classmethod
+    def get_collection(cls):
+        db = MongoDB.get_instance()
+        collection = db[cls.collection_name]
+        collection.create_index([('expires_at', ASCENDING)], expireAfterSeconds=0)
+        return collection
+    
+    @classmethod
+    def acquire(cls, name, owner, ttl_seconds):
+        """Take the lease if it is free, expired or already ours; returns True on success"""
+        from pymongo.errors import DuplicateKeyError
+        
+        now = datetime.utcnow()
+        try:
+            cls.get_collection().update_one(
+                {'_id': name, '$or': [{'expires_at': {'$lt': now}}, {'owner': owner}]},
+                {
+                    '$set': {'owner': owner, 'acquired_at': now, 'renewed_at': now,
+                             'expires_at': now + timedelta(seconds=ttl_seconds)},
+                    '$unset': {'released_at': ''},
+                    '$inc': {'runs': 1}
+                },
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # Held by another owner: the filter didn't match and the upsert collided on _id
+            return False
+    
+    @classmethod
+    def renew(cls, name, owner, ttl_seconds):
+        """Extend our lease; False if it was lost"""
+        now = datetime.utcnow()
+        result = cls.get_collection().update_one(
+            {'_id': name, 'owner': owner},
+            {'$set': {'renewed_at': now, 'expires_at': now + timedelta(seconds=ttl_seconds)}}
+        )
+        return result.matched_count > 0
+    
+    @classmethod
+    def release(cls, name, owner, hold_until=None):
+        """
+        Give the lease up; with hold_until it stays taken until then, so replicas whose
+        trigger fires a little later (clock skew) don't run the same slot again
+        """
+        collection = cls.get_collection()
+        if hold_until:
+            collection.update_one(
+                {'_id': name, 'owner': owner},
+                {'$set': {'expires_at': hold_until, 'released_at': datetime.utcnow()}}
+            )
+        else:
+            collection.delete_one({'_id': name, 'owner': owner})
+    
+    @classmethod
+    def get_all(cls):
+        return list(cls.get_collection().find().sort('_id', ASCENDING))
+
+
 class EmailLog:
     """Track sent emails to prevent duplicates"""
     collection_name = 'email_logs'
@@ -345,20 +1078,40 @@ class EmailLog:
         db = MongoDB.get_instance()
         collection = db[cls.collection_name]
         collection.create_index([('user_id', ASCENDING), ('sent_at', DESCENDING)])
+        collection.create_index([('run_id', ASCENDING), ('user_id', ASCENDING)])
         return collection
     
     @classmethod
-    def create(cls, user_id, email_type, article_ids):
+    def create(cls, user_id, email_type, article_ids, run_id=None):
         collection = cls.get_collection()
         log = {
             'user_id': user_id,
             'email_type': email_type,
             'article_ids': article_ids,
+            'run_id': run_id,
             'sent_at': datetime.utcnow()
         }
         result = collection.insert_one(log)
         return result.inserted_id
     
+    @classmethod
+    def create_many(cls, entries):
+        """Bulk insert; entries: iterable of (user_id, email_type, article_ids, run_id)"""
+        now = datetime.utcnow()
+        logs = [
+            {'user_id': user_id, 'email_type': email_type, 'article_ids': article_ids, 'run_id': run_id, 'sent_at': now}
+            for user_id, email_type, article_ids, run_id in entries
+        ]
+        if logs:
+            cls.get_collection().insert_many(logs, ordered=False)
+        return len(logs)
+    
+    @classmethod
+    def sent_user_ids(cls, run_id, user_ids):
+        """Users among user_ids that already got an email in this run"""
+        collection = cls.get_collection()
+        return set(collection.distinct('user_id', {'run_id': run_id, 'user_id': {'$in': list(user_ids)}}))
+    
     @classmethod
     def get_last_sent(cls, user_id, email_type):
         collection = cls.get_collection()
@@ -399,3 +1152,132 @@ class FetchLog:
         managed = False
         verbose_name = 'Fetch Log'
         verbose_name_plural = 'Fetch Logs'
+
+
+class ProviderQuota:
+    """
+    MongoDB model for daily API usage per news provider
+    One document per provider and UTC day (_id = '<provider>:<YYYY-MM-DD>'), kept for a week
+    """
+    collection_name = 'provider_quotas'
+    
+    @classmethod
+    def get_collection(cls):
+        db = MongoDB.get_instance()
+        collection = db[cls.collection_name]
+        collection.create_index([('expires_at', ASCENDING)], expireAfterSeconds=0)
+        return collection
+    
+    @staticmethod
+    def _day(now=None):
+        return (now or datetime.utcnow()).strftime('%Y-%m-%d')
+    
+    @classmethod
+    def record_request(cls, provider, count=1):
+        """Count requests made against a provider's quota today"""
+        now = datetime.utcnow()
+        day = cls._day(now)
+        cls.get_collection().update_one(
+            {'_id': f'{provider}:{day}'},
+            {
+                '$inc': {'requests': count},
+                '$set': {'last_request_at': now},
+                '$setOnInsert': {'provider': provider, 'day': day, 'expires_at': now + timedelta(days=7)}
+            },
+            upsert=True
+        )
+    
+    @classmethod
+    def used_today(cls, providers):
+        """Requests made today, per provider"""
+        day = cls._day()
+        docs = cls.get_collection().find({'_id': {'$in': [f'{p}:{day}' for p in providers]}})
+        used = {provider: 0 for provider in providers}
+        for doc in docs:
+            used[doc['provider']] = doc.get('requests', 0)
+        return used
+    
+    @classmethod
+    def get_all(cls, days=7):
+        since = cls._day(datetime.utcnow() - timedelta(days=days))
+        return list(cls.get_collection().find({'day': {'$gte': since}}).sort([('day', DESCENDING), ('provider', ASCENDING)]))
+
+
+class ProviderFetch:
+    """
+    MongoDB model for the outcome of each provider request
+    (articles returned vs. new articles saved), used to estimate provider yield
+    """
+    collection_name = 'provider_fetches'
+    
+    @classmethod
+    def get_collection(cls):
+        db = MongoDB.get_instance()
+        collection = db[cls.collection_name]
+        collection.create_index([('provider', ASCENDING), ('fetched_at', DESCENDING)])
+        collection.create_index([('fetched_at', ASCENDING)], expireAfterSeconds=7 * 24 * 3600)
+        return collection
+    
+    @classmethod
+    def create(cls, provider, category, fetched_count, new_count):
+        cls.get_collection().insert_one({
+            'provider': provider,
+            'category': category,
+            'fetched_count': fetched_count,
+            'new_count': new_count,
+            'fetched_at': datetime.utcnow()
+        })
+    
+    @classmethod
+    def recent(cls, provider, limit=20):
+        """Most recent fetches of a provider, newest first"""
+        return list(
+            cls.get_collection().find({'provider': provider}).sort('fetched_at', DESCENDING).limit(limit)
+        )
+    
+    @classmethod
+    def last_fetch_by_category(cls, provider, since):
+        """{category: time of the provider's last fetch of it} since a given time"""
+        pipeline = [
+            {'$match': {'provider': provider, 'fetched_at': {'$gte': since}}},
+            {'$group': {'_id': '$category', 'last': {'$max': '$fetched_at'}}}
+        ]
+        return {doc['_id']: doc['last'] for doc in cls.get_collection().aggregate(pipeline)}
+
+
+class FetchCursor:
+    """
+    MongoDB model for incremental fetching per provider and category (_id = '<provider>:<category>')
+    high_water: newest published_at ingested; etag / last_modified: validators of the last response
+    """
+    collection_name = 'fetch_cursors'
+    
+    @classmethod
+    def get_collection(cls):
+        db = MongoDB.get_instance()
+        return db[cls.collection_name]
+    
+    @staticmethod
+    def _id(provider, category):
+        return f"{provider}:{category or 'all'}"
+    
+    @classmethod
+    def get(cls, provider, category):
+        return cls.get_collection().find_one({'_id': cls._id(provider, category)})
+    
+    @classmethod
+    def update(cls, provider, category, high_water=None, etag=None, last_modified=None):
+        """Store new validators and advance (never move back) the high-water mark"""
+        fields = {'provider': provider, 'category': category, 'updated_at': datetime.utcnow()}
+        if etag:
+            fields['etag'] = etag
+        if last_modified:
+            fields['last_modified'] = last_modified
+        update = {'$set': fields}
+        if high_water:
+            update['$max'] = {'high_water': high_water}
+        cls.get_collection().update_one({'_id': cls._id(provider, category)}, update, upsert=True)
+    
+    @classmethod
+    def get_all(cls):
+        return list(cls.get_collection().find().sort('_id', ASCENDING))
@@ -0,0 +1,191 @@
+"""
+Near-duplicate article detection with MinHash LSH
+
+The same wire story often arrives from several providers under different URLs,
+with a " - Source" suffix on the title and small edits to the text. Each article
+gets a MinHash signature (NEAR_DUPLICATE_PERMUTATIONS values) of its normalized
+title + description word shingles; the fraction of equal values estimates the
+Jaccard similarity of two articles' shingle sets.
+
+Lookup uses LSH bands: the signature is cut into bands of NEAR_DUPLICATE_ROWS
+values and each band is hashed to one key, stored in the article's indexed
+`minhash_bands` array. Articles sharing any band key are candidates (likely for
+similarity above ~(1/bands)^(1/rows), unlikely below), so a new article is
+checked with one index lookup on a fixed number of keys: O(1) expected, no scan.
+Candidates are confirmed when their estimated similarity reaches
+NEAR_DUPLICATE_THRESHOLD. Only articles fetched within
+NEAR_DUPLICATE_WINDOW_HOURS are considered.
+
+A near duplicate is not stored or analyzed; its URL is added to the canonical
+article's `duplicate_urls` so it is recognized by URL on later fetches.
+"""
+
+import re
+import random
+import struct
+import hashlib
+import logging
+from datetime import datetime, timedelta
+
+from bson import Binary
+from django.conf import settings
+
+from .models import NewsArticle
+
+logger = logging.getLogger(__name__)
+
+# " - Reuters", " | BBC News" ... appended to titles by NewsAPI/GNews
+SOURCE_SUFFIX = re.compile(r'\s+[-|–—]\s+[^-|–—]{1,40}$')
+NON_WORD = re.compile(r'[^\w\s]+')
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+def normalize(text):
+    """Lowercase words of a text, without punctuation"""
+    return NON_WORD.sub(' ', (text or '').lower()).split()
+
+
+def shingles(title, description, size=2):
+    """Set of word shingles of a title (source suffix removed) and description"""
+    words = normalize(SOURCE_SUFFIX.sub('', title or '')) + normalize(description)
+    if len(words) < size:
+        return set(words)
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class MinHasher:
+    """MinHash signatures and LSH band keys with fixed (seeded) permutations"""
+
+    def __init__(self, num_perm, rows, seed=1):
+        if num_perm % rows:
+            raise ValueError("num_perm must be a multiple of rows")
+        self.num_perm = num_perm
+        self.rows = rows
+        generator = random.Random(seed)
+        self.permutations = [
+            (generator.randrange(1, MERSENNE_PRIME), generator.randrange(0, MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, features):
+        """Tuple of num_perm 32-bit minimum hashes of a set of features"""
+        hashes = [_hash(feature) for feature in features]
+        return tuple(
+            min((a * h + b) % MERSENNE_PRIME for h in hashes) & MAX_HASH
+            for a, b in self.permutations
+        )
+
+    def band_keys(self, signature):
+        """One signed 64-bit key per band (band index included, so bands never collide)"""
+        keys = []
+        for start in range(0, self.num_perm, self.rows):
+            band = struct.pack(f'>H{self.rows}I', start, *signature[start:start + self.rows])
+            keys.append(int.from_bytes(hashlib.blake2b(band, digest_size=8).digest(), 'big', signed=True))
+        return keys
+
+    @staticmethod
+    def similarity(a, b):
+        """Estimated Jaccard similarity of two signatures"""
+        return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+    @staticmethod
+    def pack(signature):
+        return Binary(struct.pack(f'>{len(signature)}I', *signature))
+
+    @staticmethod
+    def unpack(data):
+        return struct.unpack(f'>{len(data) // 4}I', bytes(data))
+
+
+class MinHashIndex:
+    """In-memory LSH index: band key -> [(signature, value)]"""
+
+    def __init__(self, hasher):
+        self.hasher = hasher
+        self._buckets = {}
+
+    def add(self, signature, value, keys=None):
+        for key in keys or self.hasher.band_keys(signature):
+            self._buckets.setdefault(key, []).append((signature, value))
+
+    def best(self, signature, threshold, keys=None):
+        """(similarity, value) of the most similar indexed signature with similarity >= threshold, or None"""
+        best = None
+        for key in keys or self.hasher.band_keys(signature):
+            for other, value in self._buckets.get(key, ()):
+                similarity = self.hasher.similarity(signature, other)
+                if similarity >= threshold and (best is None or similarity > best[0]):
+                    best = (similarity, value)
+        return best
+
+    def find(self, signature, threshold, keys=None):
+        """Value of the most similar indexed signature with similarity >= threshold, or None"""
+        best = self.best(signature, threshold, keys)
+        return best[1] if best else None
+
+
+class NearDuplicateDetector:
+    """
+    Finds the canonical article (by URL) of near-duplicate articles, among stored
+    recent articles and the articles already accepted in this run
+    """
+
+    def __init__(self, threshold=None, num_perm=None, rows=None, window_hours=None, min_shingles=4):
+        self.threshold = threshold or settings.NEAR_DUPLICATE_THRESHOLD
+        self.hasher = MinHasher(num_perm or settings.NEAR_DUPLICATE_PERMUTATIONS, rows or settings.NEAR_DUPLICATE_ROWS)
+        self.window = timedelta(hours=window_hours or settings.NEAR_DUPLICATE_WINDOW_HOURS)
+        # Very short texts (e.g. a bare headline) give unreliable signatures
+        self.min_shingles = min_shingles
+        self.run_index = MinHashIndex(self.hasher)
+
+    def signature(self, article_data):
+        """(signature, band keys) of an article, (None, None) if its text is too short"""
+        features = shingles(article_data.get('title'), article_data.get('description'))
+        if len(features) < self.min_shingles:
+            return None, None
+        signature = self.hasher.signature(features)
+        return signature, self.hasher.band_keys(signature)
+
+    def _stored_candidates(self, keys):
+        index = MinHashIndex(self.hasher)
+        if not keys:
+            return index
+        cursor = NewsArticle.get_collection().find(
+            {'minhash_bands': {'$in': list(keys)}, 'fetched_at': {'$gte': datetime.utcnow() - self.window}},
+            {'url': 1, 'minhash': 1, 'minhash_bands': 1}
+        )
+        for doc in cursor:
+            index.add(self.hasher.unpack(doc['minhash']), doc['url'], keys=doc['minhash_bands'])
+        return index
+
+    def check_many(self, articles):
+        """
+        For each article: (article fields to store, canonical URL or None)
+        Articles that are not duplicates become canonical for the rest of the run
+        """
+        signatures = [self.signature(article_data) for article_data in articles]
+        stored = self._stored_candidates({key for _, keys in signatures if keys for key in keys})
+
+        results = []
+        for article_data, (signature, keys) in zip(articles, signatures):
+            if signature is None:
+                results.append(({}, None))
+                continue
+            # Most similar article among stored ones and those of this run (stored wins ties)
+            matches = [
+                match for match in (
+                    stored.best(signature, self.threshold, keys),
+                    self.run_index.best(signature, self.threshold, keys)
+                ) if match
+            ]
+            canonical = max(matches, key=lambda match: match[0])[1] if matches else None
+            if canonical is None:
+                self.run_index.add(signature, article_data['url'], keys)
+            results.append(({'minhash': self.hasher.pack(signature), 'minhash_bands': keys}, canonical))
+        return results
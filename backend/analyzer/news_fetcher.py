@@ -7,30 +7,162 @@ Aggregates news from 4 different APIs:
 4. Currents API - 600 requests/month (~20/day)
 
 Total: ~420 requests/day
+
+Usage per provider is tracked in MongoDB (ProviderQuota, ProviderFetch) and the
+scheduled fetch is planned against these budgets (see fetch_planner.py)
+
+Fetching is incremental: only articles newer than each (provider, category)
+high-water mark are kept (and requested, where the API has a date filter),
+responses are requested conditionally, and raw responses can be recorded to
+disk and replayed offline (see response_cache.py)
 """
 
 import requests
-from datetime import datetime, timedelta
+import threading
+from datetime import datetime, timedelta, timezone
 from django.conf import settings
-from .models import NewsArticle
+from .models import ProviderQuota, FetchCursor
 from .dl_model import get_analyzer
+from .response_cache import ResponseCache
 import logging
 
 logger = logging.getLogger(__name__)
 
+PROVIDERS = ('newsapi', 'newsdata', 'gnews', 'currents')
+PROVIDER_NAMES = {
+    'newsapi': 'NewsAPI',
+    'newsdata': 'NewsData',
+    'gnews': 'GNews',
+    'currents': 'Currents API',
+}
+# Provider-specific names of our categories (NewsData has no 'general')
+PROVIDER_CATEGORIES = {
+    'newsdata': {'general': 'top'},
+}
+
+
+def _utc_naive(value):
+    """Naive UTC datetime (as MongoDB returns them) from an aware or naive datetime"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
 
-class NewsAPIFetcher:
+
+class ProviderFetcher:
+    """
+    Request handling shared by the provider fetchers
+    - High-water mark per category (FetchCursor): providers that can filter by date
+      (`date_filter`) are only asked for articles after it, minus
+      FETCH_HIGH_WATER_OVERLAP_MINUTES (`since()`); for the others the mark is only
+      recorded and old articles are left to the URL and near-duplicate checks
+    - Conditional requests with the last response's ETag / Last-Modified;
+      304 Not Modified means nothing new
+    - Raw responses recorded to / replayed from disk (ResponseCache)
+    New marks and validators are held until commit_cursors(), which the ingest
+    pipeline calls once the fetched articles are stored.
+    """
+    provider = None
+    date_filter = False  # The request carries since() and the provider applies it
+    
+    def __init__(self, cache=None):
+        self.cache = cache or ResponseCache()
+        self._pending = {}  # category -> cursor fields to commit
+        self._lock = threading.Lock()
+    
+    @property
+    def available(self):
+        """An API key is configured, or responses are replayed from disk"""
+        return bool(self.api_key) or self.cache.replaying
+    
+    def cursor(self, category):
+        if self.cache.replaying:
+            return {}  # Replays don't depend on (or change) database state
+        return FetchCursor.get(self.provider, category) or {}
+    
+    def since(self, cursor):
+        """Oldest publication time still worth fetching, None without a high-water mark"""
+        high_water = cursor.get('high_water')
+        if not high_water:
+            return None
+        return high_water - timedelta(minutes=settings.FETCH_HIGH_WATER_OVERLAP_MINUTES)
+    
+    def _get(self, url, params, category, cursor):
+        """JSON body of a provider response, None if nothing changed (304) or not recorded"""
+        if self.cache.replaying:
+            return self.cache.load(self.provider, url, params)
+        
+        headers = {}
+        if cursor.get('etag'):
+            headers['If-None-Match'] = cursor['etag']
+        if cursor.get('last_modified'):
+            headers['If-Modified-Since'] = cursor['last_modified']
+        
+        response = requests.get(url, params=params, headers=headers, timeout=10)
+        if response.status_code == 304:
+            logger.info(f"{self.provider} ({category or 'all'}): not modified since the last fetch")
+            return None
+        response.raise_for_status()
+        data = response.json()
+        
+        self._remember(category, etag=response.headers.get('ETag'), last_modified=response.headers.get('Last-Modified'))
+        self.cache.store(self.provider, category, url, params, data, response.headers)
+        return data
+    
+    def _only_new(self, articles, category, cursor, requested_at):
+        """
+        Note the new high-water mark; with a date filter, also drop articles the
+        provider returned from before it (inclusive `from`, overlap)
+        """
+        for article in articles:
+            article['published_at'] = _utc_naive(article['published_at'])
+        
+        # Unparseable dates fall back to "now": they must not move the mark
+        dated = [article['published_at'] for article in articles if article['published_at'] < requested_at]
+        if dated:
+            self._remember(category, high_water=max(dated))
+        
+        since = self.since(cursor)
+        if since is None or not self.date_filter:
+            # Unsorted feeds (e.g. NewsAPI top-headlines) surface older stories late
+            return articles
+        return [article for article in articles if article['published_at'] > since]
+    
+    def _remember(self, category, **fields):
+        if self.cache.replaying:
+            return
+        with self._lock:
+            pending = self._pending.setdefault(category, {})
+            for name, value in fields.items():
+                if value is None:
+                    continue
+                if name == 'high_water' and pending.get(name) and pending[name] >= value:
+                    continue
+                pending[name] = value
+    
+    def commit_cursors(self):
+        """Persist the high-water marks and validators of the responses fetched so far"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for category, fields in pending.items():
+            FetchCursor.update(self.provider, category, **fields)
+
+
+class NewsAPIFetcher(ProviderFetcher):
     """
     NewsAPI.org fetcher
     Free tier: 100 requests/day, articles have 24h delay
+    top-headlines has no date filter: every returned article is kept
     """
-    def __init__(self):
+    provider = 'newsapi'
+    
+    def __init__(self, cache=None):
+        super().__init__(cache)
         self.api_key = settings.NEWSAPI_KEY
         self.base_url = "https://newsapi.org/v2"
         
     def fetch_top_headlines(self, category=None, country='us', page_size=20):
         """Fetch top headlines"""
-        if not self.api_key:
+        if not self.available:
             logger.warning("NewsAPI key not configured")
             return []
         
@@ -45,12 +177,12 @@ class NewsAPIFetcher:
             params['category'] = category
             
         try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            cursor = self.cursor(category)
+            requested_at = datetime.utcnow()
+            data = self._get(url, params, category, cursor)
             
-            if data.get('status') == 'ok':
-                return self._parse_articles(data.get('articles', []))
+            if data and data.get('status') == 'ok':
+                return self._only_new(self._parse_articles(data.get('articles', [])), category, cursor, requested_at)
             return []
         except Exception as e:
             logger.error(f"NewsAPI error: {e}")
@@ -82,18 +214,22 @@ class NewsAPIFetcher:
             return datetime.utcnow()
 
 
-class NewsDataFetcher:
+class NewsDataFetcher(ProviderFetcher):
     """
     NewsData.io fetcher
     Free tier: 200 requests/day
+    No date filter on the free tier: every returned article is kept
     """
-    def __init__(self):
+    provider = 'newsdata'
+    
+    def __init__(self, cache=None):
+        super().__init__(cache)
         self.api_key = settings.NEWSDATA_KEY
         self.base_url = "https://newsdata.io/api/1"
         
     def fetch_latest_news(self, category=None, language='en', size=10):
         """Fetch latest news"""
-        if not self.api_key:
+        if not self.available:
             logger.warning("NewsData key not configured")
             return []
         
@@ -108,12 +244,12 @@ class NewsDataFetcher:
             params['category'] = category
             
         try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            cursor = self.cursor(category)
+            requested_at = datetime.utcnow()
+            data = self._get(url, params, category, cursor)
             
-            if data.get('status') == 'success':
-                return self._parse_articles(data.get('results', []))
+            if data and data.get('status') == 'success':
+                return self._only_new(self._parse_articles(data.get('results', [])), category, cursor, requested_at)
             return []
         except Exception as e:
             logger.error(f"NewsData error: {e}")
@@ -145,18 +281,23 @@ class NewsDataFetcher:
             return datetime.utcnow()
 
 
-class GNewsFetcher:
+class GNewsFetcher(ProviderFetcher):
     """
     GNews.io fetcher  
     Free tier: 100 requests/day, 10 articles per request
+    Only articles newer than the high-water mark are requested (`from`)
     """
-    def __init__(self):
+    provider = 'gnews'
+    date_filter = True
+    
+    def __init__(self, cache=None):
+        super().__init__(cache)
         self.api_key = settings.GNEWS_API_KEY
         self.base_url = "https://gnews.io/api/v4"
         
     def fetch_top_headlines(self, category=None, lang='en', max_results=10):
         """Fetch top headlines"""
-        if not self.api_key:
+        if not self.available:
             logger.warning("GNews key not configured")
             return []
         
@@ -171,11 +312,16 @@ class GNewsFetcher:
             params['category'] = category
             
         try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            cursor = self.cursor(category)
+            since = self.since(cursor)
+            if since:
+                params['from'] = since.strftime('%Y-%m-%dT%H:%M:%SZ')
+            requested_at = datetime.utcnow()
+            data = self._get(url, params, category, cursor)
             
-            return self._parse_articles(data.get('articles', []))
+            if not data:
+                return []
+            return self._only_new(self._parse_articles(data.get('articles', [])), category, cursor, requested_at)
         except Exception as e:
             logger.error(f"GNews error: {e}")
             return []
@@ -206,18 +352,22 @@ class GNewsFetcher:
             return datetime.utcnow()
 
 
-class CurrentsAPIFetcher:
+class CurrentsAPIFetcher(ProviderFetcher):
     """
     Currents API fetcher
     Free tier: 600 requests/month (~20/day)
+    latest-news has no date filter: every returned article is kept
     """
-    def __init__(self):
+    provider = 'currents'
+    
+    def __init__(self, cache=None):
+        super().__init__(cache)
         self.api_key = settings.CURRENTS_API_KEY
         self.base_url = "https://api.currentsapi.services/v1"
         
     def fetch_latest_news(self, category=None, language='en'):
         """Fetch latest news"""
-        if not self.api_key:
+        if not self.available:
             logger.warning("Currents API key not configured")
             return []
         
@@ -231,12 +381,12 @@ class CurrentsAPIFetcher:
             params['category'] = category
             
         try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            cursor = self.cursor(category)
+            requested_at = datetime.utcnow()
+            data = self._get(url, params, category, cursor)
             
-            if data.get('status') == 'ok':
-                return self._parse_articles(data.get('news', []))
+            if data and data.get('status') == 'ok':
+                return self._only_new(self._parse_articles(data.get('news', [])), category, cursor, requested_at)
             return []
         except Exception as e:
             logger.error(f"Currents API error: {e}")
@@ -272,80 +422,92 @@ class NewsAggregator:
     """
     Aggregates news from all sources with duplicate detection
     """
-    def __init__(self):
-        self.newsapi = NewsAPIFetcher()
-        self.newsdata = NewsDataFetcher()
-        self.gnews = GNewsFetcher()
-        self.currents = CurrentsAPIFetcher()
-        self.analyzer = None
+    def __init__(self, cache=None):
+        self.cache = cache or ResponseCache()
+        self.newsapi = NewsAPIFetcher(self.cache)
+        self.newsdata = NewsDataFetcher(self.cache)
+        self.gnews = GNewsFetcher(self.cache)
+        self.currents = CurrentsAPIFetcher(self.cache)
+        self.fetchers = {
+            'newsapi': self.newsapi,
+            'newsdata': self.newsdata,
+            'gnews': self.gnews,
+            'currents': self.currents,
+        }
+    
+    def is_configured(self, provider):
+        """True if the provider has an API key (otherwise no request is made)"""
+        return bool(self.fetchers[provider].api_key)
+    
+    def commit_cursors(self):
+        """Persist every provider's high-water marks and validators (after the fetched articles are stored)"""
+        for fetcher in self.fetchers.values():
+            fetcher.commit_cursors()
         
     def fetch_all_news(self, category=None):
         """
         Fetch news from all APIs
         Returns: Number of new articles added
         """
-        all_articles = []
-        
-        # Fetch from all sources
-        logger.info("Fetching from NewsAPI...")
-        all_articles.extend(self.newsapi.fetch_top_headlines(category=category, page_size=20))
-        
-        logger.info("Fetching from NewsData...")
-        all_articles.extend(self.newsdata.fetch_latest_news(category=category, size=10))
-        
-        logger.info("Fetching from GNews...")
-        all_articles.extend(self.gnews.fetch_top_headlines(category=category, max_results=10))
-        
-        logger.info("Fetching from Currents API...")
-        all_articles.extend(self.currents.fetch_latest_news(category=category))
-        
-        logger.info(f"Fetched {len(all_articles)} total articles from all sources")
-        
-        # Remove duplicates and save to database
-        saved_count = self._save_unique_articles(all_articles)
-        
-        logger.info(f"Saved {saved_count} new unique articles to database")
-        return saved_count
+        return self.fetch_many([(provider, category) for provider in PROVIDERS])
     
-    def _save_unique_articles(self, articles):
+    def fetch_many(self, plan):
         """
-        Save articles to MongoDB, avoiding duplicates
-        Duplicate detection: same URL
+        Fetch a list of (provider, category) requests through the streaming ingest
+        pipeline (fetch -> URL dedup -> text -> image -> bulk write, see ingest_pipeline.py)
+        and record each request's quota use and yield (new articles per request)
+        Returns: Number of new articles added
         """
-        saved_count = 0
+        from .ingest_pipeline import IngestPipeline
         
-        for article_data in articles:
-            # Skip if no URL (required field)
-            if not article_data.get('url'):
-                continue
-            
-            # Check if article already exists by URL
-            existing = NewsArticle.get_collection().find_one({'url': article_data['url']})
-            if existing:
-                continue
-            
-            # Analyze sentiment (Text + Image)
-            sentiment_data = self._analyze_multimodal(article_data)
-            
-            # Create article with sentiment
-            article = NewsArticle.create(
-                title=article_data.get('title'),
-                description=article_data.get('description'),
-                content=article_data.get('content'),
-                url=article_data['url'],
-                image_url=article_data.get('image_url'),
-                source=article_data.get('source', 'Unknown'),
-                author=article_data.get('author'),
-                category=self._normalize_category(article_data.get('category', 'general')),
-                sentiment=sentiment_data.get('sentiment'),
-                sentiment_confidence=sentiment_data.get('confidence'),
-                published_at=article_data.get('published_at', datetime.utcnow())
-            )
-            
-            if article:
-                saved_count += 1
+        return IngestPipeline(self).run(plan)
+    
+    def _request(self, provider, category=None):
+        """One API request to a provider, counted against its daily quota"""
+        api_category = PROVIDER_CATEGORIES.get(provider, {}).get(category, category)
+        
+        if provider == 'newsapi':
+            articles = self.newsapi.fetch_top_headlines(category=api_category, page_size=20)
+        elif provider == 'newsdata':
+            articles = self.newsdata.fetch_latest_news(category=api_category, size=10)
+        elif provider == 'gnews':
+            articles = self.gnews.fetch_top_headlines(category=api_category, max_results=10)
+        elif provider == 'currents':
+            articles = self.currents.fetch_latest_news(category=api_category)
+        else:
+            raise ValueError(f"Unknown news provider: {provider}")
         
-        return saved_count
+        # Replayed responses don't use the provider's quota
+        if self.is_configured(provider) and not self.cache.replaying:
+            ProviderQuota.record_request(provider)
+        
+        # NewsAPI and GNews don't return a category: use the one requested
+        if category:
+            for article_data in articles:
+                if article_data.get('category', 'general') == 'general':
+                    article_data['category'] = category
+        return articles
+    
+    def _article_fields(self, article_data, sentiment_data):
+        """NewsArticle.create() arguments of a fetched article and its sentiment"""
+        return dict(
+            title=article_data.get('title'),
+            description=article_data.get('description'),
+            content=article_data.get('content'),
+            url=article_data['url'],
+            image_url=article_data.get('image_url'),
+            source=article_data.get('source', 'Unknown'),
+            author=article_data.get('author'),
+            category=self._normalize_category(article_data.get('category', 'general')),
+            sentiment=sentiment_data.get('sentiment'),
+            sentiment_confidence=sentiment_data.get('confidence'),
+            text_sentiment=sentiment_data.get('text_sentiment'),
+            text_confidence=sentiment_data.get('text_confidence'),
+            image_sentiment=sentiment_data.get('image_sentiment'),
+            image_confidence=sentiment_data.get('image_confidence'),
+            model_version=sentiment_data.get('model_version'),
+            published_at=article_data.get('published_at', datetime.utcnow())
+        )
     
     def _analyze_multimodal(self, article_data):
         """
@@ -355,46 +517,85 @@ class NewsAggregator:
         - Image weight: 1
         - Conflict resolution rules applied
         """
-        # 1. Text Analysis
-        text_result = self._analyze_text(article_data.get('title', ''), article_data.get('description', ''))
+        return self._analyze_multimodal_batch([article_data])[0]
+    
+    def _analyze_multimodal_batch(self, articles):
+        """
+        Multi-modal sentiment analysis for many articles
+        Images are downloaded concurrently and scored in batched forward passes
+        Each result also carries the individual text/image predictions
+        """
+        # 1. Text Analysis (batched forward passes)
+        text_results = self._analyze_texts([
+            (article_data.get('title', ''), article_data.get('description', ''))
+            for article_data in articles
+        ])
+        
+        # 2. Image Analysis (only for articles with an image)
+        image_results = [None for _ in articles]
+        with_image = [idx for idx, article_data in enumerate(articles) if article_data.get('image_url')]
+        if with_image:
+            batch_results = self._analyze_images([articles[idx]['image_url'] for idx in with_image])
+            for idx, result in zip(with_image, batch_results):
+                image_results[idx] = result
         
-        # 2. Image Analysis
-        image_result = {'sentiment': 'neutral', 'confidence': 0.0}
-        if article_data.get('image_url'):
-            image_result = self._analyze_image(article_data['image_url'])
-            
         # 3. Combine Results
-        return self._combine_sentiments(text_result, image_result)
+        return [
+            self._combine_results(text_result, image_result)
+            for text_result, image_result in zip(text_results, image_results)
+        ]
+    
+    def _combine_results(self, text_result, image_result=None):
+        """Combined sentiment plus the individual text/image predictions and model versions"""
+        combined = dict(self._combine_sentiments(text_result, image_result or {'sentiment': 'neutral', 'confidence': 0.0}))
+        combined.update(
+            text_sentiment=text_result['sentiment'],
+            text_confidence=text_result['confidence'],
+            image_sentiment=image_result['sentiment'] if image_result else None,
+            image_confidence=image_result['confidence'] if image_result else None,
+            model_version={
+                'text': text_result.get('model_version'),
+                'image': image_result.get('model_version') if image_result else None
+            }
+        )
+        return combined
 
     def _analyze_text(self, title, description):
         """Analyze sentiment of article text"""
+        return self._analyze_texts([(title, description)])[0]
+
+    def _analyze_texts(self, items):
+        """Analyze sentiment of many (title, description) pairs in batched forward passes"""
+        neutral = {'sentiment': 'neutral', 'confidence': 0.0}
+        # Combine title and description
+        texts = [f"{title}. {description}" if description else (title or '') for title, description in items]
+        results = [dict(neutral) for _ in texts]
+        with_text = [idx for idx, text in enumerate(texts) if text]
+        if not with_text:
+            return results
+        
         try:
-            # Lazy load analyzer
-            if not self.analyzer:
-                self.analyzer = get_analyzer()
-            
-            # Combine title and description
-            text = f"{title}. {description}" if description else title
-            
-            if not text:
-                return {'sentiment': 'neutral', 'confidence': 0.0}
-            
-            # Get sentiment
-            result = self.analyzer.predict(text)
-            return result
+            # Current analyzer (a newly promoted model is picked up between batches)
+            analyzer = get_analyzer()
+            for idx, result in zip(with_text, analyzer.predict_batch([texts[idx] for idx in with_text])):
+                results[idx] = result
         except Exception as e:
             logger.error(f"Text sentiment analysis error: {e}")
-            return {'sentiment': 'neutral', 'confidence': 0.0}
+        return results
 
     def _analyze_image(self, image_url):
         """Analyze sentiment of article image"""
+        return self._analyze_images([image_url])[0]
+
+    def _analyze_images(self, image_urls):
+        """Analyze sentiment of many article images in batched forward passes"""
         try:
             from .image_model import get_image_analyzer
             analyzer = get_image_analyzer()
-            return analyzer.predict(image_url)
+            return analyzer.predict_batch(image_urls)
         except Exception as e:
             logger.error(f"Image sentiment analysis error: {e}")
-            return {'sentiment': 'neutral', 'confidence': 0.0}
+            return [{'sentiment': 'neutral', 'confidence': 0.0} for _ in image_urls]
 
     def _combine_sentiments(self, text_res, img_res):
         """
@@ -2,7 +2,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework import status
-from .models import NewsArticle, ArticleView, ArticleLike, ArticleSave
+from .models import NewsArticle, ArticleView, ArticleLike, ArticleSave, RecommendationFeed, StoryCluster
 from .serializers import NewsArticleSerializer
 from .news_fetcher import NewsAggregator
 from datetime import datetime, timedelta
@@ -26,7 +26,8 @@ def get_news_list(request):
     - search: Search in title and description
     - page: Page number (default: 1)
     - page_size: Items per page (default: 20, max: 100)
-    - sort_by: Sort field (published_at, view_count, like_count) - default: published_at
+    - sort_by: Sort field (published_at, view_count, like_count, trending_score) - default: published_at
+    - collapse: true to show one article per story cluster (with cluster_size) - default: false
     """
     try:
         # Get query parameters
@@ -38,6 +39,7 @@ def get_news_list(request):
         page = int(request.GET.get('page', 1))
         page_size = min(int(request.GET.get('page_size', 20)), 100)
         sort_by = request.GET.get('sort_by', 'published_at')
+        collapse = request.GET.get('collapse', '').lower() in ('1', 'true', 'yes')
         
         # Build MongoDB query
         filters = {}
@@ -68,17 +70,27 @@ def get_news_list(request):
         # Sort order
         sort_order = -1  # Descending by default
         
-        # Get articles
-        articles = NewsArticle.get_all(
-            filters=filters,
-            skip=skip,
-            limit=page_size,
-            sort_by=sort_by,
-            sort_order=sort_order
-        )
-        
-        # Get total count for pagination
-        total_count = NewsArticle.count(filters=filters)
+        if collapse:
+            # One article per story cluster; total counts clusters
+            articles, total_count = NewsArticle.get_collapsed(
+                filters=filters,
+                skip=skip,
+                limit=page_size,
+                sort_by=sort_by,
+                sort_order=sort_order
+            )
+        else:
+            # Get articles
+            articles = NewsArticle.get_all(
+                filters=filters,
+                skip=skip,
+                limit=page_size,
+                sort_by=sort_by,
+                sort_order=sort_order
+            )
+            
+            # Get total count for pagination
+            total_count = NewsArticle.count(filters=filters)
         
         # Add user interaction flags if authenticated
         if request.user.is_authenticated:
@@ -107,6 +119,41 @@ def get_news_list(request):
         )
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_story_cluster(request, cluster_id):
+    """
+    Get a story cluster and its member articles (all coverage of one event)
+    GET /api/news/clusters/<cluster_id>/
+    """
+    try:
+        cluster = StoryCluster.get_by_id(cluster_id)
+        
+        if not cluster:
+            return Response(
+                {'error': 'Story cluster not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        articles = StoryCluster.get_members(cluster_id)
+        serializer = NewsArticleSerializer(articles, many=True)
+        
+        return Response({
+            'cluster_id': cluster['_id'],
+            'representative_id': cluster.get('representative_id'),
+            'title': cluster.get('title'),
+            'size': cluster.get('size', len(articles)),
+            'articles': serializer.data
+        }, status=status.HTTP_200_OK)
+    
+    except Exception as e:
+        logger.error(f"Error fetching story cluster {cluster_id}: {e}")
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_news_detail(request, article_id):
@@ -127,6 +174,7 @@ def get_news_detail(request, article_id):
         if request.user.is_authenticated:
             ArticleView.create(request.user.id, article_id)
             NewsArticle.increment_view_count(article_id)
+            RecommendationFeed.invalidate(request.user.id)
             
             # Add interaction flags
             article['is_liked'] = ArticleLike.is_liked(request.user.id, article_id)
@@ -179,6 +227,7 @@ def toggle_like(request, article_id):
     """
     try:
         is_liked = ArticleLike.toggle(request.user.id, article_id)
+        RecommendationFeed.invalidate(request.user.id)
         
         return Response({
             'liked': is_liked,
@@ -202,6 +251,7 @@ def toggle_save(request, article_id):
     """
     try:
         is_saved = ArticleSave.toggle(request.user.id, article_id)
+        RecommendationFeed.invalidate(request.user.id)
         
         return Response({
             'saved': is_saved,
@@ -277,24 +327,28 @@ def get_categories(request):
 def get_recommended_news(request):
     """
     Get personalized news recommendations for authenticated user
-    GET /api/news/recommended/
+    GET /api/news/recommended/?page=1&page_size=20
     """
-    from .recommendations import RecommendationEngine
+    from .recommendations import get_personalized_feed
     
     user_id = request.user.id
-    page = int(request.GET.get('page', 1))
-    page_size = int(request.GET.get('page_size', 20))
-    
-    # Get recommended articles
-    engine = RecommendationEngine()
-    articles = engine.get_recommended_articles(user_id, limit=page_size)
+    page = max(int(request.GET.get('page', 1)), 1)
+    page_size = min(int(request.GET.get('page_size', 20)), 100)
     
-    # Get user's category preferences for display
-    category_prefs = engine.get_user_category_preferences(user_id)
+    # Get one page of the (cached) recommendation feed
+    feed = get_personalized_feed(user_id, page=page, limit=page_size)
+    articles = feed['articles']
+    total_count = feed['total_count']
     
     return Response({
         'results': articles,
-        'preferences': category_prefs,
+        'preferences': feed['preferences'],
         'count': len(articles),
-        'page': page
+        'page': page,
+        'pagination': {
+            'page': page,
+            'page_size': page_size,
+            'total_count': total_count,
+            'total_pages': (total_count + page_size - 1) // page_size
+        }
     }, status=status.HTTP_200_OK)
@@ -0,0 +1,300 @@
+"""
+Recommendation Pipeline
+Multi-stage candidate generation + re-ranking
+
+Stages:
+1. Candidates - cheap sources (category, trending, similar-to-saved, fresh,
+   collaborative) are queried in parallel, one query each
+2. Merge      - candidates are deduplicated and seen articles are dropped in memory
+3. Score      - every candidate is scored in one vectorized pass over
+                recency, preference weight, popularity, sentiment and CF signals
+4. Rank       - global top-k over the combined score, one article per story cluster
+
+Sources and features are pluggable; per-stage timings are kept on the pipeline
+(`timings`, in milliseconds) so ranking quality can be tuned without adding
+per-request queries.
+"""
+
+import math
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.conf import settings
+
+from .models import NewsArticle, ArticleSave
+from .trending import get_trending_articles
+
+logger = logging.getLogger(__name__)
+
+
+class RecommendationContext:
+    """Per-request inputs shared by all stages"""
+
+    def __init__(self, user_id, category_prefs, seen, limit):
+        self.user_id = user_id
+        self.category_prefs = category_prefs or {}
+        self.seen = seen if seen is not None else set()
+        self.limit = limit
+        self.candidate_limit = limit * settings.RECOMMENDATION_OVERFETCH
+        self.top_categories = list(self.category_prefs.keys())[:3]
+        self.since = datetime.utcnow() - timedelta(days=7)
+
+
+# ============= Candidate Sources =============
+
+class CandidateSource:
+    """Base class: a source returns a list of article dicts for a context"""
+    name = 'base'
+
+    def fetch(self, context):
+        raise NotImplementedError
+
+
+class CategorySource(CandidateSource):
+    """Recent articles from the user's top categories (single $in query)"""
+    name = 'category'
+
+    def fetch(self, context):
+        if not context.top_categories:
+            return []
+        return NewsArticle.get_all(
+            filters={
+                'category': {'$in': context.top_categories},
+                'published_at': {'$gte': context.since}
+            },
+            limit=context.candidate_limit,
+            sort_by='published_at'
+        )
+
+
+class TrendingSource(CandidateSource):
+    """Top articles by precomputed trending_score"""
+    name = 'trending'
+
+    def fetch(self, context):
+        return get_trending_articles(limit=context.candidate_limit)
+
+
+class SimilarToSavedSource(CandidateSource):
+    """Articles sharing category and sentiment with the user's latest saves"""
+    name = 'similar_to_saved'
+    recent_saves = 5
+
+    def fetch(self, context):
+        saves = ArticleSave.get_collection().find(
+            {'user_id': context.user_id}, {'article_id': 1}
+        ).sort('timestamp', -1).limit(self.recent_saves)
+        saved = NewsArticle.get_by_ids([save['article_id'] for save in saves])
+        if not saved:
+            return []
+
+        pairs = {(a.get('category'), a.get('sentiment')) for a in saved}
+        return NewsArticle.get_all(
+            filters={
+                '$or': [{'category': c, 'sentiment': s} for c, s in pairs],
+                'published_at': {'$gte': context.since}
+            },
+            limit=context.candidate_limit,
+            sort_by='published_at'
+        )
+
+
+class FreshSource(CandidateSource):
+    """Newest articles regardless of category, for exploration"""
+    name = 'fresh'
+
+    def fetch(self, context):
+        return NewsArticle.get_all(limit=context.candidate_limit, sort_by='published_at')
+
+
+class CollaborativeSource(CandidateSource):
+    """Top-k from the offline-trained collaborative filtering model"""
+    name = 'collaborative'
+
+    def fetch(self, context):
+        from .recommendations import RecommendationEngine
+        return RecommendationEngine.get_collaborative_articles(
+            context.user_id, limit=context.candidate_limit, exclude=context.seen
+        )
+
+
+DEFAULT_SOURCES = [
+    CollaborativeSource,
+    CategorySource,
+    SimilarToSavedSource,
+    TrendingSource,
+    FreshSource,
+]
+
+
+# ============= Features =============
+# Each feature maps (candidates, context) -> float array in [0, 1]
+
+def _parse_published(value):
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+    except (TypeError, ValueError):
+        return None
+
+
+def recency_feature(candidates, context):
+    """Exponential decay on article age (RECOMMENDATION_RECENCY_HALF_LIFE_HOURS)"""
+    now = datetime.utcnow()
+    half_life = settings.RECOMMENDATION_RECENCY_HALF_LIFE_HOURS
+    ages = np.array([
+        (now - published).total_seconds() / 3600 if published else 24 * 30
+        for published in (_parse_published(a.get('published_at')) for a in candidates)
+    ], dtype=np.float32)
+    return np.exp(-math.log(2) * np.clip(ages, 0, None) / half_life)
+
+
+def preference_feature(candidates, context):
+    """User's category preference weight (0-100%) for the article's category"""
+    return np.array([
+        context.category_prefs.get(a.get('category'), 0.0) / 100.0 for a in candidates
+    ], dtype=np.float32)
+
+
+def popularity_feature(candidates, context):
+    """log-scaled trending score, normalized to the best candidate"""
+    scores = np.log1p(np.array([
+        max(a.get('trending_score') or 0.0, 0.0) for a in candidates
+    ], dtype=np.float32))
+    top = scores.max() if len(scores) else 0.0
+    return scores / top if top > 0 else scores
+
+
+SENTIMENT_VALUES = {'positive': 1.0, 'neutral': 0.0, 'negative': -1.0}
+
+
+def sentiment_feature(candidates, context):
+    """Signed sentiment confidence mapped to [0, 1] (negative -> 0, positive -> 1)"""
+    signed = np.array([
+        SENTIMENT_VALUES.get(str(a.get('sentiment') or '').lower(), 0.0)
+        * (a.get('sentiment_confidence') or 0.0)
+        for a in candidates
+    ], dtype=np.float32)
+    return (signed + 1.0) / 2.0
+
+
+def collaborative_feature(candidates, context):
+    """Rank-based CF score: 1 for the CF model's top pick, decaying to 0"""
+    ranks = np.array([
+        a.get('_sources', {}).get(CollaborativeSource.name, -1) for a in candidates
+    ], dtype=np.float32)
+    return np.where(ranks >= 0, 1.0 - ranks / max(context.candidate_limit, 1), 0.0)
+
+
+DEFAULT_FEATURES = {
+    'recency': recency_feature,
+    'preference': preference_feature,
+    'popularity': popularity_feature,
+    'sentiment': sentiment_feature,
+    'collaborative': collaborative_feature,
+}
+
+
+# ============= Pipeline =============
+
+class RecommendationPipeline:
+    """Candidate generation -> merge -> vectorized scoring -> top-k"""
+
+    def __init__(self, sources=None, features=None, weights=None, max_workers=None):
+        self.sources = [source() for source in (sources or DEFAULT_SOURCES)]
+        self.features = features or DEFAULT_FEATURES
+        self.weights = weights or settings.RECOMMENDATION_WEIGHTS
+        self.max_workers = max_workers or len(self.sources)
+        self.timings = {}
+
+    def _timed(self, stage, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.timings[stage] = round((time.perf_counter() - start) * 1000, 2)
+        return result
+
+    def _fetch_source(self, source, context):
+        try:
+            return self._timed(f'source.{source.name}', source.fetch, context)
+        except Exception as e:
+            logger.error(f"Recommendation source {source.name} failed: {e}")
+            return []
+
+    def generate_candidates(self, context):
+        """Query every source in parallel"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(lambda s: self._fetch_source(s, context), self.sources))
+        return list(zip(self.sources, results))
+
+    def merge(self, sourced, context):
+        """Deduplicate by _id, drop seen articles, remember each source's rank"""
+        merged = {}
+        for source, articles in sourced:
+            for rank, article in enumerate(articles):
+                article_id = article['_id']
+                if article_id in context.seen:
+                    continue
+                if article_id not in merged:
+                    article['_sources'] = {}
+                    merged[article_id] = article
+                merged[article_id]['_sources'][source.name] = rank
+        return list(merged.values())
+
+    def score(self, candidates, context):
+        """One vectorized pass: weighted sum of feature columns"""
+        if not candidates:
+            return np.zeros(0, dtype=np.float32)
+        total = np.zeros(len(candidates), dtype=np.float32)
+        for name, feature in self.features.items():
+            weight = self.weights.get(name, 0.0)
+            if weight:
+                total += weight * feature(candidates, context)
+        return total
+
+    def rank(self, candidates, scores, limit):
+        """Top-k by score, one article per story cluster"""
+        if not candidates:
+            return []
+        # Over-select so lower-scored versions of a ranked story can be skipped without a full sort
+        k = min(limit * 2, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        ranked = self._distinct_stories(candidates, scores, top[np.argsort(-scores[top])], limit)
+        if len(ranked) < limit and k < len(candidates):
+            ranked = self._distinct_stories(candidates, scores, np.argsort(-scores), limit)
+        return ranked
+
+    @staticmethod
+    def _distinct_stories(candidates, scores, order, limit):
+        ranked = []
+        clusters = set()
+        for idx in order:
+            article = candidates[idx]
+            cluster_id = article.get('cluster_id')
+            if cluster_id:
+                if cluster_id in clusters:
+                    continue
+                clusters.add(cluster_id)
+            article.pop('_sources', None)
+            article['recommendation_score'] = round(float(scores[idx]), 4)
+            ranked.append(article)
+            if len(ranked) >= limit:
+                break
+        return ranked
+
+    def run(self, user_id, category_prefs, seen, limit=20):
+        self.timings = {}
+        start = time.perf_counter()
+        context = RecommendationContext(user_id, category_prefs, seen, limit)
+
+        sourced = self._timed('candidates', self.generate_candidates, context)
+        candidates = self._timed('merge', self.merge, sourced, context)
+        scores = self._timed('score', self.score, candidates, context)
+        ranked = self._timed('rank', self.rank, candidates, scores, limit)
+
+        self.timings['total'] = round((time.perf_counter() - start) * 1000, 2)
+        logger.debug(f"Recommendation pipeline for user {user_id}: {len(candidates)} candidates, timings(ms)={self.timings}")
+        return ranked
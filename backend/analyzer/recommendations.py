@@ -3,8 +3,11 @@ Recommendation System for AI News Analyzer
 Analyzes user interactions to provide personalized news recommendations
 """
 
-from .models import UserInteraction, NewsArticle
-from collections import defaultdict, Counter
+from django.conf import settings
+from .models import UserInteraction, NewsArticle, RecommendationFeed, UserSeenFilter
+from .trending import get_trending_articles
+from .story_clusters import dedupe_by_cluster
+from collections import defaultdict
 from datetime import datetime, timedelta
 
 
@@ -17,36 +20,29 @@ class RecommendationEngine:
         Analyze user interactions to determine category preferences
         Returns dict with category weights based on interaction types
         """
-        interactions = UserInteraction.get_by_user(user_id)
+        # Calculate cutoff date
+        cutoff_date = datetime.utcnow() - timedelta(days=days)
+        
+        # Only recent interactions are relevant
+        interactions = UserInteraction.get_by_user(user_id, since=cutoff_date)
         
         if not interactions:
             return {}
         
-        # Weight different interaction types
-        WEIGHTS = {
-            'save': 5,    # Saves are strongest signal
-            'like': 3,    # Likes are medium signal
-            'view': 1     # Views are weakest signal
+        # Look up all article categories in one query instead of one per interaction
+        article_ids = list({inter.get('article_id') for inter in interactions})
+        categories = {
+            article['_id']: article.get('category')
+            for article in NewsArticle.get_by_ids(article_ids)
         }
         
         category_scores = defaultdict(float)
         
-        # Calculate cutoff date
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        
         for interaction in interactions:
-            # Skip old interactions
-            if interaction.get('created_at', datetime.min) < cutoff_date:
-                continue
-                
-            article_id = interaction.get('article_id')
-            interaction_type = interaction.get('interaction_type')
-            
-            # Get article to find its category
-            article = NewsArticle.get_by_id(article_id)
-            if article and 'category' in article:
-                category = article['category']
-                weight = WEIGHTS.get(interaction_type, 1)
+            category = categories.get(interaction.get('article_id'))
+            if category:
+                # Weight different interaction types
+                weight = UserInteraction.WEIGHTS.get(interaction.get('interaction_type'), 1)
                 category_scores[category] += weight
         
         # Normalize scores to percentages
@@ -62,65 +58,48 @@ class RecommendationEngine:
         return {}
     
     @staticmethod
-    def get_recommended_articles(user_id, limit=20):
+    def get_recommended_articles(user_id, limit=20, category_prefs=None):
         """
         Get personalized article recommendations for a user
         
-        Algorithm:
+        Algorithm (see recommendation_pipeline.py):
         1. Get user's category preferences
-        2. Fetch recent articles from preferred categories
-        3. Exclude already viewed/saved articles
-        4. Prioritize by sentiment and recency
+        2. Pull candidates in parallel (collaborative, category, similar-to-saved,
+           trending, fresh)
+        3. Merge, deduplicate and exclude already viewed/saved articles
+        4. Score all candidates in one pass on recency, preference, popularity,
+           sentiment and CF rank, and return the global top-k (one article per story cluster)
         """
+        from .recommendation_pipeline import RecommendationPipeline
+        
         # Get user preferences
-        category_prefs = RecommendationEngine.get_user_category_preferences(user_id)
+        if category_prefs is None:
+            category_prefs = RecommendationEngine.get_user_category_preferences(user_id)
         
         if not category_prefs:
-            # New user or no interactions - return trending articles
-            return NewsArticle.get_all(
-                filters={
-                    'published_at': {'$gte': datetime.utcnow() - timedelta(days=7)}
-                },
-                limit=limit,
-                sort_by='sentiment_confidence'
-            )
-        
-        # Get user's interaction history to exclude seen articles
-        interactions = UserInteraction.get_by_user(user_id)
-        viewed_article_ids = {inter.get('article_id') for inter in interactions}
-        
-        # Get top 3 preferred categories
-        top_categories = list(category_prefs.keys())[:3]
-        
-        recommended = []
-        per_category_limit = limit // len(top_categories) + 1
-        
-        for category in top_categories:
-            # Get recent articles from this category
-            articles = NewsArticle.get_all(
-                filters={
-                    'category': category,
-                    'published_at': {'$gte': datetime.utcnow() - timedelta(days=7)},
-                    '_id': {'$nin': list(viewed_article_ids)}  # Exclude viewed
-                },
-                limit=per_category_limit,
-                sort_by='published_at'
-            )
-            recommended.extend(articles)
-        
-        # If not enough articles, fill with general trending
-        if len(recommended) < limit:
-            additional = NewsArticle.get_all(
-                filters={
-                    'published_at': {'$gte': datetime.utcnow() - timedelta(days=7)},
-                    '_id': {'$nin': list(viewed_article_ids)}
-                },
-                limit=limit - len(recommended),
-                sort_by='sentiment_confidence'
-            )
-            recommended.extend(additional)
-        
-        return recommended[:limit]
+            # New user or no interactions - return trending articles (one per story)
+            return dedupe_by_cluster(get_trending_articles(limit=limit * 2), limit=limit)
+        
+        # Compact per-user seen-set; applied in memory so query size stays constant
+        seen = UserSeenFilter.get(user_id)
+        
+        pipeline = RecommendationPipeline()
+        return pipeline.run(user_id, category_prefs, seen, limit=limit)
+    
+    @staticmethod
+    def get_collaborative_articles(user_id, limit=20, exclude=None):
+        """
+        Get recommendations from the offline-trained collaborative filtering model
+        Returns an empty list if no model is trained or the user is unknown to it
+        """
+        from .collaborative import get_cf_model
+        
+        cf_model = get_cf_model()
+        if cf_model is None or not cf_model.has_user(user_id):
+            return []
+        
+        article_ids = cf_model.recommend(user_id, limit=limit, exclude=exclude)
+        return NewsArticle.get_by_ids(article_ids)
     
     @staticmethod
     def get_similar_articles(article_id, limit=5):
@@ -149,8 +128,45 @@ class RecommendationEngine:
 
 def get_personalized_feed(user_id, page=1, limit=20):
     """
-    Get personalized news feed for a user
-    Wrapper function for easy use in views
+    Get one page of the personalized news feed for a user
+    
+    The full ranked feed is cached per user as an article id list (RecommendationFeed)
+    and pages are sliced from it. The cache expires after RECOMMENDATION_FEED_TTL and
+    is invalidated on user interactions and on fetches that add articles in the
+    user's top categories.
+    
+    Returns: dict with 'articles', 'total_count' and 'preferences'
     """
+    start = (page - 1) * limit
+    feed = RecommendationFeed.get(user_id)
+    
+    if feed is not None:
+        page_ids = feed['article_ids'][start:start + limit]
+        return {
+            'articles': NewsArticle.get_by_ids(page_ids),
+            'total_count': len(feed['article_ids']),
+            'preferences': feed.get('preferences', {})
+        }
+    
+    # Cache miss: rank the whole feed once, store the ids and serve the page directly
     engine = RecommendationEngine()
-    return engine.get_recommended_articles(user_id, limit=limit)
+    category_prefs = engine.get_user_category_preferences(user_id)
+    articles = engine.get_recommended_articles(
+        user_id,
+        limit=settings.RECOMMENDATION_FEED_SIZE,
+        category_prefs=category_prefs
+    )
+    
+    RecommendationFeed.store(
+        user_id,
+        article_ids=[article['_id'] for article in articles],
+        top_categories=list(category_prefs.keys())[:3],
+        preferences=category_prefs,
+        ttl_seconds=settings.RECOMMENDATION_FEED_TTL
+    )
+    
+    return {
+        'articles': articles[start:start + limit],
+        'total_count': len(articles),
+        'preferences': category_prefs
+    }
@@ -0,0 +1,105 @@
+"""
+On-disk cache of raw news provider responses
+
+FETCH_CACHE_MODE:
+- 'off'    : nothing is written (default)
+- 'record' : every successful provider response is written to FETCH_CACHE_DIR
+- 'replay' : no network access; responses are read back from FETCH_CACHE_DIR
+             (missing ones count as empty) and high-water marks are neither used
+             nor advanced, so a replayed fetch is deterministic and works offline
+
+Files are <FETCH_CACHE_DIR>/<provider>/<key>.json, one per request. The key covers
+the endpoint and its parameters except API keys and the incremental `from`
+filter, so a replay finds the response recorded for the same query. Newer
+recordings of the same query replace older ones.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from datetime import datetime
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MODES = ('off', 'record', 'replay')
+# Not part of the cache key: credentials and the high-water filter
+VOLATILE_PARAMS = {'apiKey', 'apikey', 'from'}
+
+
+class ResponseCache:
+    """Records provider responses to disk and replays them"""
+
+    def __init__(self, root=None, mode=None):
+        self.root = root or settings.FETCH_CACHE_DIR
+        self.mode = mode or settings.FETCH_CACHE_MODE
+        if self.mode not in MODES:
+            raise ValueError(f"FETCH_CACHE_MODE must be one of {', '.join(MODES)}, got '{self.mode}'")
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    @staticmethod
+    def query_params(params):
+        """Parameters that identify a query (credentials and `from` removed)"""
+        return {k: v for k, v in sorted(params.items()) if k not in VOLATILE_PARAMS and v is not None}
+
+    def key(self, url, params):
+        query = json.dumps({'url': url, 'params': self.query_params(params)}, sort_keys=True)
+        return hashlib.sha1(query.encode('utf-8')).hexdigest()
+
+    def path(self, provider, url, params):
+        return os.path.join(self.root, provider, f'{self.key(url, params)}.json')
+
+    def load(self, provider, url, params):
+        """Recorded response body of a query, or None if it was never recorded"""
+        path = self.path(provider, url, params)
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)['body']
+        except FileNotFoundError:
+            logger.warning(f"No recorded {provider} response for {self.query_params(params)}")
+            return None
+
+    def store(self, provider, category, url, params, body, headers=None):
+        """Write a response (only in record mode); written atomically"""
+        if self.mode != 'record':
+            return
+        path = self.path(provider, url, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {
+            'provider': provider,
+            'category': category,
+            'url': url,
+            'params': self.query_params(params),
+            'headers': {k: v for k, v in (headers or {}).items() if k.lower() in ('etag', 'last-modified', 'date')},
+            'recorded_at': datetime.utcnow().isoformat(),
+            'body': body,
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def entries(self, provider=None):
+        """Metadata (provider, category, url, params, recorded_at) of the recorded responses"""
+        providers = [provider] if provider else sorted(os.listdir(self.root)) if os.path.isdir(self.root) else []
+        for name in providers:
+            directory = os.path.join(self.root, name)
+            if not os.path.isdir(directory):
+                continue
+            for filename in sorted(os.listdir(directory)):
+                if not filename.endswith('.json'):
+                    continue
+                with open(os.path.join(directory, filename), encoding='utf-8') as f:
+                    entry = json.load(f)
+                entry.pop('body', None)
+                yield entry
@@ -0,0 +1,185 @@
+"""
+Scheduled incremental retraining of the text sentiment model
+
+1. Collect labels: admin corrections (SentimentLabel, source='admin') plus articles
+   where the text and image models agreed with high confidence (source='agreement')
+2. Build a fine-tuning set: the bundled dataset.csv + all labels, with a
+   deterministic ~10% (by hash) held out for evaluation
+3. Fine-tune from the current checkpoint for a few epochs, keeping its vocabulary
+4. Evaluate the current and the candidate model on the same held-out set
+5. Register and promote the candidate in the model registry only if it improves;
+   running processes swap to it in the background (see model_registry)
+"""
+
+import csv
+import zlib
+import logging
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import torch
+from django.conf import settings
+
+from .models import NewsArticle, SentimentLabel, ModelTrainingRun
+from .dl_model import SentimentAnalyzer
+from .model_registry import ModelRegistry
+from .text_corpus import build_corpus, load_corpus
+from .train_dl_model import train, evaluate, CSV_PATH
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = 'text'
+
+
+def _is_holdout(key, fraction):
+    """Stable held-out assignment so the evaluation set doesn't move between runs"""
+    return zlib.crc32(key.encode('utf-8')) % 1000 < fraction * 1000
+
+
+def collect_agreement_labels(since=None, min_confidence=None):
+    """
+    Turn confident text/image agreement on recent articles into training labels
+    Returns: number of new labels
+    """
+    min_confidence = min_confidence or settings.RETRAIN_AGREEMENT_CONFIDENCE
+    query = {
+        '$expr': {'$eq': ['$text_sentiment', '$image_sentiment']},
+        'text_confidence': {'$gte': min_confidence},
+        'image_confidence': {'$gte': min_confidence},
+    }
+    if since:
+        query['fetched_at'] = {'$gte': since}
+
+    articles = NewsArticle.get_collection().find(
+        query, {'title': 1, 'description': 1, 'text_sentiment': 1}
+    )
+    labels = (
+        (article['_id'], _article_text(article), article['text_sentiment'])
+        for article in articles
+    )
+    return SentimentLabel.upsert_many(labels, source='agreement')
+
+
+def _article_text(article):
+    """Same text the ingest path scores: title + description"""
+    title = article.get('title') or ''
+    description = article.get('description')
+    return f"{title}. {description}" if description else title
+
+
+def _split_rows(holdout_fraction):
+    """Return (train rows, holdout rows) of (text, label) from the base dataset and all labels"""
+    train_rows, holdout_rows = [], []
+
+    with open(CSV_PATH, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            text = row.get('text')
+            if not text:
+                continue
+            target = holdout_rows if _is_holdout(text, holdout_fraction) else train_rows
+            target.append((text, row.get('sentiment')))
+
+    for label in SentimentLabel.iter_all():
+        row = (label['text'], SentimentLabel.LABELS[label['sentiment']])
+        target = holdout_rows if _is_holdout(label['article_id'], holdout_fraction) else train_rows
+        target.append(row)
+
+    return train_rows, holdout_rows
+
+
+def _write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['text', 'sentiment'])
+        writer.writerows(rows)
+
+
+def _evaluate_on(model, corpus_dir):
+    tokens, labels, _ = load_corpus(corpus_dir)
+    loss, accuracy = evaluate(model, tokens, labels, torch.arange(len(labels)))
+    return {'loss': round(loss, 4), 'accuracy': round(accuracy, 2)}
+
+
+def _is_improvement(candidate, baseline):
+    """Higher held-out accuracy by the configured margin, or equal accuracy with lower loss"""
+    if candidate['accuracy'] - baseline['accuracy'] > settings.RETRAIN_MIN_IMPROVEMENT:
+        return True
+    return candidate['accuracy'] >= baseline['accuracy'] and candidate['loss'] < baseline['loss']
+
+
+def retrain_text_model(force=False):
+    """
+    Fine-tune the text model on new labels and promote it if it beats the current one
+    Returns: the ModelTrainingRun status ('promoted', 'rejected' or 'skipped')
+    """
+    # Harvest incrementally from the last run of any kind, but count labels from the
+    # last real training so that skipped days accumulate towards RETRAIN_MIN_NEW_LABELS
+    last_run = ModelTrainingRun.get_last(MODEL_NAME)
+    last_trained = ModelTrainingRun.get_last_trained(MODEL_NAME)
+
+    harvested = collect_agreement_labels(since=last_run['created_at'] if last_run else None)
+    new_labels = SentimentLabel.count(since=last_trained['created_at'] if last_trained else None)
+    logger.info(f"Retraining: {harvested} agreement labels harvested, {new_labels} new labels since last training")
+
+    if not force and new_labels < settings.RETRAIN_MIN_NEW_LABELS:
+        ModelTrainingRun.create(MODEL_NAME, 'skipped', label_count=new_labels)
+        return 'skipped'
+
+    registry = ModelRegistry()
+    current_version = registry.current_version(MODEL_NAME)
+    current = SentimentAnalyzer(registry.verify(MODEL_NAME, current_version) if current_version else None)
+    version = datetime.utcnow().strftime('v%Y%m%d%H%M%S')
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = Path(work_dir)
+        candidate_dir = work_dir / 'candidate'
+        train_rows, holdout_rows = _split_rows(settings.RETRAIN_HOLDOUT_FRACTION)
+        _write_csv(work_dir / 'train.csv', train_rows)
+        _write_csv(work_dir / 'holdout.csv', holdout_rows)
+
+        # Tokenize with the current vocabulary so the checkpoint's embeddings still line up
+        build_corpus(work_dir / 'holdout.csv', work_dir / 'holdout', vocab=current.vocab)
+
+        train(
+            csv_path=work_dir / 'train.csv',
+            corpus_dir=work_dir / 'corpus',
+            output_dir=candidate_dir,
+            epochs=settings.RETRAIN_EPOCHS,
+            patience=settings.RETRAIN_PATIENCE,
+            num_threads=settings.RETRAIN_THREADS,
+            init_checkpoint=current.model_path,
+            vocab=current.vocab,
+            rebuild_corpus=True,
+            verbose=False
+        )
+
+        baseline = _evaluate_on(current.model, work_dir / 'holdout')
+        candidate = _evaluate_on(SentimentAnalyzer(candidate_dir).model, work_dir / 'holdout')
+
+        metrics = {
+            'baseline': baseline,
+            'candidate': candidate,
+            'base_version': current.version,
+            'train_samples': len(train_rows),
+            'holdout_samples': len(holdout_rows),
+        }
+        logger.info(f"Retraining {version}: held-out accuracy {baseline['accuracy']}% -> {candidate['accuracy']}%")
+
+        # Only improvements are kept; rejected candidates vanish with the work dir
+        status = 'rejected'
+        if _is_improvement(candidate, baseline):
+            registry.register(
+                MODEL_NAME,
+                {
+                    'sentiment_cnn.pth': candidate_dir / 'sentiment_cnn.pth',
+                    'vocab.pkl': candidate_dir / 'vocab.pkl',
+                },
+                metadata={'metrics': metrics},
+                version=version,
+                promote=True
+            )
+            status = 'promoted'
+
+    ModelTrainingRun.create(MODEL_NAME, status, version=version, metrics=metrics, label_count=new_labels)
+    return status
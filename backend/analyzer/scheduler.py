@@ -1,32 +1,77 @@
 """
 Background task scheduler for automatic news fetching
-Uses APScheduler to fetch news every 6 hours
+Uses APScheduler to fetch news through the quota-aware planner
 """
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from django.conf import settings
-from .models import User, UserProfile
+from datetime import datetime, timezone
+from .scheduler_lock import exclusive
 import logging
 
 logger = logging.getLogger(__name__)
 
 scheduler = BackgroundScheduler()
 
+FETCH_INTERVAL_START = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
 
 def fetch_news_task():
-    """Background task to fetch news from all APIs"""
+    """Background task to fetch news within each provider's daily quota (see fetch_planner)"""
     try:
-        from .news_fetcher import NewsAggregator
+        from .fetch_planner import FetchPlanner
+        from .models import FetchLog
         
-        logger.info("Starting scheduled news fetch...")
-        aggregator = NewsAggregator()
-        count = aggregator.fetch_all_news()
+        start_time = datetime.utcnow()
+        count = FetchPlanner().run()
+        FetchLog.create(
+            articles_count=count,
+            status='success',
+            duration=(datetime.utcnow() - start_time).total_seconds()
+        )
         logger.info(f"Scheduled fetch completed: {count} new articles saved")
     except Exception as e:
         logger.error(f"Error in scheduled news fetch: {e}")
 
 
+def train_recommender_task():
+    """Background task to retrain the collaborative filtering recommender"""
+    try:
+        from .collaborative import train_cf_model
+        
+        logger.info("Starting scheduled CF recommender training...")
+        model = train_cf_model()
+        if model is not None:
+            logger.info(f"CF recommender trained: {len(model.user_ids)} users, {len(model.item_ids)} articles")
+    except Exception as e:
+        logger.error(f"Error in CF recommender training: {e}")
+
+
+def compute_trending_task():
+    """Background task to recompute time-decayed trending scores"""
+    try:
+        from .trending import compute_trending_scores
+        
+        count = compute_trending_scores()
+        logger.info(f"Trending scores updated for {count} articles")
+    except Exception as e:
+        logger.error(f"Error computing trending scores: {e}")
+
+
+def retrain_text_model_task():
+    """Background task to fine-tune the text model on new labels (promoted only if it improves)"""
+    try:
+        from .retraining import retrain_text_model
+        
+        logger.info("Starting scheduled text model retraining...")
+        status = retrain_text_model()
+        logger.info(f"Text model retraining finished: {status}")
+    except Exception as e:
+        logger.error(f"Error in text model retraining: {e}")
+
+
 def send_daily_digests_task():
     """Background task to send daily digests to all subscribed users"""
     try:
@@ -35,18 +80,8 @@ def send_daily_digests_task():
         logger.info("Starting daily digest sending task...")
         email_service = EmailService()
         
-        # Get all users
-        users = User.objects.filter(is_active=True)
-        sent_count = 0
-        
-        for user in users:
-            # Check profile preferences
-            profile = UserProfile.get_by_user_id(user.id)
-            if profile and profile.get('notification_enabled', True):
-                # Check frequency (daily vs weekly) - simplified for now to just daily
-                if profile.get('notification_frequency', 'daily') == 'daily':
-                    if email_service.send_daily_digest(user.id):
-                        sent_count += 1
+        # Shared per-category queries + one profile cursor (see digest.DigestRun)
+        sent_count = email_service.send_daily_digests()
         
         logger.info(f"Daily digests sent to {sent_count} users")
         
@@ -54,29 +89,89 @@ def send_daily_digests_task():
         logger.error(f"Error in daily digest task: {e}")
 
 
+def resume_digests_task():
+    """Background task to finish today's digest run if it was interrupted (e.g. pod restart)"""
+    try:
+        from .digest_job import daily_run_id, is_incomplete
+        from .email_service import EmailService
+        
+        run_id = daily_run_id()
+        if is_incomplete(run_id):
+            logger.info(f"Resuming interrupted digest run {run_id}...")
+            sent_count = EmailService().send_daily_digests(run_id=run_id)
+            logger.info(f"Resumed digest run sent {sent_count} digests")
+    except Exception as e:
+        logger.error(f"Error resuming daily digests: {e}")
+
+
+def add_jobs(target, owner=None):
+    """
+    Register all jobs on a scheduler
+    Each job runs under a distributed lock (see scheduler_lock), so with several
+    replicas only one of them runs a given trigger; `owner` identifies the lock holder
+    """
+    # Plan and run news fetches every FETCH_PLAN_INTERVAL_MINUTES, paced by provider quotas
+    # (any interval; the fixed start keeps every replica's trigger on the same slots)
+    target.add_job(
+        exclusive('fetch_news', fetch_news_task, owner),
+        trigger=IntervalTrigger(minutes=settings.FETCH_PLAN_INTERVAL_MINUTES, start_date=FETCH_INTERVAL_START),
+        id='fetch_news',
+        name='Fetch news within provider quotas',
+        replace_existing=True
+    )
+    
+    # Send daily digests at 8:00 AM
+    target.add_job(
+        exclusive('send_digests', send_daily_digests_task, owner),
+        trigger=CronTrigger(hour=8, minute=0),
+        id='send_digests',
+        name='Send daily email digests',
+        replace_existing=True
+    )
+    
+    # Pick up interrupted digest runs (shards whose lease expired) every 15 minutes
+    target.add_job(
+        exclusive('resume_digests', resume_digests_task, owner),
+        trigger=CronTrigger(minute='*/15'),
+        id='resume_digests',
+        name='Resume interrupted daily digests',
+        replace_existing=True
+    )
+    
+    # Retrain collaborative filtering recommender daily at 3:00 AM
+    target.add_job(
+        exclusive('train_recommender', train_recommender_task, owner),
+        trigger=CronTrigger(hour=3, minute=0),
+        id='train_recommender',
+        name='Train collaborative filtering recommender',
+        replace_existing=True
+    )
+    
+    # Fine-tune the text model on new labels daily at 4:00 AM
+    target.add_job(
+        exclusive('retrain_text_model', retrain_text_model_task, owner),
+        trigger=CronTrigger(hour=4, minute=0),
+        id='retrain_text_model',
+        name='Retrain text sentiment model',
+        replace_existing=True
+    )
+    
+    # Recompute trending scores every 30 minutes
+    target.add_job(
+        exclusive('compute_trending', compute_trending_task, owner),
+        trigger=CronTrigger(minute='0,30'),
+        id='compute_trending',
+        name='Compute trending scores',
+        replace_existing=True
+    )
+
+
 def start_scheduler():
     """Start the background scheduler"""
     if not scheduler.running:
-        # Fetch news every 6 hours (at 00:00, 06:00, 12:00, 18:00)
-        scheduler.add_job(
-            fetch_news_task,
-            trigger=CronTrigger(hour='0,6,12,18', minute=0),
-            id='fetch_news',
-            name='Fetch news from all APIs',
-            replace_existing=True
-        )
-        
-        # Send daily digests at 8:00 AM
-        scheduler.add_job(
-            send_daily_digests_task,
-            trigger=CronTrigger(hour=8, minute=0),
-            id='send_digests',
-            name='Send daily email digests',
-            replace_existing=True
-        )
-        
+        add_jobs(scheduler)
         scheduler.start()
-        logger.info("Scheduler started (News: 6h, Emails: 8am)")
+        logger.info(f"Scheduler started (News: {settings.FETCH_PLAN_INTERVAL_MINUTES}min quota-paced, Emails: 8am (resume: 15min), Recommender: 3am, Retraining: 4am, Trending: 30min)")
 
 
 def stop_scheduler():
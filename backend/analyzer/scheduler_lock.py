@@ -0,0 +1,74 @@
+"""
+Distributed lock for scheduler jobs
+
+Every replica starts APScheduler (AnalyzerConfig.ready), so each job is wrapped
+with exclusive(): it only runs on the replica that acquires the job's lease in
+MongoDB (SchedulerLock). While the job runs the lease is renewed in the
+background; afterwards it is held for SCHEDULER_LOCK_MIN_HOLD_SECONDS from the
+start, so a replica whose trigger fires slightly later skips the same slot.
+A crashed holder's lease simply expires after SCHEDULER_LOCK_TTL_SECONDS.
+"""
+
+import os
+import socket
+import logging
+import threading
+import functools
+from datetime import datetime, timedelta
+
+from django.conf import settings
+
+from .models import SchedulerLock
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _renew_until(name, owner, ttl_seconds, stopped):
+    while not stopped.wait(ttl_seconds / 3):
+        try:
+            if not SchedulerLock.renew(name, owner, ttl_seconds):
+                logger.warning(f"Lost scheduler lock '{name}' while the job was still running")
+                return
+        except Exception as e:
+            logger.error(f"Error renewing scheduler lock '{name}': {e}")
+
+
+def exclusive(name, func, owner=None, ttl_seconds=None, min_hold_seconds=None):
+    """Wrap a job function so that only the holder of the `name` lease runs it"""
+    owner = owner or DEFAULT_OWNER
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        ttl = ttl_seconds or settings.SCHEDULER_LOCK_TTL_SECONDS
+        min_hold = settings.SCHEDULER_LOCK_MIN_HOLD_SECONDS if min_hold_seconds is None else min_hold_seconds
+
+        try:
+            acquired = SchedulerLock.acquire(name, owner, ttl)
+        except Exception as e:
+            # Without the lock we can't know who runs the job: skip rather than risk a double run
+            logger.error(f"Error acquiring scheduler lock '{name}', skipping: {e}")
+            return None
+        if not acquired:
+            logger.info(f"Skipping '{name}': running on another replica")
+            return None
+
+        started = datetime.utcnow()
+        stopped = threading.Event()
+        renewer = threading.Thread(
+            target=_renew_until, args=(name, owner, ttl, stopped),
+            name=f'lock-renew-{name}', daemon=True
+        )
+        renewer.start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stopped.set()
+            renewer.join()
+            try:
+                SchedulerLock.release(name, owner, hold_until=started + timedelta(seconds=min_hold))
+            except Exception as e:
+                logger.error(f"Error releasing scheduler lock '{name}': {e}")
+
+    return wrapper
@@ -85,6 +85,9 @@ class NewsArticleSerializer(serializers.Serializer):
     view_count = serializers.IntegerField(read_only=True, default=0)
     like_count = serializers.IntegerField(read_only=True, default=0)
     save_count = serializers.IntegerField(read_only=True, default=0)
+    trending_score = serializers.FloatField(read_only=True, default=0.0)
+    cluster_id = serializers.CharField(read_only=True, default=None)
+    cluster_size = serializers.IntegerField(read_only=True, default=1)
     is_liked = serializers.BooleanField(read_only=True, default=False)
     is_saved = serializers.BooleanField(read_only=True, default=False)
 
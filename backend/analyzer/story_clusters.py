@@ -0,0 +1,121 @@
+"""
+Online story clustering
+
+Articles about the same event (not necessarily near duplicates) are grouped into
+story clusters as they are ingested. Each article gets a MinHash signature of
+its content words (title + description, stopwords dropped) and is compared,
+through LSH band keys (`story_bands`), with articles fetched within
+STORY_CLUSTER_WINDOW_HOURS and with the articles of the current run:
+
+- If the most similar one reaches STORY_CLUSTER_THRESHOLD (estimated Jaccard),
+  the article joins its cluster
+- Otherwise it starts a new cluster and becomes its representative
+
+Articles store their `cluster_id`; clusters (StoryCluster) keep the member ids,
+the representative and the size. The news list can collapse clusters, and
+digests and recommendations show one article per story (dedupe_by_cluster).
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from django.conf import settings
+
+from .models import NewsArticle
+from .near_duplicates import SOURCE_SUFFIX, MinHasher, MinHashIndex, normalize
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = frozenset("""
+a about after again against all also an and any are as at be been before being but by can could did do
+does during for from had has have he her his how i if in into is it its just more most new news not of
+on or other our out over says said she so some than that the their them then there these they this to
+up was we were what when where which while who will with would you your
+""".split())
+
+
+def story_features(title, description):
+    """Set of content words of a title (source suffix removed) and description"""
+    words = normalize(SOURCE_SUFFIX.sub('', title or '')) + normalize(description)
+    return {word for word in words if len(word) > 2 and word not in STOPWORDS}
+
+
+def dedupe_by_cluster(articles, limit=None):
+    """Keep the first article of each story cluster (articles without a cluster are kept)"""
+    seen = set()
+    unique = []
+    for article in articles:
+        cluster_id = article.get('cluster_id')
+        if cluster_id:
+            if cluster_id in seen:
+                continue
+            seen.add(cluster_id)
+        unique.append(article)
+        if limit and len(unique) >= limit:
+            break
+    return unique
+
+
+class StoryClusterer:
+    """Assigns articles to story clusters, remembering the clusters created in this run"""
+
+    def __init__(self, threshold=None, num_perm=None, rows=None, window_hours=None, min_features=3):
+        self.threshold = threshold or settings.STORY_CLUSTER_THRESHOLD
+        self.hasher = MinHasher(num_perm or settings.STORY_CLUSTER_PERMUTATIONS, rows or settings.STORY_CLUSTER_ROWS)
+        self.window = timedelta(hours=window_hours or settings.STORY_CLUSTER_WINDOW_HOURS)
+        self.min_features = min_features
+        self.run_index = MinHashIndex(self.hasher)
+
+    def _stored_candidates(self, keys):
+        index = MinHashIndex(self.hasher)
+        if not keys:
+            return index
+        cursor = NewsArticle.get_collection().find(
+            {
+                'story_bands': {'$in': list(keys)},
+                'cluster_id': {'$ne': None},
+                'fetched_at': {'$gte': datetime.utcnow() - self.window}
+            },
+            {'story_minhash': 1, 'story_bands': 1, 'cluster_id': 1}
+        )
+        for doc in cursor:
+            index.add(self.hasher.unpack(doc['story_minhash']), doc['cluster_id'], keys=doc['story_bands'])
+        return index
+
+    def assign_many(self, articles):
+        """
+        For each article: the article fields to store (cluster_id, story signature and band keys)
+        Articles with too little text still get a cluster of their own
+        """
+        signatures = []
+        for article_data in articles:
+            features = story_features(article_data.get('title'), article_data.get('description'))
+            if len(features) < self.min_features:
+                signatures.append((None, None))
+                continue
+            signature = self.hasher.signature(features)
+            signatures.append((signature, self.hasher.band_keys(signature)))
+
+        stored = self._stored_candidates({key for _, keys in signatures if keys for key in keys})
+
+        results = []
+        for signature, keys in signatures:
+            if signature is None:
+                results.append({'cluster_id': str(ObjectId())})
+                continue
+            # Most similar article among stored ones and those of this run (stored wins ties)
+            matches = [
+                match for match in (
+                    stored.best(signature, self.threshold, keys),
+                    self.run_index.best(signature, self.threshold, keys)
+                ) if match
+            ]
+            cluster_id = max(matches, key=lambda match: match[0])[1] if matches else str(ObjectId())
+            self.run_index.add(signature, cluster_id, keys)
+            results.append({
+                'cluster_id': cluster_id,
+                'story_minhash': self.hasher.pack(signature),
+                'story_bands': keys
+            })
+        return results
@@ -0,0 +1,1833 @@
+"""
+Analyzer tests
+
+    python manage.py test analyzer
+
+MongoDB collections are replaced by an in-memory mongomock database per test
+(MongoTestCase); no test touches the Django (djongo) database or the network.
+"""
+
+import csv
+import time
+import tempfile
+from io import BytesIO, StringIO
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
+
+import mongomock
+import numpy as np
+import requests
+import torch
+from bson import ObjectId
+from apscheduler.schedulers.background import BackgroundScheduler
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+from sib_api_v3_sdk.rest import ApiException
+
+from .models import (
+    MongoDB, UserProfile, NewsArticle, EmailLog, DigestShard, SchedulerLock, FetchCursor,
+    RecommendationFeed, UserSeenFilter, ArticleView, SentimentLabel, ModelTrainingRun,
+    JobCheckpoint, ProviderQuota, ProviderFetch,
+)
+from .admin import label_article_view
+from .bloom import BloomFilter
+from .collaborative import CFModel, build_interaction_matrix, train_als, train_cf_model, get_cf_model
+from .digest import DigestRun, render_card
+from .dl_model import text_to_sequence
+from .email_dispatch import EmailDispatcher, EmailMessage, TokenBucket
+from .email_service import EmailService
+from .fetch_planner import FetchPlanner
+from .image_cache import ImageSentimentCache, LRUCache, content_digest
+from .image_model import ImageSentimentAnalyzer
+from .ingest_pipeline import DONE, Stage, IngestPipeline
+from .model_registry import ChecksumError, ModelHandle, ModelRegistry, file_sha256
+from .near_duplicates import MinHasher, MinHashIndex, NearDuplicateDetector, shingles
+from .recommendation_pipeline import CandidateSource, RecommendationPipeline
+from .recommendations import RecommendationEngine, get_personalized_feed
+from .story_clusters import StoryClusterer, story_features, dedupe_by_cluster
+from .news_fetcher import NewsAggregator, NewsAPIFetcher, GNewsFetcher
+from .response_cache import ResponseCache
+from .text_corpus import build_corpus, load_corpus, iterate_batches, is_current
+from .trending import compute_trending_scores, get_trending_articles
+from . import collaborative, retraining, scheduler, train_dl_model, train_image_model, views
+
+
+class MongoTestCase(SimpleTestCase):
+    """Runs each test against a fresh in-memory MongoDB"""
+
+    def setUp(self):
+        super().setUp()
+        self.db = mongomock.MongoClient().db
+        patcher = mock.patch.object(MongoDB, '_instance', self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+@override_settings(
+    BREVO_API_KEY='test-key', DIGEST_SHARDS=2, DIGEST_WORKERS=2,
+    EMAIL_WORKERS=1, EMAIL_RATE_LIMIT=1000, EMAIL_RATE_BURST=1000
+)
+class SendDailyDigestsTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = {
+            user_id: SimpleNamespace(id=user_id, email=f'user{user_id}@example.com', username=f'user{user_id}')
+            for user_id in (1, 2)
+        }
+        for user_id in self.users:
+            UserProfile.create(user_id, notification_categories=['technology'])
+        NewsArticle.get_collection().insert_one({
+            'title': 'Chip makers report record quarter',
+            'description': 'Demand for data center hardware keeps growing.',
+            'url': 'https://example.com/chips',
+            'source': 'Example',
+            'category': 'technology',
+            'sentiment': 'positive',
+            'sentiment_confidence': 0.9,
+            'published_at': datetime.utcnow(),
+        })
+
+        # Users live in the Django database; resolve them from the stubs instead
+        users = self.users
+        patcher = mock.patch.object(
+            DigestRun, '_with_users',
+            staticmethod(lambda profiles: ((users[p['user_id']], p) for p in profiles if p['user_id'] in users))
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.service = EmailService()
+        self.service.api_instance = mock.Mock()
+
+    def test_sends_one_digest_per_subscribed_user(self):
+        sent = self.service.send_daily_digests(run_id='daily_digest:test')
+
+        self.assertEqual(sent, 2)
+        self.assertTrue(self.service.api_instance.send_transac_email.called)
+        self.assertEqual(EmailLog.sent_user_ids('daily_digest:test', [1, 2]), {1, 2})
+        summary = DigestShard.summary('daily_digest:test')
+        self.assertEqual(summary['done'], summary['shards'])
+
+    def test_rerun_does_not_send_again(self):
+        self.service.send_daily_digests(run_id='daily_digest:test')
+        self.service.api_instance.reset_mock()
+
+        self.assertEqual(self.service.send_daily_digests(run_id='daily_digest:test'), 0)
+        self.service.api_instance.send_transac_email.assert_not_called()
+
+    @override_settings(BREVO_API_KEY='')
+    def test_without_api_key_nothing_is_sent(self):
+        service = EmailService()
+        service.api_instance = mock.Mock()
+
+        self.assertEqual(service.send_daily_digests(run_id='daily_digest:test'), 0)
+        service.api_instance.send_transac_email.assert_not_called()
+
+
+@override_settings(SCHEDULER_LOCK_TTL_SECONDS=60, SCHEDULER_LOCK_MIN_HOLD_SECONDS=30)
+class SchedulerLockTests(MongoTestCase):
+    """Two replicas (owners 'a' and 'b') registering the same jobs against one lock collection"""
+
+    def setUp(self):
+        super().setUp()
+        self.runs = []
+        self.during_run = None  # Called from inside the job body, e.g. another replica's trigger
+
+        def compute_trending_task():
+            self.runs.append(datetime.utcnow())
+            during_run, self.during_run = self.during_run, None
+            if during_run:
+                during_run()
+
+        patcher = mock.patch.object(scheduler, 'compute_trending_task', compute_trending_task)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Never started: only the registered (lock-wrapped) job functions are used
+        self.replicas = {}
+        for owner in ('a', 'b'):
+            target = BackgroundScheduler()
+            scheduler.add_jobs(target, owner=owner)
+            self.replicas[owner] = target.get_job('compute_trending').func
+
+    def expire(self, name):
+        SchedulerLock.get_collection().update_one(
+            {'_id': name}, {'$set': {'expires_at': datetime.utcnow() - timedelta(seconds=1)}}
+        )
+
+    def test_concurrent_trigger_runs_once(self):
+        # Replica b fires while a is still running the job
+        self.during_run = self.replicas['b']
+        self.replicas['a']()
+
+        self.assertEqual(len(self.runs), 1)
+
+    def test_late_trigger_in_same_slot_is_skipped(self):
+        self.replicas['a']()
+        self.replicas['b']()
+
+        self.assertEqual(len(self.runs), 1)
+        lock = SchedulerLock.get_collection().find_one({'_id': 'compute_trending'})
+        self.assertEqual(lock['owner'], 'a')
+        self.assertIn('released_at', lock)
+
+    def test_next_slot_runs_on_either_replica(self):
+        self.replicas['a']()
+        self.expire('compute_trending')
+        self.replicas['b']()
+
+        self.assertEqual(len(self.runs), 2)
+        self.assertEqual(SchedulerLock.get_collection().find_one({'_id': 'compute_trending'})['owner'], 'b')
+
+    def test_crashed_holder_is_taken_over_after_lease_expiry(self):
+        # a took the lease and died without releasing it
+        self.assertTrue(SchedulerLock.acquire('compute_trending', 'a', 60))
+        self.replicas['b']()
+        self.assertEqual(self.runs, [])
+
+        self.expire('compute_trending')
+        self.replicas['b']()
+        self.assertEqual(len(self.runs), 1)
+        # a lost its lease and can't renew it anymore
+        self.assertFalse(SchedulerLock.renew('compute_trending', 'a', 60))
+
+    def test_lease_held_by_owner_can_be_reacquired_and_renewed(self):
+        self.assertTrue(SchedulerLock.acquire('job', 'a', 60))
+        self.assertFalse(SchedulerLock.acquire('job', 'b', 60))
+        self.assertTrue(SchedulerLock.acquire('job', 'a', 60))
+        self.assertTrue(SchedulerLock.renew('job', 'a', 60))
+        self.assertFalse(SchedulerLock.renew('job', 'b', 60))
+
+    def test_release_without_hold_frees_the_lease(self):
+        SchedulerLock.acquire('job', 'a', 60)
+        SchedulerLock.release('job', 'a')
+
+        self.assertTrue(SchedulerLock.acquire('job', 'b', 60))
+
+    def test_failing_job_still_releases_with_hold(self):
+        def fail():
+            raise RuntimeError('boom')
+
+        self.during_run = fail
+        with self.assertRaises(RuntimeError):
+            self.replicas['a']()
+
+        lock = SchedulerLock.get_collection().find_one({'_id': 'compute_trending'})
+        self.assertIn('released_at', lock)
+        self.assertFalse(SchedulerLock.acquire('compute_trending', 'b', 60))
+
+
+class StageTests(SimpleTestCase):
+    def assertStopped(self, *stages):
+        for stage in stages:
+            for thread in stage._threads:
+                thread.join(timeout=5)
+                self.assertFalse(thread.is_alive(), f"{thread.name} still running")
+
+    def test_queued_items_are_taken_in_full_batches(self):
+        batches = []
+        stage = Stage('batch', lambda items, emit: batches.append(items), batch_size=3, max_wait=5, queue_size=10)
+        for item in range(7):
+            stage.put(item)
+        stage.put(DONE)
+        stage.start()
+        self.assertStopped(stage)
+
+        # The last, partial batch goes as soon as the stream ends (no wait for max_wait)
+        self.assertEqual(batches, [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertEqual(stage.received, 7)
+
+    def test_partial_batch_is_processed_after_max_wait(self):
+        batches = []
+        stage = Stage('batch', lambda items, emit: batches.append(items), batch_size=10, max_wait=0.05, queue_size=10)
+        stage.start()
+        stage.put('only')
+
+        deadline = time.monotonic() + 5
+        while not batches and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(batches, [['only']])
+
+        stage.put(DONE)
+        self.assertStopped(stage)
+
+    def test_done_reaches_every_downstream_worker(self):
+        collected = []
+        upstream = Stage('double', lambda items, emit: [emit(item * 2) for item in items],
+                         workers=3, batch_size=2, max_wait=0, queue_size=4)
+        downstream = Stage('collect', lambda items, emit: collected.extend(items),
+                           workers=2, batch_size=4, max_wait=0.01, queue_size=4)
+        upstream.downstream = downstream
+
+        IngestPipeline._run_stages([upstream, downstream], range(20))
+
+        self.assertStopped(upstream, downstream)
+        self.assertEqual(sorted(collected), [item * 2 for item in range(20)])
+        self.assertEqual((upstream.emitted, downstream.received), (20, 20))
+        self.assertEqual(downstream.inbox.qsize(), 0)  # One DONE per worker, all consumed
+
+    def test_failed_batch_is_counted_and_the_stream_continues(self):
+        def func(items, emit):
+            if 3 in items:
+                raise ValueError('bad item')
+            for item in items:
+                emit(item)
+
+        collected = []
+        stage = Stage('flaky', func, batch_size=1, max_wait=0, queue_size=4)
+        sink = Stage('collect', lambda items, emit: collected.extend(items), max_wait=0, queue_size=4)
+        stage.downstream = sink
+
+        IngestPipeline._run_stages([stage, sink], range(10))
+
+        self.assertStopped(stage, sink)
+        self.assertEqual(sorted(collected), [0, 1, 2, 4, 5, 6, 7, 8, 9])
+        self.assertEqual(stage.metrics()['errors'], 1)
+
+
+def fetched_article(url, title, description, category='technology', **extra):
+    return {
+        'url': url,
+        'title': title,
+        'description': description,
+        'source': 'Example',
+        'category': category,
+        'published_at': datetime.utcnow(),
+        **extra
+    }
+
+
+@override_settings(INGEST_BATCH_WAIT=0.01, INGEST_FETCH_WORKERS=2, INGEST_IMAGE_WORKERS=2)
+class IngestPipelineTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.aggregator = NewsAggregator(cache=ResponseCache(mode='off'))
+        self.responses = {}
+        self.failing_text_batches = 0
+
+        def request(provider, category=None):
+            return self.responses.get((provider, category), [])
+
+        def analyze_texts(items):
+            if self.failing_text_batches:
+                self.failing_text_batches -= 1
+                raise RuntimeError('text model unavailable')
+            return [{'sentiment': 'positive', 'confidence': 0.9, 'model_version': 'test'} for _ in items]
+
+        for name, func in (('_request', request), ('_analyze_texts', analyze_texts),
+                           ('is_configured', lambda provider: False)):
+            patcher = mock.patch.object(self.aggregator, name, side_effect=func)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_saves_each_new_url_once(self):
+        NewsArticle.create(url='https://example.com/stored', title='Stored earlier')
+        self.responses = {
+            ('gnews', 'technology'): [
+                fetched_article('https://example.com/a', 'Quantum chip breaks error correction record',
+                                'Researchers kept logical qubits stable for a full second in a new experiment.'),
+                fetched_article('https://example.com/stored', 'Stored earlier', 'Already in the database.'),
+                fetched_article(None, 'No URL', 'Articles without a URL are dropped.'),
+            ],
+            ('newsapi', 'technology'): [
+                fetched_article('https://example.com/a', 'Quantum chip breaks error correction record',
+                                'Researchers kept logical qubits stable for a full second in a new experiment.'),
+                fetched_article('https://example.com/b', 'Electric ferry begins service across the bay',
+                                'The battery powered vessel carries four hundred passengers per crossing.'),
+            ],
+        }
+
+        saved = IngestPipeline(self.aggregator).run(list(self.responses))
+
+        self.assertEqual(saved, 2)
+        urls = sorted(doc['url'] for doc in NewsArticle.get_collection().find({}, {'url': 1}))
+        self.assertEqual(urls, ['https://example.com/a', 'https://example.com/b', 'https://example.com/stored'])
+        stored = NewsArticle.get_collection().find_one({'url': 'https://example.com/b'})
+        self.assertEqual(stored['sentiment'], 'positive')
+        self.assertTrue(stored['cluster_id'])
+
+    def test_stage_errors_keep_high_water_marks(self):
+        self.responses = {('gnews', 'technology'): [
+            fetched_article('https://example.com/a', 'Quantum chip breaks error correction record',
+                            'Researchers kept logical qubits stable for a full second in a new experiment.'),
+        ]}
+        self.failing_text_batches = 1
+
+        with mock.patch.object(self.aggregator, 'commit_cursors') as commit_cursors:
+            saved = IngestPipeline(self.aggregator).run(list(self.responses))
+
+        self.assertEqual(saved, 0)
+        commit_cursors.assert_not_called()
+
+    def wire_story(self, *sources):
+        return [
+            fetched_article(f'https://{source.lower()}.example.com/rates', f'Central bank raises rates - {source}',
+                            'The central bank raised interest rates by half a point on Thursday, '
+                            'citing persistent inflation.')
+            for source in sources
+        ]
+
+    def duplicate_urls(self, url):
+        return NewsArticle.get_collection().find_one({'url': url})['duplicate_urls']
+
+    def test_near_duplicates_are_linked_to_the_stored_article(self):
+        self.responses = {('gnews', 'business'): self.wire_story('Reuters', 'AP', 'BBC')}
+
+        saved = IngestPipeline(self.aggregator).run(list(self.responses))
+
+        self.assertEqual(saved, 1)
+        self.assertEqual(
+            sorted(self.duplicate_urls('https://reuters.example.com/rates')),
+            ['https://ap.example.com/rates', 'https://bbc.example.com/rates']
+        )
+
+    def test_near_duplicates_of_a_lost_article_are_ingested_instead(self):
+        self.responses = {('gnews', 'business'): self.wire_story('Reuters', 'AP', 'BBC')}
+        self.failing_text_batches = 1  # The canonical (Reuters) article is lost
+
+        saved = IngestPipeline(self.aggregator).run(list(self.responses))
+
+        self.assertEqual(saved, 1)
+        urls = [doc['url'] for doc in NewsArticle.get_collection().find({}, {'url': 1})]
+        self.assertEqual(urls, ['https://ap.example.com/rates'])
+        self.assertEqual(self.duplicate_urls('https://ap.example.com/rates'), ['https://bbc.example.com/rates'])
+
+
+class MinHashTests(SimpleTestCase):
+    def test_similarity_estimates_jaccard(self):
+        hasher = MinHasher(num_perm=256, rows=4)
+        features = {f'word{i}' for i in range(100)}
+        overlapping = {f'word{i}' for i in range(20, 120)}  # Jaccard 80/120
+
+        self.assertEqual(hasher.similarity(hasher.signature(features), hasher.signature(set(features))), 1.0)
+        estimate = hasher.similarity(hasher.signature(features), hasher.signature(overlapping))
+        self.assertAlmostEqual(estimate, 80 / 120, delta=0.1)
+        unrelated = {f'other{i}' for i in range(100)}
+        self.assertLess(hasher.similarity(hasher.signature(features), hasher.signature(unrelated)), 0.05)
+
+    def test_signatures_are_stable_and_packable(self):
+        signature = MinHasher(64, 4).signature({'a b', 'b c', 'c d'})
+
+        self.assertEqual(signature, MinHasher(64, 4).signature({'c d', 'a b', 'b c'}))
+        self.assertEqual(MinHasher.unpack(MinHasher.pack(signature)), signature)
+        self.assertEqual(len(MinHasher(64, 4).band_keys(signature)), 16)
+
+    def test_rows_must_divide_permutations(self):
+        with self.assertRaises(ValueError):
+            MinHasher(64, 5)
+
+    def test_index_returns_the_most_similar_value_above_threshold(self):
+        hasher = MinHasher(64, 2)
+        base = {f'word{i}' for i in range(40)}
+        index = MinHashIndex(hasher)
+        index.add(hasher.signature(base | {f'extra{i}' for i in range(4)}), 'close')
+        index.add(hasher.signature(set(list(sorted(base))[:25]) | {f'far{i}' for i in range(15)}), 'far')
+
+        self.assertEqual(index.find(hasher.signature(base), 0.3), 'close')
+        similarity, value = index.best(hasher.signature(base), 0.3)
+        self.assertEqual(value, 'close')
+        self.assertGreater(similarity, 0.7)
+        self.assertIsNone(index.find(hasher.signature({f'unrelated{i}' for i in range(40)}), 0.3))
+
+    def test_source_suffix_is_ignored(self):
+        description = 'The central bank raised interest rates by half a point.'
+        self.assertEqual(
+            shingles('Central bank raises rates - Reuters', description),
+            shingles('Central bank raises rates | BBC News', description)
+        )
+
+
+class NearDuplicateDetectorTests(MongoTestCase):
+    description = 'The central bank raised interest rates by half a point on Thursday, citing persistent inflation.'
+
+    def setUp(self):
+        super().setUp()
+        self.detector = NearDuplicateDetector(threshold=0.6, num_perm=64, rows=4, window_hours=48)
+
+    def article(self, url, title, description=None):
+        return {'url': url, 'title': title, 'description': self.description if description is None else description}
+
+    def test_same_story_from_another_source_is_a_duplicate(self):
+        results = self.detector.check_many([
+            self.article('https://a.example.com/1', 'Central bank raises rates - Reuters'),
+            self.article('https://b.example.com/1', 'Central bank raises rates - AP'),
+            self.article('https://c.example.com/1', 'Central bank raises key rates - BBC',
+                         'The central bank raised interest rates by half a point on Thursday, '
+                         'citing persistent inflation and strong wage growth.'),
+        ])
+
+        self.assertEqual([canonical for _, canonical in results],
+                         [None, 'https://a.example.com/1', 'https://a.example.com/1'])
+        self.assertEqual(len(results[0][0]['minhash_bands']), 16)
+
+    def test_unrelated_or_short_articles_are_not_duplicates(self):
+        results = self.detector.check_many([
+            self.article('https://a.example.com/1', 'Central bank raises rates'),
+            self.article('https://b.example.com/1', 'Local team wins the championship final',
+                         'Fans celebrated downtown after a dramatic overtime victory on Sunday night.'),
+            self.article('https://c.example.com/1', 'Rates', ''),
+        ])
+
+        self.assertEqual([canonical for _, canonical in results], [None, None, None])
+        self.assertEqual(results[2][0], {})  # Too short for a reliable signature
+
+    def test_recent_stored_article_is_the_canonical(self):
+        fields, _ = self.detector.check_many([self.article('https://a.example.com/1', 'Central bank raises rates')])[0]
+        NewsArticle.create(url='https://a.example.com/1', title='Central bank raises rates', **fields)
+
+        detector = NearDuplicateDetector(threshold=0.6, num_perm=64, rows=4, window_hours=48)
+        (_, canonical), = detector.check_many([self.article('https://b.example.com/1', 'Central bank raises rates - AP')])
+        self.assertEqual(canonical, 'https://a.example.com/1')
+
+        NewsArticle.get_collection().update_many({}, {'$set': {'fetched_at': datetime.utcnow() - timedelta(hours=49)}})
+        detector = NearDuplicateDetector(threshold=0.6, num_perm=64, rows=4, window_hours=48)
+        (_, canonical), = detector.check_many([self.article('https://b.example.com/1', 'Central bank raises rates - AP')])
+        self.assertIsNone(canonical)
+
+
+class StoryClusterTests(MongoTestCase):
+    earthquake = {
+        'title': 'Strong earthquake strikes off the coast of Japan',
+        'description': 'A magnitude 7.1 earthquake struck off northeastern Japan, triggering tsunami warnings along the coast.'
+    }
+    tsunami = {
+        'title': 'Japan earthquake triggers tsunami warning',
+        'description': 'Tsunami warnings were issued along the northeastern coast after a magnitude 7.1 earthquake struck off Japan.'
+    }
+    ferry = {
+        'title': 'Electric ferry begins service across the bay',
+        'description': 'The battery powered vessel carries four hundred passengers per crossing.'
+    }
+
+    def clusterer(self):
+        return StoryClusterer(threshold=0.25, num_perm=64, rows=2, window_hours=48)
+
+    @staticmethod
+    def words(*groups):
+        """Article whose content words are <prefix><number> for each (prefix, numbers) group"""
+        return {'title': '', 'description': ' '.join(f'{prefix}{i}' for prefix, numbers in groups for i in numbers)}
+
+    def test_features_skip_stopwords_short_words_and_source(self):
+        self.assertEqual(story_features('The Mayor - Reuters', 'It is a new plan for the city'), {'mayor', 'plan', 'city'})
+
+    def test_coverage_of_one_event_shares_a_cluster(self):
+        earthquake, tsunami, ferry = self.clusterer().assign_many([self.earthquake, self.tsunami, self.ferry])
+
+        self.assertEqual(earthquake['cluster_id'], tsunami['cluster_id'])
+        self.assertNotEqual(earthquake['cluster_id'], ferry['cluster_id'])
+        self.assertEqual(len(earthquake['story_bands']), 32)
+
+    def test_run_clusters_carry_over_between_batches(self):
+        clusterer = self.clusterer()
+        first, = clusterer.assign_many([self.earthquake])
+        second, = clusterer.assign_many([self.tsunami])
+
+        self.assertEqual(first['cluster_id'], second['cluster_id'])
+
+    def test_short_article_gets_its_own_cluster(self):
+        short, other = self.clusterer().assign_many([{'title': 'Earthquake'}, {'title': 'Earthquake'}])
+
+        self.assertEqual(set(short), {'cluster_id'})
+        self.assertNotEqual(short['cluster_id'], other['cluster_id'])
+
+    def test_article_joins_a_stored_cluster(self):
+        fields, = self.clusterer().assign_many([self.earthquake])
+        NewsArticle.create(url='https://example.com/earthquake', **self.earthquake, **fields)
+
+        tsunami, = self.clusterer().assign_many([self.tsunami])
+        self.assertEqual(tsunami['cluster_id'], fields['cluster_id'])
+
+    def test_closer_article_of_the_run_beats_a_stored_match(self):
+        stored, = self.clusterer().assign_many([self.words(('quake', range(1, 10)), ('stock', range(6)))])
+        NewsArticle.create(url='https://example.com/stored', **stored)
+
+        # query: ~0.34 similar to the stored article, ~0.59 to `close`; `close` and stored are unrelated
+        close, query = self.clusterer().assign_many([
+            self.words(('quake', range(8, 21)), ('rescue', range(1))),
+            self.words(('quake', range(1, 21))),
+        ])
+
+        self.assertNotEqual(close['cluster_id'], stored['cluster_id'])
+        self.assertEqual(query['cluster_id'], close['cluster_id'])
+
+    def test_dedupe_by_cluster_keeps_the_first_of_each_story(self):
+        articles = [
+            {'url': 'a', 'cluster_id': 'x'},
+            {'url': 'b', 'cluster_id': 'x'},
+            {'url': 'c', 'cluster_id': None},
+            {'url': 'd', 'cluster_id': 'y'},
+        ]
+
+        self.assertEqual([a['url'] for a in dedupe_by_cluster(articles)], ['a', 'c', 'd'])
+        self.assertEqual([a['url'] for a in dedupe_by_cluster(articles, limit=2)], ['a', 'c'])
+
+
+class ResponseCacheTests(SimpleTestCase):
+    url = 'https://newsapi.org/v2/top-headlines'
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+
+    def test_recorded_response_is_replayed(self):
+        body = {'status': 'ok', 'articles': [{'title': 'Recorded'}]}
+        ResponseCache(self.root, 'record').store(
+            'newsapi', 'technology', self.url, {'apiKey': 'secret', 'category': 'technology'}, body,
+            headers={'ETag': '"v1"', 'Set-Cookie': 'session'}
+        )
+
+        replay = ResponseCache(self.root, 'replay')
+        self.assertTrue(replay.replaying)
+        # Credentials and the incremental `from` filter are not part of the query
+        self.assertEqual(replay.load('newsapi', self.url, {'apiKey': 'other', 'category': 'technology',
+                                                           'from': '2024-01-01T00:00:00Z'}), body)
+        self.assertIsNone(replay.load('newsapi', self.url, {'category': 'sports'}))
+
+        entry, = replay.entries()
+        self.assertEqual((entry['provider'], entry['category']), ('newsapi', 'technology'))
+        self.assertEqual(entry['params'], {'category': 'technology'})
+        self.assertEqual(entry['headers'], {'ETag': '"v1"'})
+        self.assertNotIn('body', entry)
+        self.assertEqual(list(replay.entries('gnews')), [])
+
+    def test_only_record_mode_writes(self):
+        ResponseCache(self.root, 'off').store('newsapi', None, self.url, {}, {'status': 'ok'})
+        ResponseCache(self.root, 'replay').store('newsapi', None, self.url, {}, {'status': 'ok'})
+
+        self.assertEqual(list(ResponseCache(self.root, 'replay').entries()), [])
+
+    def test_unknown_mode_is_rejected(self):
+        with self.assertRaises(ValueError):
+            ResponseCache(self.root, 'playback')
+
+
+@override_settings(NEWSAPI_KEY='test-key', FETCH_HIGH_WATER_OVERLAP_MINUTES=10)
+class IncrementalFetchTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        patcher = mock.patch('analyzer.news_fetcher.requests.get')
+        self.get = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def respond(self, status_code=200, published=(), etag='"v1"'):
+        body = {'status': 'ok', 'articles': [
+            {'title': f'Article {i}', 'url': f'https://example.com/{i}', 'publishedAt': date.strftime('%Y-%m-%dT%H:%M:%SZ')}
+            for i, date in enumerate(published)
+        ]}
+        self.get.return_value = mock.Mock(
+            status_code=status_code,
+            headers={'ETag': etag, 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'},
+            json=mock.Mock(return_value=body)
+        )
+
+    def fetch(self, mode='off'):
+        fetcher = NewsAPIFetcher(ResponseCache(self.root, mode))
+        return fetcher, fetcher.fetch_top_headlines(category='technology')
+
+    def test_marks_and_validators_are_stored_on_commit(self):
+        newest = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+        self.respond(published=[newest - timedelta(hours=2), newest])
+
+        fetcher, articles = self.fetch()
+        self.assertEqual(len(articles), 2)
+        self.assertEqual(self.get.call_args.kwargs['headers'], {})
+        self.assertIsNone(FetchCursor.get('newsapi', 'technology'))
+
+        fetcher.commit_cursors()
+        cursor = FetchCursor.get('newsapi', 'technology')
+        self.assertEqual((cursor['high_water'], cursor['etag']), (newest, '"v1"'))
+
+    def test_conditional_request_and_not_modified(self):
+        FetchCursor.update('newsapi', 'technology', etag='"v1"', last_modified='Mon, 01 Jan 2024 00:00:00 GMT')
+        self.respond(status_code=304)
+
+        fetcher, articles = self.fetch()
+        fetcher.commit_cursors()
+
+        self.assertEqual(articles, [])
+        self.assertEqual(self.get.call_args.kwargs['headers'], {
+            'If-None-Match': '"v1"', 'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'
+        })
+        self.assertNotIn('high_water', FetchCursor.get('newsapi', 'technology'))
+
+    def respond_around(self, high_water):
+        self.respond(published=[
+            high_water - timedelta(minutes=30),  # Before the mark (minus overlap)
+            high_water - timedelta(minutes=5),   # Within the overlap
+            high_water + timedelta(minutes=30),
+            datetime.utcnow() + timedelta(hours=1),  # Future date: must not move the mark
+        ])
+
+    def test_without_date_filter_old_articles_are_kept(self):
+        # NewsAPI top-headlines isn't sorted by time: an older story may show up late
+        high_water = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+        FetchCursor.update('newsapi', 'technology', high_water=high_water)
+        self.respond_around(high_water)
+
+        fetcher, articles = self.fetch()
+        fetcher.commit_cursors()
+
+        self.assertEqual(len(articles), 4)
+        self.assertNotIn('from', self.get.call_args.kwargs['params'])
+        self.assertEqual(FetchCursor.get('newsapi', 'technology')['high_water'], high_water + timedelta(minutes=30))
+
+    @override_settings(GNEWS_API_KEY='test-key')
+    def test_date_filtered_provider_only_gets_newer_articles(self):
+        high_water = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+        FetchCursor.update('gnews', 'technology', high_water=high_water)
+        self.respond_around(high_water)
+
+        fetcher = GNewsFetcher(ResponseCache(self.root, 'off'))
+        articles = fetcher.fetch_top_headlines(category='technology')
+        fetcher.commit_cursors()
+
+        self.assertEqual(self.get.call_args.kwargs['params']['from'],
+                         (high_water - timedelta(minutes=10)).strftime('%Y-%m-%dT%H:%M:%SZ'))
+        # Anything the provider returns from before `from` is dropped
+        self.assertEqual([a['url'] for a in articles],
+                         ['https://example.com/1', 'https://example.com/2', 'https://example.com/3'])
+        self.assertEqual(FetchCursor.get('gnews', 'technology')['high_water'], high_water + timedelta(minutes=30))
+
+    def test_recorded_fetch_replays_offline(self):
+        published = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+        self.respond(published=[published])
+        _, recorded = self.fetch(mode='record')
+        self.get.reset_mock()
+
+        with override_settings(NEWSAPI_KEY=''):
+            fetcher, replayed = self.fetch(mode='replay')
+            fetcher.commit_cursors()
+
+        self.get.assert_not_called()
+        self.assertEqual([a['url'] for a in replayed], [a['url'] for a in recorded])
+        self.assertIsNone(FetchCursor.get('newsapi', 'technology'))
+
+
+class CollaborativeFilteringTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.model_path = f'{directory.name}/cf_model.npz'
+
+    @staticmethod
+    def two_groups():
+        # Users 1-4 read the a* articles, 5-8 the b* ones; user 1 hasn't read a4 yet
+        for user_id in range(1, 9):
+            prefix = 'a' if user_id <= 4 else 'b'
+            for n in range(1, 5):
+                if (user_id, n) != (1, 4):
+                    yield {'user_id': user_id, 'article_id': f'{prefix}{n}', 'interaction_type': 'view'}
+
+    def test_matrix_weights_and_sums_interactions(self):
+        matrix, user_ids, item_ids = build_interaction_matrix([
+            {'user_id': 1, 'article_id': 'a', 'interaction_type': 'view'},
+            {'user_id': 1, 'article_id': 'a', 'interaction_type': 'save'},
+            {'user_id': 2, 'article_id': 'b', 'interaction_type': 'like'},
+            {'user_id': None, 'article_id': 'a', 'interaction_type': 'view'},
+            {'user_id': 3, 'article_id': None, 'interaction_type': 'view'},
+        ])
+
+        self.assertEqual(list(user_ids), [1, 2])
+        self.assertEqual(list(item_ids), ['a', 'b'])
+        self.assertEqual(matrix.toarray().tolist(), [[6, 0], [0, 3]])
+
+    def test_recommends_what_similar_users_read(self):
+        matrix, user_ids, item_ids = build_interaction_matrix(self.two_groups())
+        user_factors, item_factors = train_als(matrix, factors=4)
+        model = CFModel(user_ids, item_ids, user_factors, item_factors)
+
+        self.assertEqual(model.recommend(1, limit=1, exclude={'a1', 'a2', 'a3'}), ['a4'])
+        self.assertEqual(set(model.recommend(5, limit=4)), {'b1', 'b2', 'b3', 'b4'})
+        self.assertEqual(model.recommend(99), [])
+
+    def test_saved_model_loads_with_the_same_scores(self):
+        matrix, user_ids, item_ids = build_interaction_matrix(self.two_groups())
+        user_factors, item_factors = train_als(matrix, factors=4)
+        trained_at = datetime(2024, 1, 1, 12, 0)
+        CFModel(user_ids, item_ids, user_factors, item_factors, trained_at).save(self.model_path)
+
+        model = CFModel.load(self.model_path)
+        self.assertEqual(model.trained_at, trained_at)
+        self.assertTrue(model.has_user(1))
+        self.assertEqual(model.recommend(1, limit=8, exclude={'a1'}),
+                         CFModel(user_ids, item_ids, user_factors, item_factors).recommend(1, limit=8, exclude={'a1'}))
+
+    def test_trains_on_recent_interactions_and_reloads(self):
+        now = datetime.utcnow()
+        collections = {'view': 'article_views', 'like': 'article_likes', 'save': 'article_saves'}
+        for interaction in self.two_groups():
+            self.db[collections[interaction['interaction_type']]].insert_one(
+                {'user_id': interaction['user_id'], 'article_id': interaction['article_id'], 'timestamp': now}
+            )
+        # Outside the training window
+        self.db.article_likes.insert_one({'user_id': 9, 'article_id': 'c1', 'timestamp': now - timedelta(days=30)})
+
+        with override_settings(CF_MODEL_PATH=self.model_path), \
+                mock.patch.object(collaborative, '_cf_model', None):
+            self.assertIsNone(get_cf_model())
+            model = train_cf_model(days=7, factors=4)
+
+            self.assertFalse(model.has_user(9))
+            self.assertEqual(get_cf_model().recommend(1, limit=1, exclude={'a1', 'a2', 'a3'}), ['a4'])
+
+    @override_settings(CF_MODEL_PATH='/nonexistent/cf_model.npz')
+    def test_no_interactions_trains_nothing(self):
+        self.assertIsNone(train_cf_model())
+
+
+@override_settings(RECOMMENDATION_FEED_SIZE=50, RECOMMENDATION_FEED_TTL=600)
+class PersonalizedFeedTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        now = datetime.utcnow()
+        result = NewsArticle.get_collection().insert_many([
+            {'title': f'Article {i}', 'url': f'https://example.com/{i}', 'category': 'technology', 'published_at': now}
+            for i in range(5)
+        ])
+        self.articles = NewsArticle.get_by_ids([str(article_id) for article_id in result.inserted_ids])
+
+        engine = RecommendationEngine
+        patchers = [
+            mock.patch.object(engine, 'get_user_category_preferences',
+                              return_value={'technology': 75.0, 'science': 25.0}),
+            mock.patch.object(engine, 'get_recommended_articles', return_value=self.articles),
+        ]
+        self.preferences, self.rank = (patcher.start() for patcher in patchers)
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+
+    def ids(self, articles):
+        return [article['_id'] for article in articles]
+
+    def test_feed_is_ranked_once_and_paged_from_the_cache(self):
+        first = get_personalized_feed(1, page=1, limit=2)
+        second = get_personalized_feed(1, page=2, limit=2)
+        last = get_personalized_feed(1, page=3, limit=2)
+
+        self.rank.assert_called_once_with(1, limit=50, category_prefs={'technology': 75.0, 'science': 25.0})
+        self.assertEqual(self.ids(first['articles'] + second['articles'] + last['articles']), self.ids(self.articles))
+        self.assertEqual((second['total_count'], second['preferences']), (5, {'technology': 75.0, 'science': 25.0}))
+
+    def test_interaction_invalidates_only_that_users_feed(self):
+        get_personalized_feed(1)
+        get_personalized_feed(2)
+        RecommendationFeed.invalidate(1)
+        get_personalized_feed(1)
+        get_personalized_feed(2)
+
+        self.assertEqual(self.rank.call_count, 3)
+
+    def test_new_articles_invalidate_feeds_built_on_their_category(self):
+        get_personalized_feed(1)
+        self.preferences.return_value = {'sports': 100.0}
+        get_personalized_feed(2)
+
+        self.assertEqual(RecommendationFeed.invalidate_categories({'science'}), 1)
+        self.assertIsNone(RecommendationFeed.get(1))
+        self.assertIsNotNone(RecommendationFeed.get(2))
+        self.assertEqual(RecommendationFeed.invalidate_categories(set()), 0)
+
+    def test_expired_feed_is_ranked_again(self):
+        get_personalized_feed(1)
+        RecommendationFeed.get_collection().update_one(
+            {'user_id': 1}, {'$set': {'expires_at': datetime.utcnow() - timedelta(seconds=1)}}
+        )
+        get_personalized_feed(1)
+
+        self.assertEqual(self.rank.call_count, 2)
+
+
+class BloomFilterTests(SimpleTestCase):
+    def test_false_positive_rate_stays_near_the_target_at_capacity(self):
+        bloom = BloomFilter.for_capacity(2000, error_rate=0.01)
+        for i in range(2000):
+            bloom.add(f'seen-{i}')
+
+        self.assertTrue(all(f'seen-{i}' in bloom for i in range(2000)))
+        false_positives = sum(f'unseen-{i}' in bloom for i in range(20000))
+        self.assertLess(false_positives / 20000, 0.02)
+        self.assertFalse(bloom.is_full)
+
+    def test_bytes_round_trip(self):
+        bloom = BloomFilter.for_capacity(10)
+        self.assertTrue(bloom.add('a'))
+        self.assertFalse(bloom.add('a'))
+
+        copy = BloomFilter(bloom.num_bits, bloom.num_hashes, bloom.capacity, bloom.to_bytes(), len(bloom))
+        self.assertIn('a', copy)
+        self.assertNotIn('b', copy)
+        self.assertEqual(len(copy), 1)
+
+
+@override_settings(SEEN_FILTER_CAPACITY=4, SEEN_FILTER_ERROR_RATE=0.01)
+class UserSeenFilterTests(MongoTestCase):
+    def test_first_use_is_built_from_the_interaction_history(self):
+        self.db.article_views.insert_one({'user_id': 1, 'article_id': 'a1', 'timestamp': datetime.utcnow()})
+        self.db.article_saves.insert_one({'user_id': 1, 'article_id': 'a2', 'timestamp': datetime.utcnow()})
+
+        seen = UserSeenFilter.get(1)
+        self.assertIn('a1', seen)
+        self.assertIn('a2', seen)
+        self.assertNotIn('a3', UserSeenFilter.get(2))
+
+    def test_views_are_added_to_the_stored_filter(self):
+        ArticleView.create(1, 'a1')
+        ArticleView.create(1, 'a2')
+
+        self.assertIn('a2', UserSeenFilter.get(1))
+        self.assertEqual(UserSeenFilter.get_collection().find_one({'user_id': 1})['count'], 2)
+
+    def test_full_filter_grows_instead_of_saturating(self):
+        for n in range(6):
+            ArticleView.create(1, f'a{n}')
+
+        doc = UserSeenFilter.get_collection().find_one({'user_id': 1})
+        self.assertEqual(doc['capacity'], 10)
+        seen = UserSeenFilter.get(1)
+        self.assertTrue(all(f'a{n}' in seen for n in range(6)))
+
+
+@override_settings(TRENDING_WINDOW_HOURS=72, TRENDING_HALF_LIFE_HOURS=12)
+class TrendingScoreTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        now = datetime.utcnow()
+        self.ids = {
+            name: str(NewsArticle.get_collection().insert_one({
+                'title': name, 'url': f'https://example.com/{name}', 'published_at': now, **extra
+            }).inserted_id)
+            for name, extra in (('fresh', {}), ('older', {}), ('stale', {'trending_score': 4.0, 'trending_updated_at': now - timedelta(hours=1)}))
+        }
+
+    def interact(self, collection, name, hours_ago):
+        self.db[collection].insert_one({
+            'user_id': 1, 'article_id': self.ids[name], 'timestamp': datetime.utcnow() - timedelta(hours=hours_ago)
+        })
+
+    def score(self, name):
+        return NewsArticle.get_collection().find_one({'_id': ObjectId(self.ids[name])})['trending_score']
+
+    def test_scores_are_weighted_and_halve_every_half_life(self):
+        self.interact('article_saves', 'fresh', 0)
+        self.interact('article_views', 'older', 12)
+        self.interact('article_views', 'older', 12)
+        self.interact('article_likes', 'older', 100)  # Outside the window
+
+        self.assertEqual(compute_trending_scores(), 2)
+        self.assertAlmostEqual(self.score('fresh'), 5.0, places=2)
+        self.assertAlmostEqual(self.score('older'), 1.0, places=2)
+        # No recent interactions left
+        self.assertEqual(self.score('stale'), 0.0)
+
+        self.assertEqual([a['title'] for a in get_trending_articles(limit=2)], ['fresh', 'older'])
+
+
+def static_source(source_name, articles):
+    """Candidate source class returning fixed articles (raises if given an exception)"""
+    class StaticSource(CandidateSource):
+        name = source_name
+
+        def fetch(self, context):
+            if isinstance(articles, Exception):
+                raise articles
+            return [dict(article) for article in articles]
+    return StaticSource
+
+
+@override_settings(RECOMMENDATION_OVERFETCH=3, RECOMMENDATION_RECENCY_HALF_LIFE_HOURS=24, CF_MODEL_PATH='/nonexistent/cf_model.npz')
+class RecommendationPipelineTests(MongoTestCase):
+    def test_candidates_are_merged_without_seen_articles(self):
+        pipeline = RecommendationPipeline(sources=[
+            static_source('collaborative', [{'_id': 'a'}, {'_id': 'b'}]),
+            static_source('category', [{'_id': 'b'}, {'_id': 'c'}]),
+            static_source('broken', RuntimeError('source down')),
+        ], weights={'collaborative': 1.0})
+
+        ranked = pipeline.run(1, {'technology': 100.0}, seen={'c'}, limit=5)
+
+        # The CF model's first pick ranks first; c was seen
+        self.assertEqual([a['_id'] for a in ranked], ['a', 'b'])
+        self.assertEqual([a['recommendation_score'] for a in ranked], [1.0, round(1 - 1 / 15, 4)])
+        self.assertNotIn('_sources', ranked[0])
+
+    def test_one_article_per_story_even_past_the_overselection(self):
+        candidates = [{'_id': str(i), 'cluster_id': 'story' if i < 4 else None} for i in range(5)]
+        scores = np.array([5, 4, 3, 2, 1], dtype=np.float32)
+
+        ranked = RecommendationPipeline(sources=[]).rank(candidates, scores, limit=2)
+        self.assertEqual([a['_id'] for a in ranked], ['0', '4'])
+
+    def test_default_sources_rank_preferred_fresh_unseen_articles(self):
+        now = datetime.utcnow()
+        articles = {
+            name: str(NewsArticle.get_collection().insert_one({
+                'title': name, 'url': f'https://example.com/{name}', 'category': category,
+                'sentiment': 'neutral', 'published_at': now - timedelta(hours=hours), 'trending_score': 0.0,
+            }).inserted_id)
+            for name, category, hours in (
+                ('tech', 'technology', 1), ('seen', 'technology', 1), ('sports', 'sports', 1),
+                ('old_tech', 'technology', 24 * 10),
+            )
+        }
+
+        with mock.patch.object(collaborative, '_cf_model', None):
+            ranked = RecommendationPipeline().run(
+                1, {'technology': 100.0}, seen={articles['seen']}, limit=3
+            )
+
+        # Preference outweighs recency; old_tech only comes in through the fresh source
+        self.assertEqual([a['title'] for a in ranked], ['tech', 'old_tech', 'sports'])
+
+
+class ColorModel(torch.nn.Module):
+    """Stand-in for the ResNet: classifies by dominant channel (red negative, blue positive)"""
+
+    def __init__(self):
+        super().__init__()
+        self.batch_sizes = []
+
+    def forward(self, batch):
+        self.batch_sizes.append(batch.shape[0])
+        return batch.mean(dim=(2, 3))
+
+
+def image_bytes(color, size=(64, 64), image_format='JPEG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class ImageAnalyzerTestMixin:
+    def make_analyzer(self, **kwargs):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with mock.patch('builtins.print'):  # No trained weights here
+            analyzer = ImageSentimentAnalyzer(directory.name, **kwargs)
+        analyzer.model = ColorModel()
+        return analyzer
+
+
+class ImageBatchingTests(ImageAnalyzerTestMixin, SimpleTestCase):
+    def test_images_are_scored_in_batches_in_input_order(self):
+        analyzer = self.make_analyzer()
+        analyzer.batch_size = 2
+        red, blue = image_bytes('red'), Image.new('RGB', (300, 200), 'blue')
+
+        with mock.patch('builtins.print'):
+            results = analyzer.predict_batch([red, blue, b'not an image', 42, red])
+
+        self.assertEqual([r['sentiment'] for r in results], ['negative', 'positive', 'neutral', 'neutral', 'negative'])
+        self.assertEqual([r['confidence'] for r in results][2:4], [0.0, 0.0])
+        self.assertEqual(analyzer.model.batch_sizes, [2, 1])
+
+    def test_urls_are_read_concurrently_and_failures_stay_neutral(self):
+        analyzer = self.make_analyzer()
+        bodies = {
+            'https://example.com/red.jpg': image_bytes('red'),
+            'https://example.com/blue.png': image_bytes('blue', image_format='PNG'),
+        }
+
+        def read(url):
+            if url not in bodies:
+                raise requests.HTTPError('404')
+            return bodies[url]
+
+        with mock.patch.object(analyzer, '_read_bytes', side_effect=read) as read_bytes, mock.patch('builtins.print'):
+            results = analyzer.predict_batch(['https://example.com/red.jpg', 'https://example.com/gone.jpg',
+                                              'https://example.com/blue.png'])
+
+        self.assertEqual(read_bytes.call_count, 3)
+        self.assertEqual([r['sentiment'] for r in results], ['negative', 'neutral', 'positive'])
+        self.assertEqual(analyzer.model.batch_sizes, [2])
+
+    def test_without_a_model_everything_is_neutral(self):
+        analyzer = self.make_analyzer()
+        analyzer.model = None
+
+        self.assertEqual(analyzer.predict(image_bytes('red')),
+                         {'sentiment': 'neutral', 'confidence': 0.0, 'model_version': analyzer.version})
+
+
+@override_settings(IMAGE_CACHE_MAX_ENTRIES=10, IMAGE_CACHE_URL_TTL=60, IMAGE_CACHE_DIGEST_TTL=60, IMAGE_CACHE_PERSIST=True)
+class ImageCacheTests(ImageAnalyzerTestMixin, MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.analyzer = self.make_analyzer()
+        self.analyzer.cache = ImageSentimentCache(version=self.analyzer.version)
+        self.red = image_bytes('red')
+
+    def predict(self, *urls):
+        with mock.patch.object(self.analyzer, '_read_bytes', return_value=self.red) as read_bytes:
+            results = self.analyzer.predict_batch(list(urls))
+        return results, read_bytes.call_count
+
+    def test_known_url_is_not_downloaded_again(self):
+        first, reads = self.predict('https://example.com/a.jpg')
+        again, reads_again = self.predict('https://example.com/a.jpg')
+
+        self.assertEqual((reads, reads_again), (1, 0))
+        self.assertEqual(again, first)
+        self.assertEqual(self.analyzer.model.batch_sizes, [1])
+
+    def test_same_bytes_under_another_url_skip_inference(self):
+        self.predict('https://example.com/a.jpg')
+        result, reads = self.predict('https://cdn.example.com/copy.jpg')
+
+        self.assertEqual((reads, result[0]['sentiment']), (1, 'negative'))
+        self.assertEqual(self.analyzer.model.batch_sizes, [1])
+        # The new URL is remembered as well
+        self.assertEqual(self.predict('https://cdn.example.com/copy.jpg')[1], 0)
+
+    def test_uploaded_bytes_are_cached_by_digest(self):
+        self.analyzer.predict_batch([self.red])
+        self.analyzer.predict_batch([self.red])
+
+        self.assertEqual(self.analyzer.model.batch_sizes, [1])
+        self.assertIn(content_digest(self.red), self.analyzer.cache.get_many_by_digest([content_digest(self.red)]))
+
+    def test_results_are_shared_through_mongodb_per_model_version(self):
+        self.predict('https://example.com/a.jpg')
+
+        replica = ImageSentimentCache(version=self.analyzer.version)
+        cached = replica.get_many_by_url(['https://example.com/a.jpg'])
+        self.assertEqual(cached['https://example.com/a.jpg']['sentiment'], 'negative')
+        self.assertEqual(ImageSentimentCache(version='v2').get_many_by_url(['https://example.com/a.jpg']), {})
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+        self.assertEqual(len(cache), 2)
+
+    def test_expired_entry_is_a_miss(self):
+        cache = LRUCache(2, ttl_seconds=60)
+        cache.put('a', 1)
+        with mock.patch('analyzer.image_cache.time.time', return_value=time.time() + 61):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+
+class ImageDecodeTests(ImageAnalyzerTestMixin, SimpleTestCase):
+    def test_large_jpeg_is_decoded_at_reduced_scale(self):
+        analyzer = self.make_analyzer()
+        resize = mock.Mock(wraps=analyzer._resize)
+
+        with mock.patch.object(analyzer, '_resize', resize):
+            image = analyzer._decode(image_bytes('red', size=(2000, 1600)))
+
+        self.assertEqual(image.size, (224, 224))
+        # libjpeg's DCT scaling did most of the work before the resize
+        self.assertLess(resize.call_args.args[0].size[0], 2000)
+
+    def test_oversized_images_are_rejected_before_decoding(self):
+        analyzer = self.make_analyzer()
+        analyzer.max_image_pixels = 100 * 100
+
+        with self.assertRaises(ValueError):
+            analyzer._decode(image_bytes('red', size=(200, 200)))
+
+    def test_oversized_files_and_downloads_are_rejected(self):
+        analyzer = self.make_analyzer()
+        analyzer.max_image_bytes = 1000
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as f:
+            f.write(b'\0' * 1001)
+            f.flush()
+            with self.assertRaises(ValueError):
+                analyzer._read_bytes(f.name)
+
+        response = mock.MagicMock(headers={}, iter_content=mock.Mock(return_value=[b'\0' * 600] * 2))
+        response.__enter__.return_value = response
+        with mock.patch.object(analyzer.session, 'get', return_value=response), self.assertRaises(ValueError):
+            analyzer._read_bytes('https://example.com/huge.jpg')
+
+
+class AnalyzeImageUploadTests(ImageAnalyzerTestMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.analyzer = self.make_analyzer()
+        patcher = mock.patch('analyzer.views.get_image_analyzer', return_value=self.analyzer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, content, name='photo.jpg'):
+        request = APIRequestFactory().post('/api/analyze-image/', {'image': SimpleUploadedFile(name, content)},
+                                           format='multipart')
+        return views.analyze_image_sentiment(request)
+
+    def test_upload_is_analyzed_from_memory(self):
+        response = self.upload(image_bytes('blue'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['sentiment'], 'positive')
+
+    def test_upload_over_the_cap_is_rejected_with_413(self):
+        self.analyzer.max_image_bytes = 1024
+        response = self.upload(b'\0' * 1025)
+
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.analyzer.model.batch_sizes, [])
+
+    def test_unsupported_extension_is_rejected(self):
+        self.assertEqual(self.upload(image_bytes('blue'), name='photo.bmp').status_code, 400)
+
+
+class CorpusTestMixin:
+    rows = [
+        ('great news for everyone', 2), ('terrible storm hits the coast', 0), ('markets were flat today', 1),
+        ('great results again', 2), ('not a label', 'x'), ('terrible losses again', 0),
+    ]
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        self.csv_path = self.root / 'dataset.csv'
+        self.corpus_dir = self.root / 'corpus'
+        self.write_csv(self.rows)
+
+    def write_csv(self, rows):
+        with open(self.csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['text', 'sentiment'])
+            writer.writerows(rows)
+
+
+class TextCorpusTests(CorpusTestMixin, SimpleTestCase):
+    def test_corpus_is_tokenized_into_int64_arrays(self):
+        meta = build_corpus(self.csv_path, self.corpus_dir, max_length=8)
+        tokens, labels, vocab = load_corpus(self.corpus_dir)
+
+        # The row with an invalid label is skipped
+        self.assertEqual((meta['samples'], meta['class_counts']), (5, [2, 1, 2]))
+        self.assertEqual((tokens.dtype, tokens.shape), (torch.int64, (5, 8)))
+        self.assertEqual(labels.tolist(), [2, 0, 1, 2, 0])
+        self.assertEqual(tokens[0].tolist(), text_to_sequence('great news for everyone', vocab, 8))
+        self.assertEqual((vocab['<PAD>'], vocab['<UNK>']), (0, 1))
+
+    def test_fixed_vocabulary_maps_unknown_words(self):
+        build_corpus(self.csv_path, self.corpus_dir, vocab={'<PAD>': 0, '<UNK>': 1, 'great': 2}, max_length=4)
+        tokens, _, vocab = load_corpus(self.corpus_dir)
+
+        self.assertEqual(len(vocab), 3)
+        self.assertEqual(tokens[0].tolist(), [2, 1, 1, 1])
+
+    def test_sequential_batches_are_views_of_the_mapping(self):
+        build_corpus(self.csv_path, self.corpus_dir, max_length=8)
+        tokens, labels, _ = load_corpus(self.corpus_dir)
+
+        batches = list(iterate_batches(tokens, labels, batch_size=2, shuffle=False))
+        self.assertEqual([len(batch_labels) for _, batch_labels in batches], [2, 2, 1])
+        self.assertEqual(batches[1][0].data_ptr(), tokens[2].data_ptr())
+
+        shuffled = list(iterate_batches(tokens, labels, batch_size=2, indices=torch.tensor([0, 2, 4])))
+        self.assertEqual(sorted(torch.cat([batch_labels for _, batch_labels in shuffled]).tolist()), [0, 1, 2])
+
+    def test_corpus_with_other_token_dtype_must_be_rebuilt(self):
+        build_corpus(self.csv_path, self.corpus_dir, max_length=8)
+        np.save(self.corpus_dir / 'tokens.npy', np.zeros((5, 8), dtype=np.int32))
+
+        with self.assertRaises(ValueError):
+            load_corpus(self.corpus_dir)
+
+
+class TrainCorpusReuseTests(CorpusTestMixin, SimpleTestCase):
+    def train(self, **kwargs):
+        with mock.patch.object(train_dl_model, 'build_corpus', wraps=build_corpus) as build:
+            train_dl_model.train(self.csv_path, self.corpus_dir, self.root / 'model', epochs=1, verbose=False, **kwargs)
+        return build.call_count
+
+    def test_unchanged_csv_reuses_the_corpus(self):
+        self.assertEqual(self.train(), 1)
+        self.assertTrue(is_current(self.corpus_dir, self.csv_path))
+        self.assertEqual(self.train(), 0)
+        self.assertEqual(self.train(rebuild_corpus=True), 1)
+
+    def test_changed_csv_rebuilds_the_corpus(self):
+        self.train()
+        self.write_csv(self.rows + [('a brand new row', 1)])
+
+        self.assertFalse(is_current(self.corpus_dir, self.csv_path))
+        self.assertEqual(self.train(), 1)
+        self.assertEqual(len(load_corpus(self.corpus_dir)[1]), 6)
+
+    def test_given_vocabulary_retokenizes(self):
+        self.train()
+        vocab = {'<PAD>': 0, '<UNK>': 1, 'great': 2}
+
+        self.assertEqual(self.train(vocab=vocab), 1)
+        self.assertEqual(load_corpus(self.corpus_dir)[2], vocab)
+
+    def test_corpus_built_with_another_max_length_is_stale(self):
+        build_corpus(self.csv_path, self.corpus_dir, max_length=8)
+
+        self.assertFalse(is_current(self.corpus_dir, self.csv_path, max_length=50))
+        self.assertFalse(is_current(self.root / 'missing', self.csv_path))
+
+
+@override_settings(RETRAIN_AGREEMENT_CONFIDENCE=0.8)
+class AgreementLabelTests(MongoTestCase):
+    def article(self, text_sentiment, image_sentiment, confidence=0.9):
+        title = f'{text_sentiment} {image_sentiment} {confidence}'
+        NewsArticle.get_collection().insert_one({
+            'title': title, 'description': 'Details.', 'url': f'https://example.com/{title}',
+            'text_sentiment': text_sentiment, 'text_confidence': confidence,
+            'image_sentiment': image_sentiment, 'image_confidence': confidence,
+            'fetched_at': datetime.utcnow(),
+        })
+
+    def test_confident_agreement_becomes_a_label(self):
+        self.article('positive', 'positive')
+        self.article('positive', 'negative')
+        self.article('negative', 'negative', confidence=0.5)
+
+        self.assertEqual(retraining.collect_agreement_labels(), 1)
+        label, = SentimentLabel.iter_all()
+        self.assertEqual((label['text'], label['sentiment'], label['source']),
+                         ('positive positive 0.9. Details.', 'positive', 'agreement'))
+        # Already labelled
+        self.assertEqual(retraining.collect_agreement_labels(), 0)
+
+    def test_agreement_never_overrides_an_admin_label(self):
+        self.article('positive', 'positive')
+        article_id = NewsArticle.get_collection().find_one()['_id']
+        SentimentLabel.upsert_many([(article_id, 'Corrected text', 'negative')], source='admin')
+
+        self.assertEqual(retraining.collect_agreement_labels(), 0)
+        self.assertEqual(SentimentLabel.get_collection().find_one()['sentiment'], 'negative')
+
+
+@override_settings(RETRAIN_MIN_NEW_LABELS=2, RETRAIN_MIN_IMPROVEMENT=0.0)
+class RetrainingTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.registry = mock.Mock()
+        self.registry.current_version.return_value = None
+        self.evaluations = []
+        patchers = [
+            # Harvesting is covered by AgreementLabelTests; labels are added directly here
+            mock.patch.object(retraining, 'collect_agreement_labels', return_value=0),
+            mock.patch.object(retraining, 'ModelRegistry', return_value=self.registry),
+            mock.patch.object(retraining, 'SentimentAnalyzer', return_value=mock.Mock(version='base')),
+            mock.patch.object(retraining, '_split_rows', return_value=([('good', 2)], [('bad', 0)])),
+            mock.patch.object(retraining, 'build_corpus'),
+            mock.patch.object(retraining, 'train'),
+            mock.patch.object(retraining, '_evaluate_on', side_effect=lambda *args: self.evaluations.pop(0)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def label(self, article_id):
+        SentimentLabel.upsert_many([(article_id, f'Text of {article_id}', 'positive')], source='admin')
+
+    def evaluate_as(self, baseline, candidate):
+        self.evaluations = [baseline, candidate]
+
+    def test_skipped_runs_accumulate_labels_until_training(self):
+        self.label('a1')
+        self.assertEqual(retraining.retrain_text_model(), 'skipped')
+
+        self.label('a2')
+        self.evaluate_as({'accuracy': 80.0, 'loss': 0.5}, {'accuracy': 85.0, 'loss': 0.4})
+        self.assertEqual(retraining.retrain_text_model(), 'promoted')
+        self.assertEqual(ModelTrainingRun.get_last_trained('text')['label_count'], 2)
+
+        # Counting starts over after a real training run
+        self.assertEqual(retraining.retrain_text_model(), 'skipped')
+
+    def test_improving_candidate_is_registered_and_promoted(self):
+        self.evaluate_as({'accuracy': 80.0, 'loss': 0.5}, {'accuracy': 80.0, 'loss': 0.45})
+
+        self.assertEqual(retraining.retrain_text_model(force=True), 'promoted')
+        self.assertTrue(self.registry.register.call_args.kwargs['promote'])
+        run = ModelTrainingRun.get_last('text')
+        self.assertEqual(run['metrics']['candidate'], {'accuracy': 80.0, 'loss': 0.45})
+        self.assertEqual(run['version'], self.registry.register.call_args.kwargs['version'])
+
+    def test_worse_candidate_is_rejected(self):
+        self.evaluate_as({'accuracy': 80.0, 'loss': 0.5}, {'accuracy': 79.0, 'loss': 0.3})
+
+        self.assertEqual(retraining.retrain_text_model(force=True), 'rejected')
+        self.registry.register.assert_not_called()
+        self.assertEqual(ModelTrainingRun.get_last('text')['status'], 'rejected')
+
+
+class TrainThreadsTests(CorpusTestMixin, SimpleTestCase):
+    def test_training_restores_the_process_thread_count(self):
+        threads = torch.get_num_threads()
+        train_dl_model.train(self.csv_path, self.corpus_dir, self.root / 'model', epochs=1,
+                             num_threads=threads + 1, verbose=False)
+
+        self.assertEqual(torch.get_num_threads(), threads)
+
+
+class LabelArticleViewTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.article_id = str(NewsArticle.get_collection().insert_one({
+            'title': 'Storm closes the port', 'description': 'Ships wait offshore.', 'url': 'https://example.com/port',
+            'sentiment': 'neutral', 'published_at': datetime.utcnow(),
+        }).inserted_id)
+        patcher = mock.patch('analyzer.admin.messages')
+        self.messages = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def label(self, article_id, sentiment='negative'):
+        request = RequestFactory().post('/admin/label-article/', {'article_id': article_id, 'sentiment': sentiment})
+        return label_article_view(request)
+
+    def test_correction_is_saved_as_an_admin_label(self):
+        self.assertEqual(self.label(self.article_id).status_code, 302)
+
+        self.assertEqual(NewsArticle.get_by_id(self.article_id)['sentiment'], 'negative')
+        label, = SentimentLabel.iter_all()
+        self.assertEqual((label['text'], label['source']), ('Storm closes the port. Ships wait offshore.', 'admin'))
+
+    def test_malformed_id_or_sentiment_is_reported(self):
+        self.assertEqual(self.label('not-an-object-id').status_code, 302)
+        self.assertEqual(self.label(self.article_id, sentiment='furious').status_code, 302)
+
+        self.assertEqual(self.messages.error.call_count, 2)
+        self.assertEqual(list(SentimentLabel.iter_all()), [])
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        self.registry = ModelRegistry(self.root / 'store')
+        self.loader = mock.Mock(side_effect=lambda model_dir: SimpleNamespace(model_dir=model_dir))
+
+    def register(self, version, content=b'weights', promote=True):
+        artifact = self.root / f'{version}.pth'
+        artifact.write_bytes(content)
+        return self.registry.register('text', {'model.pth': artifact}, metadata={'metrics': {'accuracy': 90}},
+                                      version=version, promote=promote)
+
+    def handle(self):
+        return ModelHandle('text', self.loader, registry=self.registry, check_interval=0)
+
+    def wait_for_version(self, handle, version):
+        deadline = time.monotonic() + 5
+        while handle.version != version and time.monotonic() < deadline:
+            handle.get()
+            time.sleep(0.01)
+        return handle.version
+
+    def test_registered_version_is_promoted_with_checksums(self):
+        self.assertIsNone(self.registry.current_version('text'))
+        self.register('v1', promote=False)
+        self.assertIsNone(self.registry.current_version('text'))
+        self.registry.promote('text', 'v1')
+
+        self.assertEqual(self.registry.current_version('text'), 'v1')
+        self.assertEqual(self.registry.versions('text'), ['v1'])
+        metadata = self.registry.metadata('text', 'v1')
+        self.assertEqual(metadata['metrics'], {'accuracy': 90})
+        self.assertEqual(metadata['files']['model.pth'], file_sha256(self.root / 'v1.pth'))
+
+    def test_existing_or_unknown_versions_are_rejected(self):
+        self.register('v1')
+
+        with self.assertRaises(ValueError):
+            self.register('v1')
+        with self.assertRaises(ValueError):
+            self.registry.promote('text', 'v2')
+
+    def test_tampered_artifact_fails_verification(self):
+        self.register('v1')
+        (self.registry.version_dir('text', 'v1') / 'model.pth').write_bytes(b'tampered')
+
+        with self.assertRaises(ChecksumError):
+            self.registry.verify('text', 'v1')
+
+    def test_promoted_version_is_swapped_in_by_reference(self):
+        handle = self.handle()
+        bundled = handle.get()
+        self.assertEqual((handle.version, bundled.model_dir), ('base', None))
+
+        self.register('v1')
+        self.assertEqual(self.wait_for_version(handle, 'v1'), 'v1')
+        self.assertEqual(handle.get().model_dir, self.registry.version_dir('text', 'v1'))
+        # Callers holding the old model keep it
+        self.assertIsNone(bundled.model_dir)
+
+    def test_corrupt_version_falls_back_to_the_bundled_model(self):
+        self.register('v1')
+        (self.registry.version_dir('text', 'v1') / 'model.pth').write_bytes(b'tampered')
+
+        handle = self.handle()
+        with self.assertLogs('analyzer.model_registry', 'ERROR'):
+            self.assertIsNone(handle.get().model_dir)
+        self.assertEqual(handle.version, 'base')
+        handle.get()
+        # The failed version isn't retried
+        self.assertEqual(self.loader.call_count, 1)
+
+
+class BackfillSentimentsTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        now = datetime.utcnow()
+        NewsArticle.get_collection().insert_many([
+            {'title': f'Article {i}', 'url': f'https://example.com/{i}', 'published_at': now,
+             **({'sentiment': 'neutral'} if i == 2 else {})}
+            for i in range(7)
+        ])
+        self.scored = []
+        self.fail_on_page = None
+
+        def analyze(articles):
+            if len(self.scored) == self.fail_on_page:
+                raise RuntimeError('interrupted')
+            self.scored.append([article['title'] for article in articles])
+            return [{
+                'sentiment': 'positive', 'confidence': 0.9, 'text_sentiment': 'positive', 'text_confidence': 0.9,
+                'image_sentiment': None, 'image_confidence': None, 'model_version': {'text': 'base'},
+            } for _ in articles]
+
+        command = 'analyzer.management.commands.backfill_sentiments'
+        patchers = [
+            mock.patch(f'{command}.get_analyzer', return_value=SimpleNamespace(version='base')),
+            mock.patch(f'{command}.get_image_analyzer', return_value=SimpleNamespace(version='base')),
+            mock.patch(f'{command}.NewsAggregator', return_value=mock.Mock(_analyze_multimodal_batch=analyze)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def backfill(self, *args):
+        call_command('backfill_sentiments', '--batch-size', '2', '--workers', '1', *args, stdout=StringIO())
+
+    def test_missing_sentiments_are_scored_page_by_page(self):
+        self.backfill()
+
+        self.assertEqual(self.scored, [['Article 0', 'Article 1'], ['Article 3', 'Article 4'], ['Article 5', 'Article 6']])
+        self.assertEqual(NewsArticle.count({'sentiment': 'positive'}), 6)
+        self.assertEqual(JobCheckpoint.get('backfill_sentiments:missing')['processed'], 6)
+
+    def test_interrupted_run_resumes_after_the_checkpoint(self):
+        self.fail_on_page = 1
+        with self.assertRaises(RuntimeError):
+            self.backfill()
+        self.assertEqual(JobCheckpoint.get('backfill_sentiments:missing')['processed'], 2)
+
+        self.fail_on_page = None
+        self.backfill()
+        self.assertEqual(self.scored[1:], [['Article 3', 'Article 4'], ['Article 5', 'Article 6']])
+        self.assertEqual(JobCheckpoint.get('backfill_sentiments:missing')['processed'], 6)
+
+    def test_limit_then_rescore(self):
+        self.backfill('--limit', '3')
+        self.assertEqual(self.scored, [['Article 0', 'Article 1'], ['Article 3']])
+
+        self.backfill('--rescore')
+        # Everything not scored by the current text model, including the older neutral article
+        self.assertEqual(sum(self.scored[2:], []), ['Article 2', 'Article 4', 'Article 5', 'Article 6'])
+
+
+class DigestRunTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        now = datetime.utcnow()
+        NewsArticle.get_collection().insert_many([
+            {'title': title, 'url': f'https://example.com/{title}', 'category': category, 'sentiment': sentiment,
+             'sentiment_confidence': confidence, 'published_at': now - timedelta(hours=hours), **extra}
+            for title, category, sentiment, confidence, hours, extra in (
+                ('chips', 'technology', 'positive', 0.9, 1, {'cluster_id': 'chips'}),
+                ('chips-copy', 'technology', 'positive', 0.8, 1, {'cluster_id': 'chips'}),
+                ('phones', 'technology', 'Neutral', 0.7, 1, {}),
+                ('outage', 'technology', 'negative', 0.95, 1, {}),
+                ('old', 'technology', 'positive', 0.99, 48, {}),
+                ('markets', 'business', 'positive', 0.6, 1, {'cluster_id': 'chips'}),
+                ('rates', 'business', 'neutral', 0.5, 1, {}),
+            )
+        ])
+
+    def titles(self, articles):
+        return [article['title'] for article in articles]
+
+    def test_category_articles_are_queried_once_per_run(self):
+        run = DigestRun(per_category=2)
+        with mock.patch.object(NewsArticle, 'get_all', wraps=NewsArticle.get_all) as get_all:
+            first = run.category_articles('technology')
+            run.category_articles('technology')
+
+        self.assertEqual(get_all.call_count, 1)
+        # Recent positive/neutral only, one per story, by confidence
+        self.assertEqual(self.titles(first), ['chips', 'phones'])
+
+    def test_users_get_one_article_per_story_across_categories(self):
+        run = DigestRun(per_category=2)
+
+        digest = run.articles_for({'notification_categories': ['technology', 'business']})
+        self.assertEqual(self.titles(digest), ['chips', 'phones', 'rates'])
+        # Without notification categories: favorites, then the defaults
+        self.assertEqual(self.titles(run.articles_for({'favorite_categories': ['business']})), ['markets', 'rates'])
+        self.assertEqual(self.titles(run.articles_for({})), ['chips', 'phones'])
+
+    def test_recipients_are_streamed_in_user_chunks(self):
+        for user_id in (3, 1):
+            UserProfile.create(user_id)
+        UserProfile.create(2, notification_enabled=False)
+        UserProfile.create(4, notification_frequency='weekly')
+
+        chunks = []
+
+        def with_users(profiles):
+            chunks.append([profile['user_id'] for profile in profiles])
+            return []
+
+        with mock.patch.object(DigestRun, '_with_users', staticmethod(with_users)):
+            self.assertEqual([last for last, _ in DigestRun(user_chunk_size=1).iter_recipient_chunks()], [1, 3])
+
+        self.assertEqual(chunks, [[1], [3]])
+
+
+class EmailDispatcherTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.api = mock.Mock()
+        patcher = mock.patch('analyzer.email_dispatch.time.sleep')  # Retry backoff
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def dispatcher(self, **kwargs):
+        return EmailDispatcher(api_instance=self.api, sender={'name': 'News', 'email': 'news@example.com'},
+                               workers=2, rate=1000, burst=1000, **kwargs)
+
+    @staticmethod
+    def message(user_id, html='<p>Digest</p>'):
+        return EmailMessage(user_id, f'user{user_id}@example.com', f'user{user_id}', 'Your digest', html,
+                            'daily_digest', ['a1'], 'run-1')
+
+    def test_identical_content_is_sent_in_batches(self):
+        with self.dispatcher(batch_size=2) as dispatcher:
+            for user_id in range(3):
+                dispatcher.submit(self.message(user_id))
+            dispatcher.submit(self.message(9, html='<p>Other digest</p>'))
+
+        requests_sent = [call.args[0] for call in self.api.send_transac_email.call_args_list]
+        self.assertEqual(sorted(len(r.message_versions or [r]) for r in requests_sent), [1, 1, 2])
+        self.assertEqual((dispatcher.sent_count, dispatcher.api_calls), (4, 3))
+        self.assertEqual(EmailLog.get_collection().count_documents({'run_id': 'run-1'}), 4)
+
+    def test_throttled_calls_are_retried(self):
+        self.api.send_transac_email.side_effect = [ApiException(status=429), ApiException(status=503), None]
+        with self.dispatcher() as dispatcher:
+            dispatcher.submit(self.message(1))
+
+        self.assertEqual((dispatcher.sent_count, dispatcher.failed_count, dispatcher.api_calls), (1, 0, 3))
+        self.assertEqual([call.args[0] for call in self.sleep.call_args_list], [1, 2])
+
+    def test_rejected_batch_is_counted_as_failed_without_logs(self):
+        self.api.send_transac_email.side_effect = ApiException(status=400)
+        with self.assertLogs('analyzer.email_dispatch', 'ERROR'), self.dispatcher(batch_size=2) as dispatcher:
+            dispatcher.submit(self.message(1))
+            dispatcher.submit(self.message(2))
+
+        self.assertEqual((dispatcher.sent_count, dispatcher.failed_count, dispatcher.api_calls), (0, 2, 1))
+        self.assertEqual(EmailLog.get_collection().count_documents({}), 0)
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_calls_beyond_the_burst_wait_for_tokens(self):
+        bucket = TokenBucket(rate=50, capacity=2)
+        start = time.monotonic()
+        for _ in range(4):
+            bucket.acquire()
+
+        # Two from the burst, two refilled at 50/s
+        self.assertGreaterEqual(time.monotonic() - start, 0.035)
+
+
+class DigestRenderTests(SimpleTestCase):
+    article = {
+        '_id': 'a1', 'url': 'https://example.com/a?x=1&y=2', 'title': 'Chips <b>boom</b>', 'source': 'Example',
+        'category': 'technology', 'sentiment': 'positive', 'description': None,
+    }
+
+    def test_fields_are_escaped(self):
+        html = render_card(self.article)
+
+        self.assertIn('href="https://example.com/a?x=1&amp;y=2"', html)
+        self.assertIn('Chips &lt;b&gt;boom&lt;/b&gt;', html)
+        self.assertIn('Example | Technology |', html)
+        self.assertIn('<p></p>', html)
+
+    def test_each_card_is_rendered_once_per_run(self):
+        run = DigestRun()
+        other = {**self.article, '_id': 'a2', 'title': 'Other'}
+        with mock.patch('analyzer.digest.render_card', wraps=render_card) as render:
+            first = run.render([self.article, other])
+            second = run.render([other])
+
+        self.assertEqual(render.call_count, 2)
+        self.assertEqual(first.count('<div'), 2)
+        self.assertIn(run.card_html(other), second)
+        self.assertIn('Your Daily AI News Digest', second)
+
+
+@override_settings(
+    FETCH_BUDGET_RESERVE=0.1, FETCH_MAX_REQUESTS_PER_TICK=100, FETCH_MIN_RATE=0.25,
+    FETCH_DUPLICATE_STREAK=3, FETCH_BACKOFF_MINUTES=60, FETCH_MAX_BACKOFF_MINUTES=360,
+)
+class FetchPlannerTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+        self.aggregator = mock.Mock()
+        self.aggregator.is_configured.side_effect = lambda provider: provider in ('newsapi', 'gnews')
+
+    def planner(self, **kwargs):
+        return FetchPlanner(self.aggregator, budgets={'newsapi': 100, 'gnews': 100, 'currents': 100},
+                            categories=['general', 'business', 'technology'], interval_minutes=15, **kwargs)
+
+    def fetched(self, provider, *new_counts, category='general'):
+        """Record fetches, newest first, one minute apart"""
+        for minutes, new_count in enumerate(new_counts, start=1):
+            ProviderFetch.get_collection().insert_one({
+                'provider': provider, 'category': category, 'fetched_count': 10, 'new_count': new_count,
+                'fetched_at': self.now - timedelta(minutes=minutes),
+            })
+
+    def test_budget_is_paced_over_the_day(self):
+        ProviderQuota.record_request('newsapi', count=40)
+        status = self.planner().status(self.now)
+
+        # Unconfigured providers are left out
+        self.assertEqual(set(status), {'newsapi', 'gnews'})
+        # 90 requests (reserve excluded) x 12h15m of 24h, minus what was already used today
+        self.assertEqual((status['gnews']['allowed'], status['newsapi']['allowed']), (45, 5))
+        with override_settings(FETCH_MAX_REQUESTS_PER_TICK=3):
+            self.assertEqual(self.planner().status(self.now)['gnews']['allowed'], 3)
+
+    def test_low_yield_provider_gets_a_slower_pace(self):
+        self.fetched('newsapi', 10, 10, 10, 10, 10)
+        self.fetched('gnews', 1, 1, 1, 1, 1)
+        status = self.planner().status(self.now)
+
+        self.assertEqual(status['newsapi']['rate'], 1.0)
+        self.assertEqual(status['gnews']['rate'], 0.32)
+        self.assertEqual((status['newsapi']['allowed'], status['gnews']['allowed']), (45, 14))
+
+    def test_duplicate_streak_backs_off_exponentially(self):
+        self.fetched('gnews', 0, 0, 0, 4)
+        self.assertEqual(self.planner().status(self.now)['gnews']['allowed'], 0)
+
+        ProviderFetch.get_collection().delete_many({})
+        self.fetched('gnews', 0, 0, 0, 0)
+        status = self.planner().status(self.now + timedelta(minutes=90))['gnews']
+        self.assertEqual((status['duplicate_streak'], status['allowed']), (4, 0))
+        self.assertEqual(status['backoff_until'], self.now - timedelta(minutes=1) + timedelta(minutes=120))
+
+    def test_plan_spreads_requests_over_least_recent_categories(self):
+        self.fetched('newsapi', 5, 5, category='general')
+        self.fetched('gnews', 1, category='technology')
+
+        with override_settings(FETCH_MAX_REQUESTS_PER_TICK=2):
+            plan = self.planner().plan(self.now)
+
+        self.assertEqual(plan, [
+            ('newsapi', 'business'), ('newsapi', 'technology'), ('gnews', 'general'), ('gnews', 'business'),
+        ])
+
+    def test_run_fetches_the_plan(self):
+        self.aggregator.fetch_many.return_value = 7
+        with override_settings(FETCH_MAX_REQUESTS_PER_TICK=1):
+            self.assertEqual(self.planner().run(), 7)
+
+        self.assertEqual(len(self.aggregator.fetch_many.call_args.args[0]), 2)
+        self.aggregator.is_configured.side_effect = lambda provider: False
+        self.assertEqual(self.planner().run(), 0)
+
+
+@override_settings(FETCH_PLAN_INTERVAL_MINUTES=25)
+class FetchScheduleTests(SimpleTestCase):
+    def test_replicas_fire_on_the_same_slots(self):
+        now = datetime.now(timezone.utc)
+        fire_times = []
+        for owner in ('a', 'b'):
+            target = BackgroundScheduler(timezone=timezone.utc)
+            scheduler.add_jobs(target, owner=owner)
+            fire_times.append(target.get_job('fetch_news').trigger.get_next_fire_time(None, now))
+
+        self.assertEqual(fire_times[0], fire_times[1])
+        self.assertLessEqual(fire_times[0] - now, timedelta(minutes=25))
+        self.assertEqual((fire_times[0] - scheduler.FETCH_INTERVAL_START) % timedelta(minutes=25), timedelta(0))
+
+
+class ImageFeatureCacheTests(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        root = Path(directory.name)
+        for label, color in (('negative', 'red'), ('positive', 'blue')):
+            (root / 'dataset' / 'train' / label).mkdir(parents=True)
+            for i in range(3):
+                Image.new('RGB', (32, 32), color).save(root / 'dataset' / 'train' / label / f'{i}.png')
+
+        patchers = [
+            mock.patch.object(train_image_model, 'DATASET_DIR', root / 'dataset'),
+            mock.patch.object(train_image_model, 'FEATURE_DIR', root / 'features'),
+            mock.patch.object(train_image_model, 'NUM_WORKERS', 0),
+            mock.patch('builtins.print'),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Stand-in for the frozen ResNet18 backbone: mean colour -> 512 features
+        torch.manual_seed(0)
+        self.backbone = mock.Mock(wraps=torch.nn.Sequential(
+            torch.nn.AdaptiveAvgPool2d(1), torch.nn.Flatten(), torch.nn.Linear(3, train_image_model.NUM_FEATURES)
+        ))
+
+    def test_features_are_extracted_once_per_variant_and_reused(self):
+        features, labels, classes = train_image_model.extract_features(self.backbone, 'train', variants=2)
+
+        self.assertEqual(features.shape, (12, train_image_model.NUM_FEATURES))
+        self.assertEqual(labels.tolist(), [0, 0, 0, 1, 1, 1] * 2)
+        self.assertEqual(classes, ['negative', 'positive'])
+        passes = self.backbone.call_count
+
+        cached, _, _ = train_image_model.extract_features(self.backbone, 'train', variants=2)
+        self.assertEqual(self.backbone.call_count, passes)
+        self.assertTrue(np.array_equal(cached, features))
+
+        # Another variant count (or --refresh-features) extracts again
+        train_image_model.extract_features(self.backbone, 'train', variants=1)
+        train_image_model.extract_features(self.backbone, 'train', variants=1, refresh=True)
+        self.assertEqual(self.backbone.call_count, passes * 2)
+
+    def test_head_trains_on_the_feature_arrays(self):
+        features, labels, _ = train_image_model.extract_features(self.backbone, 'train', variants=1)
+        features, labels = torch.from_numpy(features), torch.from_numpy(labels)
+        head = torch.nn.Linear(train_image_model.NUM_FEATURES, 3)
+        criterion = torch.nn.CrossEntropyLoss()
+        optimizer = torch.optim.Adam(head.parameters(), lr=0.01)
+
+        for _ in range(20):
+            train_image_model.run_epoch(head, features, labels, criterion, optimizer)
+        _, accuracy = train_image_model.run_epoch(head, features, labels, criterion)
+        self.assertEqual(accuracy, 100.0)
@@ -0,0 +1,151 @@
+"""
+Pre-tokenized training corpus for the text CNN
+
+The CSV (text,sentiment) is streamed once and written to memory-mapped .npy files:
+- tokens.npy : int64 [N, max_length] token ids (same tokenizer as dl_model)
+- labels.npy : int64 [N]
+- vocab.pkl  : word -> id mapping used for the token ids
+- meta.json  : source file (path, size, mtime), sizes, class counts
+
+Training then indexes whole batches from the mapped arrays instead of building
+Python lists and one tensor per sample, so much larger corpora fit on CPU. Token
+ids are stored as int64, the index type nn.Embedding takes, so batches need no
+conversion: sequential batches are views of the mapping, shuffled ones a single
+gather.
+"""
+
+import os
+import csv
+import json
+import pickle
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from .dl_model import text_to_sequence
+
+VOCAB_SIZE = 5000
+MAX_LENGTH = 50
+
+
+def _iter_rows(csv_path):
+    """Yield (text, label) for valid rows; invalid labels are skipped"""
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            text = row.get('text')
+            try:
+                label = int(float(row.get('sentiment')))
+            except (TypeError, ValueError):
+                continue
+            if text and label in (0, 1, 2):
+                yield text, label
+
+
+def build_vocab(word_counts, vocab_size=VOCAB_SIZE):
+    """Most frequent words get ids 2..vocab_size-1; 0 = <PAD>, 1 = <UNK>"""
+    vocab = {word: idx + 2 for idx, (word, _) in enumerate(word_counts.most_common(vocab_size - 2))}
+    vocab['<PAD>'] = 0
+    vocab['<UNK>'] = 1
+    return vocab
+
+
+def build_corpus(csv_path, out_dir, vocab=None, vocab_size=VOCAB_SIZE, max_length=MAX_LENGTH):
+    """
+    Tokenize a CSV corpus into memory-mapped arrays
+    Pass 1 counts rows (and words, if no vocab is given); pass 2 writes token ids
+    Returns the corpus metadata dict
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # Pass 1: size + vocabulary
+    num_rows = 0
+    word_counts = Counter()
+    for text, _ in _iter_rows(csv_path):
+        num_rows += 1
+        if vocab is None:
+            word_counts.update(text.lower().split())
+
+    if vocab is None:
+        vocab = build_vocab(word_counts, vocab_size)
+
+    # Pass 2: token ids straight into the memmaps
+    tokens = np.lib.format.open_memmap(out_dir / 'tokens.npy', mode='w+', dtype=np.int64, shape=(num_rows, max_length))
+    labels = np.lib.format.open_memmap(out_dir / 'labels.npy', mode='w+', dtype=np.int64, shape=(num_rows,))
+    for i, (text, label) in enumerate(_iter_rows(csv_path)):
+        tokens[i] = text_to_sequence(text, vocab, max_length)
+        labels[i] = label
+    tokens.flush()
+    labels.flush()
+
+    with open(out_dir / 'vocab.pkl', 'wb') as f:
+        pickle.dump(vocab, f)
+
+    source = os.stat(csv_path)
+    meta = {
+        'source': str(csv_path),
+        'source_size': source.st_size,
+        'source_mtime': source.st_mtime,
+        'token_dtype': 'int64',
+        'samples': num_rows,
+        'max_length': max_length,
+        'vocab_size': len(vocab),
+        'class_counts': np.bincount(labels, minlength=3).tolist(),
+    }
+    (out_dir / 'meta.json').write_text(json.dumps(meta, indent=2))
+    return meta
+
+
+def is_current(corpus_dir, csv_path, max_length=MAX_LENGTH):
+    """True if corpus_dir holds a corpus built from csv_path as it is now (same size and mtime)"""
+    try:
+        meta = json.loads((Path(corpus_dir) / 'meta.json').read_text())
+        source = os.stat(csv_path)
+    except (OSError, ValueError):
+        return False
+    return (
+        meta.get('source_size') == source.st_size
+        and meta.get('source_mtime') == source.st_mtime
+        and meta.get('token_dtype') == 'int64'
+        and meta.get('max_length') == max_length
+    )
+
+
+def load_corpus(corpus_dir):
+    """
+    Open a built corpus as zero-copy tensors over the memory-mapped files
+    Returns (tokens int64 tensor [N, L], labels int64 tensor [N], vocab)
+    """
+    corpus_dir = Path(corpus_dir)
+    # Copy-on-write mapping gives writable (torch-compatible) views without touching the files
+    tokens = np.load(corpus_dir / 'tokens.npy', mmap_mode='c')
+    if tokens.dtype != np.int64:
+        raise ValueError(f"Corpus in {corpus_dir} has {tokens.dtype} token ids, rebuild it (--rebuild-corpus)")
+    labels = np.load(corpus_dir / 'labels.npy', mmap_mode='c')
+    with open(corpus_dir / 'vocab.pkl', 'rb') as f:
+        vocab = pickle.load(f)
+    return torch.from_numpy(tokens), torch.from_numpy(labels), vocab
+
+
+def iterate_batches(tokens, labels, batch_size, shuffle=True, indices=None):
+    """
+    Yield (token_batch, label_batch) int64 tensors for whole batches
+    Without shuffling, each batch is a contiguous slice (a view, no copy);
+    shuffled batches are gathered with one index operation
+    """
+    if indices is None:
+        indices = torch.arange(len(labels))
+    if shuffle:
+        indices = indices[torch.randperm(len(indices))]
+
+    contiguous = not shuffle and len(indices) > 0 and bool((indices[1:] - indices[:-1] == 1).all())
+    for start in range(0, len(indices), batch_size):
+        if contiguous:
+            lo = int(indices[start])
+            hi = lo + min(batch_size, len(indices) - start)
+            yield tokens[lo:hi], labels[lo:hi]
+        else:
+            idx = indices[start:start + batch_size]
+            yield tokens[idx], labels[idx]
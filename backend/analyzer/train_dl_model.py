@@ -1,164 +1,233 @@
 #!/usr/bin/env python
-import torch
-import torch.nn as nn
-import torch.optim as optim
-from torch.utils.data import Dataset, DataLoader
-import numpy as np
-import pickle
-from pathlib import Path
-from collections import Counter
+"""
+Training pipeline for the text sentiment CNN
 
-import pandas as pd
+Importable API (used by scheduled retraining) and CLI:
 
-# Load with explicit parameters
-df = pd.read_csv('dataset.csv', quoting=1)  # QUOTE_ALL
+    from analyzer.train_dl_model import train
+    result = train(epochs=50, patience=5, num_threads=4)
 
-# Convert sentiment to int
-df['sentiment'] = pd.to_numeric(df['sentiment'], errors='coerce')
-df = df.dropna()
-df['sentiment'] = df['sentiment'].astype(int)
+    python train_dl_model.py --epochs 50 --patience 5
 
-# Verify
-print(f"\nPositive: {(df['sentiment']==2).sum()}")
-print(f"Negative: {(df['sentiment']==0).sum()}")
-print(f"Neutral: {(df['sentiment']==1).sum()}")
+- Model class and tokenizer are shared with dl_model (what inference loads)
+- Corpus is pre-tokenized into memory-mapped arrays (see text_corpus)
+- A seeded held-out split drives early stopping on validation loss
+- The best checkpoint (lowest validation loss) is what gets saved
+"""
 
-texts = df['text'].tolist()
-labels = df['sentiment'].tolist()
+import os
+import sys
+import time
+import pickle
+import argparse
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+import torch.optim as optim
 
-training_data = list(zip(texts, labels))
+# Allow running as a script from backend/analyzer
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analyzer.dl_model import SentimentCNN, text_to_sequence
+from analyzer.text_corpus import build_corpus, load_corpus, iterate_batches, is_current
 
 # Hyperparameters
 VOCAB_SIZE = 5000
-EMBEDDING_DIM = 128
-NUM_FILTERS = 128
-FILTER_SIZES = [3, 4, 5]
 MAX_LENGTH = 50
-NUM_CLASSES = 3
 EPOCHS = 100
-BATCH_SIZE = 8
-
-# Build vocabulary
-def build_vocab(texts):
-    all_words = ' '.join(texts).lower().split()
-    word_counts = Counter(all_words)
-    vocab = {word: idx + 2 for idx, (word, _) in enumerate(word_counts.most_common(VOCAB_SIZE - 2))}
-    vocab['<PAD>'] = 0
-    vocab['<UNK>'] = 1
-    return vocab
-
-# Text to sequence
-def text_to_sequence(text, vocab, max_length):
-    words = text.lower().split()
-    seq = [vocab.get(word, vocab['<UNK>']) for word in words]
-    if len(seq) < max_length:
-        seq += [vocab['<PAD>']] * (max_length - len(seq))
-    else:
-        seq = seq[:max_length]
-    return seq
-
-# Dataset
-class SentimentDataset(Dataset):
-    def __init__(self, texts, labels, vocab):
-        self.texts = [text_to_sequence(text, vocab, MAX_LENGTH) for text in texts]
-        self.labels = labels
-    
-    def __len__(self):
-        return len(self.texts)
-    
-    def __getitem__(self, idx):
-        return torch.tensor(self.texts[idx]), torch.tensor(self.labels[idx])
-
-# CNN Model
-class SentimentCNN(nn.Module):
-    def __init__(self, vocab_size, embedding_dim, num_filters, filter_sizes, num_classes):
-        super(SentimentCNN, self).__init__()
-        
-        self.embedding = nn.Embedding(vocab_size, embedding_dim, padding_idx=0)
-        
-        self.convs = nn.ModuleList([
-            nn.Conv1d(embedding_dim, num_filters, kernel_size=fs)
-            for fs in filter_sizes
-        ])
-        
-        self.dropout = nn.Dropout(0.5)
-        self.fc = nn.Linear(len(filter_sizes) * num_filters, num_classes)
-    
-    def forward(self, x):
-        # x: (batch_size, seq_len)
-        embedded = self.embedding(x)  # (batch_size, seq_len, embedding_dim)
-        embedded = embedded.permute(0, 2, 1)  # (batch_size, embedding_dim, seq_len)
-        
-        conved = [torch.relu(conv(embedded)) for conv in self.convs]
-        pooled = [torch.max_pool1d(conv, conv.shape[2]).squeeze(2) for conv in conved]
-        
-        cat = torch.cat(pooled, dim=1)
-        cat = self.dropout(cat)
-        
-        return self.fc(cat)
-
-# Prepare data
-texts, labels = zip(*training_data)
-vocab = build_vocab(texts)
-
-dataset = SentimentDataset(texts, labels, vocab)
-dataloader = DataLoader(dataset, batch_size=BATCH_SIZE, shuffle=True)
-
-# Device configuration
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-print(f"Using device: {device}")
-if torch.cuda.is_available():
-    print(f"GPU: {torch.cuda.get_device_name(0)}")
-
-# Initialize model
-model = SentimentCNN(len(vocab), EMBEDDING_DIM, NUM_FILTERS, FILTER_SIZES, NUM_CLASSES).to(device)
-criterion = nn.CrossEntropyLoss()
-optimizer = optim.Adam(model.parameters(), lr=0.001)
-
-# Training
-print("Training CNN model...")
-for epoch in range(EPOCHS):
-    total_loss = 0
-    for texts_batch, labels_batch in dataloader:
-        # Move data to device
-        texts_batch = texts_batch.to(device)
-        labels_batch = labels_batch.to(device)
-        
-        optimizer.zero_grad()
-        outputs = model(texts_batch)
-        loss = criterion(outputs, labels_batch)
-        loss.backward()
-        optimizer.step()
-        total_loss += loss.item()
-    
-    if (epoch + 1) % 10 == 0:
-        print(f'Epoch [{epoch+1}/{EPOCHS}], Loss: {total_loss/len(dataloader):.4f}')
-
-# Save model and vocab
-model_dir = Path(__file__).parent
-torch.save(model.state_dict(), model_dir / 'sentiment_cnn.pth')
-
-with open(model_dir / 'vocab.pkl', 'wb') as f:
-    pickle.dump(vocab, f)
-
-print("\n✅ CNN Model trained and saved!")
-
-# Test
-model.eval()
-test_texts = [
-    "This is amazing news!",
-    "Terrible accident occurred",
-    "The meeting will be held tomorrow"
-]
-
-sentiment_map = {0: 'negative', 1: 'neutral', 2: 'positive'}
-
-with torch.no_grad():
-    for text in test_texts:
-        seq = torch.tensor([text_to_sequence(text, vocab, MAX_LENGTH)]).to(device)
-        output = model(seq)
-        pred = torch.softmax(output, dim=1)
-        sentiment_idx = torch.argmax(pred).item()
-        confidence = pred[0][sentiment_idx].item()
-        print(f"\nText: '{text}'")
-        print(f"Sentiment: {sentiment_map[sentiment_idx]} ({confidence:.2%})")
\ No newline at end of file
+BATCH_SIZE = 64
+LEARNING_RATE = 0.001
+VAL_FRACTION = 0.1
+PATIENCE = 5
+
+MODEL_DIR = Path(__file__).parent
+CSV_PATH = MODEL_DIR / 'dataset.csv'
+CORPUS_DIR = MODEL_DIR / 'corpus'
+
+SENTIMENT_MAP = {0: 'negative', 1: 'neutral', 2: 'positive'}
+
+
+def split_indices(num_samples, val_fraction=VAL_FRACTION, seed=42):
+    """Deterministic (train, val) index split so evaluation stays comparable across runs"""
+    generator = torch.Generator().manual_seed(seed)
+    order = torch.randperm(num_samples, generator=generator)
+    num_val = max(1, int(num_samples * val_fraction)) if val_fraction > 0 else 0
+    return order[num_val:].sort().values, order[:num_val].sort().values
+
+
+def evaluate(model, tokens, labels, indices, batch_size=BATCH_SIZE, device=None):
+    """Return (mean loss, accuracy %) of a model on the given sample indices"""
+    device = device or torch.device('cpu')
+    criterion = nn.CrossEntropyLoss(reduction='sum')
+    model.eval()
+    total_loss, correct = 0.0, 0
+    with torch.no_grad():
+        for texts_batch, labels_batch in iterate_batches(tokens, labels, batch_size, shuffle=False, indices=indices):
+            texts_batch, labels_batch = texts_batch.to(device), labels_batch.to(device)
+            outputs = model(texts_batch)
+            total_loss += criterion(outputs, labels_batch).item()
+            correct += (outputs.argmax(dim=1) == labels_batch).sum().item()
+    total = max(len(indices), 1)
+    return total_loss / total, 100 * correct / total
+
+
+def _save_atomic(state, path):
+    tmp_path = Path(f"{path}.tmp")
+    torch.save(state, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def train(csv_path=CSV_PATH, corpus_dir=CORPUS_DIR, output_dir=MODEL_DIR, epochs=EPOCHS,
+          batch_size=BATCH_SIZE, learning_rate=LEARNING_RATE, val_fraction=VAL_FRACTION,
+          patience=PATIENCE, num_threads=None, init_checkpoint=None, vocab=None,
+          rebuild_corpus=False, seed=42, verbose=True):
+    """
+    Train (or fine-tune) the text CNN
+    - init_checkpoint: state dict path to fine-tune from (requires the matching `vocab`)
+    - vocab: fixed vocabulary for tokenization (the corpus is re-tokenized with it); built from the CSV if None
+    - The corpus in corpus_dir is reused only if it was built from csv_path as it is now
+    Writes sentiment_cnn.pth (best epoch) and vocab.pkl to output_dir
+    Returns: dict with best_val_loss, best_val_accuracy, epochs_run, model_path, vocab_path
+    """
+    log = print if verbose else (lambda *a, **k: None)
+    # torch threads are process-wide: restore them so inference in the same process keeps its own
+    previous_threads = torch.get_num_threads()
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    try:
+        torch.manual_seed(seed)
+
+        # Tokenize once into memory-mapped arrays (re-used on later runs while the CSV is unchanged;
+        # a given vocabulary must be the one the token ids come from)
+        corpus_dir = Path(corpus_dir)
+        if rebuild_corpus or vocab is not None or not is_current(corpus_dir, csv_path, MAX_LENGTH):
+            log(f"Building pre-tokenized corpus from {csv_path}...")
+            meta = build_corpus(csv_path, corpus_dir, vocab=vocab, vocab_size=VOCAB_SIZE, max_length=MAX_LENGTH)
+            log(f"Corpus: {meta['samples']} samples, vocab {meta['vocab_size']}")
+        tokens, labels, vocab = load_corpus(corpus_dir)
+
+        train_idx, val_idx = split_indices(len(labels), val_fraction, seed)
+        log(f"Train: {len(train_idx)} | Validation: {len(val_idx)} | "
+            f"Positive: {(labels == 2).sum().item()} Negative: {(labels == 0).sum().item()} Neutral: {(labels == 1).sum().item()}")
+
+        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        log(f"Using device: {device} ({torch.get_num_threads()} threads)")
+
+        model = SentimentCNN(len(vocab)).to(device)
+        if init_checkpoint:
+            model.load_state_dict(torch.load(init_checkpoint, map_location=device))
+            log(f"Fine-tuning from {init_checkpoint}")
+        criterion = nn.CrossEntropyLoss()
+        optimizer = optim.Adam(model.parameters(), lr=learning_rate)
+
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        model_path = output_dir / 'sentiment_cnn.pth'
+        vocab_path = output_dir / 'vocab.pkl'
+
+        best_val_loss, best_val_acc = float('inf'), 0.0
+        epochs_without_improvement = 0
+        epochs_run = 0
+        start = time.time()
+
+        log("Training CNN model...")
+        for epoch in range(epochs):
+            model.train()
+            total_loss, num_batches = 0.0, 0
+            # Whole batches are indexed from the memory-mapped corpus (no per-sample tensors)
+            for texts_batch, labels_batch in iterate_batches(tokens, labels, batch_size, shuffle=True, indices=train_idx):
+                texts_batch, labels_batch = texts_batch.to(device), labels_batch.to(device)
+                optimizer.zero_grad()
+                loss = criterion(model(texts_batch), labels_batch)
+                loss.backward()
+                optimizer.step()
+                total_loss += loss.item()
+                num_batches += 1
+            epochs_run = epoch + 1
+
+            if len(val_idx) == 0:
+                # No held-out split: keep the latest epoch, no early stopping
+                log(f'Epoch [{epoch+1}/{epochs}], Loss: {total_loss/max(num_batches, 1):.4f}')
+                _save_atomic(model.state_dict(), model_path)
+                continue
+
+            val_loss, val_acc = evaluate(model, tokens, labels, val_idx, batch_size, device)
+            log(f'Epoch [{epoch+1}/{epochs}], Loss: {total_loss/max(num_batches, 1):.4f}, '
+                f'Val Loss: {val_loss:.4f}, Val Acc: {val_acc:.2f}%')
+
+            # Keep the best checkpoint; stop once validation loss stops improving
+            if val_loss < best_val_loss:
+                best_val_loss, best_val_acc = val_loss, val_acc
+                epochs_without_improvement = 0
+                _save_atomic(model.state_dict(), model_path)
+            else:
+                epochs_without_improvement += 1
+                if epochs_without_improvement >= patience:
+                    log(f"Early stopping after {epochs_run} epochs (no improvement for {patience})")
+                    break
+
+        with open(vocab_path, 'wb') as f:
+            pickle.dump(vocab, f)
+
+        log(f"\n✅ CNN Model trained and saved! ({time.time() - start:.1f}s, best val loss {best_val_loss:.4f})")
+        return {
+            'best_val_loss': best_val_loss,
+            'best_val_accuracy': best_val_acc,
+            'epochs_run': epochs_run,
+            'model_path': str(model_path),
+            'vocab_path': str(vocab_path),
+        }
+    finally:
+        torch.set_num_threads(previous_threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the text sentiment CNN')
+    parser.add_argument('--csv', default=str(CSV_PATH), help='Training CSV (text,sentiment)')
+    parser.add_argument('--corpus-dir', default=str(CORPUS_DIR), help='Pre-tokenized corpus location')
+    parser.add_argument('--output-dir', default=str(MODEL_DIR), help='Where to write sentiment_cnn.pth and vocab.pkl')
+    parser.add_argument('--rebuild-corpus', action='store_true', help='Re-tokenize the CSV even if it is unchanged')
+    parser.add_argument('--epochs', type=int, default=EPOCHS)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--val-fraction', type=float, default=VAL_FRACTION)
+    parser.add_argument('--patience', type=int, default=PATIENCE)
+    parser.add_argument('--threads', type=int, default=None, help='torch CPU threads')
+    args = parser.parse_args()
+
+    result = train(
+        csv_path=args.csv,
+        corpus_dir=args.corpus_dir,
+        output_dir=args.output_dir,
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        val_fraction=args.val_fraction,
+        patience=args.patience,
+        num_threads=args.threads,
+        rebuild_corpus=args.rebuild_corpus
+    )
+
+    # Test
+    with open(result['vocab_path'], 'rb') as f:
+        vocab = pickle.load(f)
+    model = SentimentCNN(len(vocab))
+    model.load_state_dict(torch.load(result['model_path'], map_location='cpu'))
+    model.eval()
+
+    test_texts = [
+        "This is amazing news!",
+        "Terrible accident occurred",
+        "The meeting will be held tomorrow"
+    ]
+
+    with torch.no_grad():
+        for text in test_texts:
+            seq = torch.tensor([text_to_sequence(text, vocab, MAX_LENGTH)])
+            pred = torch.softmax(model(seq), dim=1)
+            sentiment_idx = torch.argmax(pred).item()
+            confidence = pred[0][sentiment_idx].item()
+            print(f"\nText: '{text}'")
+            print(f"Sentiment: {SENTIMENT_MAP[sentiment_idx]} ({confidence:.2%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,29 +1,70 @@
 #!/usr/bin/env python3
+"""
+Train the image sentiment model (ResNet18 transfer learning)
 
+The ResNet18 backbone is frozen, so only the final linear layer is trained.
+Instead of pushing every image through the whole backbone on every epoch:
 
+1. Feature extraction (once): run the frozen backbone over the dataset with a few
+   fixed augmentation variants and store the 512-d features in memory-mapped
+   .npy arrays (image_features/). Re-used on later runs unless --refresh-features.
+2. Head training: train nn.Linear(512, 3) directly on those arrays, which takes
+   seconds per epoch.
+3. Export: combine backbone + trained head into image_sentiment.pth, the same
+   checkpoint format ImageSentimentAnalyzer loads.
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.optim as optim
 from torch.utils.data import DataLoader
 from torchvision import datasets, transforms, models
 from PIL import ImageFile
-import time
-from pathlib import Path
 
 # Allow loading of truncated images
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
 # Hyperparameters
-BATCH_SIZE = 32
-EPOCHS = 15  # Fewer epochs needed with transfer learning
+BATCH_SIZE = 32          # Images per backbone pass during feature extraction
+HEAD_BATCH_SIZE = 256    # Feature vectors per step when training the head
+EPOCHS = 15
 LEARNING_RATE = 0.001
 IMAGE_SIZE = 224  # ResNet expects 224x224
+NUM_FEATURES = 512  # ResNet18 features before final layer
+NUM_VARIANTS = 4    # Variant 0 = no augmentation, 1..N-1 = fixed random augmentations
+NUM_WORKERS = 4
+FEATURE_SEED = 1234
+
+DATASET_DIR = Path('image_dataset')
+FEATURE_DIR = Path('image_features')
 
 # Device configuration
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-print(f"Using device: {device}")
-if torch.cuda.is_available():
-    print(f"GPU: {torch.cuda.get_device_name(0)}")
+
+# Data augmentation for training
+train_transform = transforms.Compose([
+    transforms.Resize((IMAGE_SIZE, IMAGE_SIZE)),
+    transforms.RandomHorizontalFlip(),
+    transforms.RandomRotation(10),
+    transforms.ColorJitter(brightness=0.2, contrast=0.2),
+    transforms.ToTensor(),
+    # ImageNet normalization (required for pre-trained models)
+    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+])
+
+# Validation transform (no augmentation)
+val_transform = transforms.Compose([
+    transforms.Resize((IMAGE_SIZE, IMAGE_SIZE)),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+])
+
 
 def create_model():
     """
@@ -34,171 +75,186 @@ def create_model():
     # Load pre-trained ResNet18
     print("\n📥 Loading pre-trained ResNet18...")
     model = models.resnet18(pretrained=True)
-    
+
     # Freeze all layers (don't train them)
     for param in model.parameters():
         param.requires_grad = False
-    
+
     # Replace final layer (this is what we train!)
-    # ResNet18 has 512 features before final layer
     num_features = model.fc.in_features
     model.fc = nn.Linear(num_features, 3)  # 3 classes: positive, neutral, negative
-    
-    print(f"✅ Model loaded! Training only final layer ({num_features} → 3)")
-    print(f"   Pre-trained params: {sum(p.numel() for p in model.parameters() if not p.requires_grad):,}")
-    print(f"   Trainable params: {sum(p.numel() for p in model.parameters() if p.requires_grad):,}")
-    
     return model
 
-# Data augmentation for training
-train_transform = transforms.Compose([
-    transforms.Resize((IMAGE_SIZE, IMAGE_SIZE)),
-    transforms.RandomHorizontalFlip(),
-    transforms.RandomRotation(10),
-    transforms.ColorJitter(brightness=0.2, contrast=0.2),
-    transforms.ToTensor(),
-    # ImageNet normalization (required for pre-trained models)
-    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-])
 
-# Validation transform (no augmentation)
-val_transform = transforms.Compose([
-    transforms.Resize((IMAGE_SIZE, IMAGE_SIZE)),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-])
+def extract_features(backbone, split, variants, refresh=False):
+    """
+    Run the frozen backbone once per variant over a dataset split
+    Returns (features memmap [N * variants, 512], labels memmap [N * variants], classes)
+    """
+    FEATURE_DIR.mkdir(exist_ok=True)
+    features_path = FEATURE_DIR / f'{split}_features.npy'
+    labels_path = FEATURE_DIR / f'{split}_labels.npy'
+    meta_path = FEATURE_DIR / f'{split}_meta.json'
+
+    dataset = datasets.ImageFolder(DATASET_DIR / split, transform=val_transform)
+    meta = {'samples': len(dataset), 'variants': variants, 'classes': dataset.classes}
 
-# Load datasets
-print("\n📂 Loading datasets...")
-train_dataset = datasets.ImageFolder('image_dataset/train', transform=train_transform)
-val_dataset = datasets.ImageFolder('image_dataset/val', transform=val_transform)
+    if not refresh and meta_path.exists() and json.loads(meta_path.read_text()) == meta:
+        print(f"♻️  Re-using cached {split} features ({features_path})")
+        return np.load(features_path, mmap_mode='c'), np.load(labels_path, mmap_mode='c'), dataset.classes
 
-print(f"Training samples: {len(train_dataset)}")
-print(f"Validation samples: {len(val_dataset)}")
-print(f"Classes: {train_dataset.classes}")
+    print(f"\n🧮 Extracting {split} features: {len(dataset)} images x {variants} variant(s)...")
+    start = time.time()
+    total = len(dataset) * variants
+    features = np.lib.format.open_memmap(features_path, mode='w+', dtype=np.float32, shape=(total, NUM_FEATURES))
+    labels = np.lib.format.open_memmap(labels_path, mode='w+', dtype=np.int64, shape=(total,))
 
-# Data loaders
-train_loader = DataLoader(train_dataset, batch_size=BATCH_SIZE, shuffle=True, num_workers=0)
-val_loader = DataLoader(val_dataset, batch_size=BATCH_SIZE, shuffle=False, num_workers=0)
+    offset = 0
+    for variant in range(variants):
+        # Variant 0 is the plain image; the others are fixed (seeded) augmentations
+        dataset.transform = val_transform if variant == 0 else train_transform
+        torch.manual_seed(FEATURE_SEED + variant)
+        loader = DataLoader(dataset, batch_size=BATCH_SIZE, shuffle=False, num_workers=NUM_WORKERS)
 
-# Initialize model
-model = create_model().to(device)
-criterion = nn.CrossEntropyLoss()
+        with torch.no_grad():
+            for images, targets in loader:
+                batch_features = backbone(images.to(device)).cpu().numpy()
+                n = len(batch_features)
+                features[offset:offset + n] = batch_features
+                labels[offset:offset + n] = targets.numpy()
+                offset += n
+        print(f"   Variant {variant + 1}/{variants} done ({time.time() - start:.1f}s)")
 
-# Only optimize the final layer (the one we're training)
-optimizer = optim.Adam(model.fc.parameters(), lr=LEARNING_RATE)
+    features.flush()
+    labels.flush()
+    meta_path.write_text(json.dumps(meta))
+    return np.load(features_path, mmap_mode='c'), np.load(labels_path, mmap_mode='c'), dataset.classes
 
-# Learning rate scheduler
-scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', factor=0.5, patience=2)
 
-# Training function
-def train_epoch(model, loader, criterion, optimizer):
-    model.train()
+def run_epoch(head, features, labels, criterion, optimizer=None):
+    """One pass over feature arrays; trains if an optimizer is given"""
+    training = optimizer is not None
+    head.train(training)
     running_loss = 0.0
     correct = 0
-    total = 0
-    
-    for images, labels in loader:
-        images, labels = images.to(device), labels.to(device)
-        
-        optimizer.zero_grad()
-        outputs = model(images)
-        loss = criterion(outputs, labels)
-        loss.backward()
-        optimizer.step()
-        
-        running_loss += loss.item()
-        _, predicted = torch.max(outputs.data, 1)
-        total += labels.size(0)
-        correct += (predicted == labels).sum().item()
-    
-    avg_loss = running_loss / len(loader)
-    accuracy = 100 * correct / total
-    return avg_loss, accuracy
-
-# Validation function
-def validate(model, loader, criterion):
+    total = len(labels)
+    order = torch.randperm(total) if training else torch.arange(total)
+
+    with torch.set_grad_enabled(training):
+        for start in range(0, total, HEAD_BATCH_SIZE):
+            idx = order[start:start + HEAD_BATCH_SIZE]
+            inputs, targets = features[idx].to(device), labels[idx].to(device)
+
+            outputs = head(inputs)
+            loss = criterion(outputs, targets)
+            if training:
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+
+            running_loss += loss.item() * len(idx)
+            correct += (outputs.argmax(dim=1) == targets).sum().item()
+
+    return running_loss / total, 100 * correct / total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the image sentiment model')
+    parser.add_argument('--epochs', type=int, default=EPOCHS)
+    parser.add_argument('--variants', type=int, default=NUM_VARIANTS)
+    parser.add_argument('--refresh-features', action='store_true', help='Re-run feature extraction')
+    parser.add_argument('--output', default='image_sentiment.pth')
+    args = parser.parse_args()
+
+    print(f"Using device: {device}")
+    if torch.cuda.is_available():
+        print(f"GPU: {torch.cuda.get_device_name(0)}")
+
+    model = create_model().to(device)
+
+    # Backbone = everything but the final layer, in eval mode (frozen BatchNorm statistics)
+    fc = model.fc
+    model.fc = nn.Identity()
     model.eval()
-    running_loss = 0.0
-    correct = 0
-    total = 0
-    
+
+    # 1. Feature extraction (cached)
+    train_features, train_labels, classes = extract_features(model, 'train', args.variants, args.refresh_features)
+    val_features, val_labels, _ = extract_features(model, 'val', 1, args.refresh_features)
+
+    # Zero-copy tensor views over the memory-mapped arrays
+    train_x, train_y = torch.from_numpy(np.asarray(train_features)), torch.from_numpy(np.asarray(train_labels))
+    val_x, val_y = torch.from_numpy(np.asarray(val_features)), torch.from_numpy(np.asarray(val_labels))
+
+    print(f"\nTraining samples: {len(train_y)} ({args.variants} variant(s))")
+    print(f"Validation samples: {len(val_y)}")
+    print(f"Classes: {classes}")
+
+    # 2. Train only the final layer on the cached features
+    head = fc.to(device)
+    for param in head.parameters():
+        param.requires_grad = True
+
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(head.parameters(), lr=LEARNING_RATE)
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', factor=0.5, patience=2)
+
+    print("\n🚀 Starting training...")
+    print("=" * 70)
+
+    best_val_acc = 0.0
+    best_state = None
+    start_time = time.time()
+
+    for epoch in range(args.epochs):
+        epoch_start = time.time()
+
+        train_loss, train_acc = run_epoch(head, train_x, train_y, criterion, optimizer)
+        val_loss, val_acc = run_epoch(head, val_x, val_y, criterion)
+
+        # Update learning rate
+        scheduler.step(val_loss)
+
+        print(f"Epoch [{epoch+1}/{args.epochs}] ({time.time() - epoch_start:.2f}s)")
+        print(f"  Train Loss: {train_loss:.4f} | Train Acc: {train_acc:.2f}%")
+        print(f"  Val Loss:   {val_loss:.4f} | Val Acc:   {val_acc:.2f}%")
+
+        # Keep best head
+        if val_acc > best_val_acc:
+            best_val_acc = val_acc
+            best_state = {k: v.detach().clone() for k, v in head.state_dict().items()}
+            print(f"  ✅ New best head! (Val Acc: {val_acc:.2f}%)")
+
+        print("-" * 70)
+
+    # 3. Export backbone + best head in the format ImageSentimentAnalyzer loads
+    if best_state is not None:
+        head.load_state_dict(best_state)
+    model.fc = head
+    torch.save(model.state_dict(), args.output)
+
+    total_time = time.time() - start_time
+    print(f"\n✅ Training completed in {total_time:.1f} seconds!")
+    print(f"🏆 Best validation accuracy: {best_val_acc:.2f}%")
+    print(f"💾 Model saved as: {args.output}")
+
+    # Test predictions
+    print("\n🧪 Testing predictions...")
+    head.eval()
     with torch.no_grad():
-        for images, labels in loader:
-            images, labels = images.to(device), labels.to(device)
-            outputs = model(images)
-            loss = criterion(outputs, labels)
-            
-            running_loss += loss.item()
-            _, predicted = torch.max(outputs.data, 1)
-            total += labels.size(0)
-            correct += (predicted == labels).sum().item()
-    
-    avg_loss = running_loss / len(loader)
-    accuracy = 100 * correct / total
-    return avg_loss, accuracy
-
-# Training loop
-print("\n🚀 Starting training...")
-print("=" * 70)
-
-best_val_acc = 0.0
-start_time = time.time()
-
-for epoch in range(EPOCHS):
-    epoch_start = time.time()
-    
-    # Train
-    train_loss, train_acc = train_epoch(model, train_loader, criterion, optimizer)
-    
-    # Validate
-    val_loss, val_acc = validate(model, val_loader, criterion)
-    
-    # Update learning rate
-    scheduler.step(val_loss)
-    
-    epoch_time = time.time() - epoch_start
-    
-    # Print progress
-    print(f"Epoch [{epoch+1}/{EPOCHS}] ({epoch_time:.1f}s)")
-    print(f"  Train Loss: {train_loss:.4f} | Train Acc: {train_acc:.2f}%")
-    print(f"  Val Loss:   {val_loss:.4f} | Val Acc:   {val_acc:.2f}%")
-    
-    # Save best model
-    if val_acc > best_val_acc:
-        best_val_acc = val_acc
-        torch.save(model.state_dict(), 'image_sentiment.pth')
-        print(f"  ✅ Saved best model! (Val Acc: {val_acc:.2f}%)")
-    
-    print("-" * 70)
-
-total_time = time.time() - start_time
-print(f"\n✅ Training completed in {total_time/60:.2f} minutes!")
-print(f"🏆 Best validation accuracy: {best_val_acc:.2f}%")
-print(f"💾 Model saved as: image_sentiment.pth")
-
-# Test predictions
-print("\n🧪 Testing predictions...")
-model.eval()
-class_names = train_dataset.classes
-
-# Get a batch of validation images
-dataiter = iter(val_loader)
-images, labels = next(dataiter)
-images, labels = images.to(device), labels.to(device)
-
-with torch.no_grad():
-    outputs = model(images)
-    _, predicted = torch.max(outputs, 1)
-    probs = torch.softmax(outputs, dim=1)
-
-# Show first 5 predictions
-print("\nSample predictions:")
-for i in range(min(5, len(labels))):
-    actual = class_names[labels[i]]
-    pred = class_names[predicted[i]]
-    confidence = probs[i][predicted[i]].item()
-    status = "✅" if actual == pred else "❌"
-    print(f"{status} Actual: {actual:8s} | Predicted: {pred:8s} ({confidence:.2%})")
-
-print("\n🎉 Training complete! Ready for inference.")
+        outputs = head(val_x[:5].to(device))
+        probs = torch.softmax(outputs, dim=1)
+        predicted = outputs.argmax(dim=1)
+
+    print("\nSample predictions:")
+    for i in range(min(5, len(val_y))):
+        actual = classes[val_y[i]]
+        pred = classes[predicted[i]]
+        confidence = probs[i][predicted[i]].item()
+        status = "✅" if actual == pred else "❌"
+        print(f"{status} Actual: {actual:8s} | Predicted: {pred:8s} ({confidence:.2%})")
+
+    print("\n🎉 Training complete! Ready for inference.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Trending Scores
+Precomputes time-decayed popularity scores from recent views, likes and saves
+
+score(article) = sum over interactions of weight * exp(-ln2 * age / half_life)
+
+Scores are written to NewsArticle.trending_score (indexed), so trending lookups
+are a single indexed top-N read instead of an ad-hoc sort.
+"""
+
+import math
+import time
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from django.conf import settings
+from pymongo import UpdateOne
+
+from .models import NewsArticle, UserInteraction
+
+logger = logging.getLogger(__name__)
+
+
+def _decayed_counts(model, since, now, half_life_hours):
+    """Sum exp(-decay * age) per article server-side with an aggregation pipeline"""
+    decay_per_ms = math.log(2) / (half_life_hours * 3600 * 1000)
+    pipeline = [
+        {'$match': {'timestamp': {'$gte': since}}},
+        {'$group': {
+            '_id': '$article_id',
+            'score': {'$sum': {'$exp': {
+                '$multiply': [-decay_per_ms, {'$subtract': [now, '$timestamp']}]
+            }}}
+        }}
+    ]
+    return model.get_collection().aggregate(pipeline)
+
+
+def compute_trending_scores(window_hours=None, half_life_hours=None):
+    """
+    Recompute trending_score for every article with recent interactions
+    Articles that dropped out of the window are reset to 0
+    Returns: number of articles with a non-zero score
+    """
+    window_hours = window_hours or settings.TRENDING_WINDOW_HOURS
+    half_life_hours = half_life_hours or settings.TRENDING_HALF_LIFE_HOURS
+
+    start = time.time()
+    now = datetime.utcnow()
+    since = now - timedelta(hours=window_hours)
+
+    scores = defaultdict(float)
+    for interaction_type, model in UserInteraction.SOURCES.items():
+        weight = UserInteraction.WEIGHTS.get(interaction_type, 1)
+        for row in _decayed_counts(model, since, now, half_life_hours):
+            if row['_id'] and ObjectId.is_valid(row['_id']):
+                scores[row['_id']] += weight * row['score']
+
+    collection = NewsArticle.get_collection()
+    if scores:
+        collection.bulk_write([
+            UpdateOne(
+                {'_id': ObjectId(article_id)},
+                {'$set': {'trending_score': round(score, 4), 'trending_updated_at': now}}
+            )
+            for article_id, score in scores.items()
+        ], ordered=False)
+
+    # Anything not touched in this run has no recent interactions left
+    collection.update_many(
+        {'trending_score': {'$gt': 0}, 'trending_updated_at': {'$lt': now}},
+        {'$set': {'trending_score': 0.0, 'trending_updated_at': now}}
+    )
+
+    logger.info(f"Trending scores computed for {len(scores)} articles in {time.time() - start:.1f}s")
+    return len(scores)
+
+
+def get_trending_articles(limit=20, days=7):
+    """Top-N trending articles published in the last `days` days"""
+    return NewsArticle.get_all(
+        filters={
+            'published_at': {'$gte': datetime.utcnow() - timedelta(days=days)}
+        },
+        limit=limit,
+        sort_by='trending_score'
+    )
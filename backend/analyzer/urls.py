@@ -18,6 +18,7 @@ urlpatterns = [
     path('news/saved/', news_views.get_saved_articles, name='news-saved'),
     path('news/recommended/', news_views.get_recommended_news, name='news-recommended'),
     path('news/categories/', news_views.get_categories, name='news-categories'),
+    path('news/clusters/<str:cluster_id>/', news_views.get_story_cluster, name='news-cluster'),
     path('news/<str:article_id>/', news_views.get_news_detail, name='news-detail'),
     path('news/<str:article_id>/like/', news_views.toggle_like, name='news-like'),
     path('news/<str:article_id>/save/', news_views.toggle_save, name='news-save'),
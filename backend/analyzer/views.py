@@ -6,7 +6,6 @@ from .dl_model import get_analyzer
 from .image_model import get_image_analyzer
 from .serializers import AnalyzeRequestSerializer, ArticleSerializer
 import os
-import tempfile
 
 @api_view(['POST'])
 def analyze_sentiment(request):
@@ -69,34 +68,36 @@ def analyze_image_sentiment(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    # Get image sentiment analyzer
+    analyzer = get_image_analyzer()
+    
+    if image_file.size > analyzer.max_image_bytes:
+        return Response(
+            {'error': f'Image too large. Maximum size: {analyzer.max_image_bytes // (1024 * 1024)} MB'},
+            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+    
     try:
-        # Save image temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
-            for chunk in image_file.chunks():
-                temp_file.write(chunk)
-            temp_path = temp_file.name
-        
-        # Get image sentiment analyzer
-        analyzer = get_image_analyzer()
+        # Read the upload chunk by chunk, aborting as soon as it exceeds the cap
+        # (the declared size is client-supplied and may be wrong)
+        chunks = []
+        received = 0
+        for chunk in image_file.chunks():
+            received += len(chunk)
+            if received > analyzer.max_image_bytes:
+                return Response(
+                    {'error': f'Image too large. Maximum size: {analyzer.max_image_bytes // (1024 * 1024)} MB'},
+                    status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+                )
+            chunks.append(chunk)
+        image_bytes = b''.join(chunks)
         
-        # Predict sentiment
-        result = analyzer.predict(temp_path)
-        
-        # Clean up temporary file
-        os.unlink(temp_path)
+        # Predict sentiment (same batched + content-digest cached path as the fetcher)
+        result = analyzer.predict(image_bytes)
         
         return Response(result, status=status.HTTP_200_OK)
     
-    except FileNotFoundError:
-        return Response(
-            {'error': 'Image model not found. Please train the model first.'},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
     except Exception as e:
-        # Clean up temporary file if it exists
-        if 'temp_path' in locals() and os.path.exists(temp_path):
-            os.unlink(temp_path)
-        
         return Response(
             {'error': str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
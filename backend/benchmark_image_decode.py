@@ -0,0 +1,97 @@
+"""
+Benchmark image preprocessing: full-resolution decode vs reduced-resolution decode
+
+Usage:
+    python benchmark_image_decode.py [image_dir] [--limit N]
+
+image_dir defaults to analyzer/image_dataset (see analyzer/download_image_dataset.py).
+Both paths end in a normalized 3x224x224 tensor; the script reports per-image
+time for each path and the largest pixel difference between them.
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+from io import BytesIO
+
+import torch
+from PIL import Image
+from torchvision import transforms
+
+sys.path.insert(0, str(Path(__file__).parent))
+from analyzer.image_model import ImageSentimentAnalyzer
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
+
+# Previous preprocessing path (full decode + torchvision transforms)
+old_transform = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+])
+
+
+def old_path(data):
+    img = Image.open(BytesIO(data)).convert('RGB')
+    return old_transform(img).unsqueeze(0)
+
+
+def new_path(analyzer, data):
+    img = analyzer._decode(data)
+    return analyzer._to_batch([img]).clone()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('image_dir', nargs='?', default=str(Path(__file__).parent / 'analyzer' / 'image_dataset'))
+    parser.add_argument('--limit', type=int, default=500)
+    args = parser.parse_args()
+
+    paths = sorted(p for p in Path(args.image_dir).rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS)[:args.limit]
+    if not paths:
+        print(f"No images found in {args.image_dir}")
+        return
+
+    # Read everything up front so only decode + preprocessing is measured
+    corpus = [p.read_bytes() for p in paths]
+    print(f"Benchmarking {len(corpus)} images ({sum(map(len, corpus)) / 1e6:.1f} MB) from {args.image_dir}")
+
+    analyzer = ImageSentimentAnalyzer()
+    torch.set_num_threads(1)
+
+    timings = {'old': 0.0, 'new': 0.0}
+    max_diff = 0.0
+    failures = 0
+
+    for data in corpus:
+        try:
+            start = time.perf_counter()
+            old_tensor = old_path(data)
+            timings['old'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            new_tensor = new_path(analyzer, data)
+            timings['new'] += time.perf_counter() - start
+        except Exception:
+            failures += 1
+            continue
+
+        max_diff = max(max_diff, (old_tensor - new_tensor).abs().max().item())
+
+    measured = len(corpus) - failures
+    if not measured:
+        print("No image could be decoded")
+        return
+
+    print("-" * 60)
+    print(f"Old path (full decode + transforms): {timings['old'] / measured * 1000:.2f} ms/image")
+    print(f"New path (draft decode + reuse):     {timings['new'] / measured * 1000:.2f} ms/image")
+    print(f"Speedup: {timings['old'] / max(timings['new'], 1e-9):.2f}x")
+    print(f"Max normalized pixel difference: {max_diff:.3f}")
+    if failures:
+        print(f"Skipped {failures} undecodable images")
+
+
+if __name__ == '__main__':
+    main()
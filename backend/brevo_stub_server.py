@@ -0,0 +1,92 @@
+"""
+Local stand-in for the Brevo transactional email endpoint
+
+Usage:
+    python brevo_stub_server.py [--port 8025] [--rate-limit 10] [--latency 0.05]
+
+Then set BREVO_API_HOST=http://localhost:8025/v3 (and any BREVO_API_KEY) and run
+the digest job. Accepts POST /v3/smtp/email, counts recipients (including
+messageVersions), answers 429 above --rate-limit requests per second and prints
+running totals. Nothing is delivered.
+"""
+
+import json
+import time
+import uuid
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+stats = {'requests': 0, 'recipients': 0, 'rate_limited': 0}
+stats_lock = threading.Lock()
+window = {'second': 0, 'count': 0}
+
+
+class BrevoStubHandler(BaseHTTPRequestHandler):
+    rate_limit = None
+    latency = 0.0
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/v3/smtp/email':
+            self._reply(404, {'code': 'not_found', 'message': self.path})
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        versions = body.get('messageVersions') or []
+        recipients = sum(len(v.get('to') or []) for v in versions) if versions else len(body.get('to') or [])
+
+        with stats_lock:
+            now = int(time.time())
+            if window['second'] != now:
+                window['second'], window['count'] = now, 0
+            window['count'] += 1
+            if self.rate_limit and window['count'] > self.rate_limit:
+                stats['rate_limited'] += 1
+                limited = True
+            else:
+                stats['requests'] += 1
+                stats['recipients'] += recipients
+                limited = False
+            snapshot = dict(stats)
+
+        if limited:
+            self._reply(429, {'code': 'too_many_requests', 'message': 'Rate limit exceeded'})
+            return
+
+        time.sleep(self.latency)
+        message_ids = [f'<{uuid.uuid4()}@stub>' for _ in range(max(len(versions), 1))]
+        if versions:
+            self._reply(201, {'messageIds': message_ids})
+        else:
+            self._reply(201, {'messageId': message_ids[0]})
+        print(f"{snapshot['requests']} requests, {snapshot['recipients']} recipients, "
+              f"{snapshot['rate_limited']} rate limited")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--rate-limit', type=int, default=None, help='Requests per second before 429')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds per request')
+    args = parser.parse_args()
+
+    BrevoStubHandler.rate_limit = args.rate_limit
+    BrevoStubHandler.latency = args.latency
+    server = ThreadingHTTPServer(('localhost', args.port), BrevoStubHandler)
+    print(f"Brevo stub listening on http://localhost:{args.port}/v3")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
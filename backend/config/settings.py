@@ -128,10 +128,121 @@ NEWSDATA_KEY = config('NEWSDATA_KEY', default='')
 GNEWS_API_KEY = config('GNEWS_API_KEY', default='')
 CURRENTS_API_KEY = config('CURRENTS_API_KEY', default='')
 
+# Scheduled news fetching (per-provider daily request budgets, see analyzer/fetch_planner.py)
+FETCH_DAILY_BUDGETS = {
+    'newsapi': config('NEWSAPI_DAILY_BUDGET', default=100, cast=int),
+    'newsdata': config('NEWSDATA_DAILY_BUDGET', default=200, cast=int),
+    'gnews': config('GNEWS_DAILY_BUDGET', default=100, cast=int),
+    'currents': config('CURRENTS_DAILY_BUDGET', default=20, cast=int),  # 600/month
+}
+FETCH_BUDGET_RESERVE = config('FETCH_BUDGET_RESERVE', default=0.1, cast=float)  # Left for manual fetches
+FETCH_PLAN_INTERVAL_MINUTES = config('FETCH_PLAN_INTERVAL_MINUTES', default=15, cast=int)
+FETCH_CATEGORIES = config(
+    'FETCH_CATEGORIES', default='general,business,technology,science,health,sports,entertainment'
+).split(',')
+FETCH_MAX_REQUESTS_PER_TICK = config('FETCH_MAX_REQUESTS_PER_TICK', default=3, cast=int)  # Per provider
+FETCH_MIN_RATE = config('FETCH_MIN_RATE', default=0.25, cast=float)  # Pace of the lowest-yield provider
+FETCH_DUPLICATE_STREAK = config('FETCH_DUPLICATE_STREAK', default=3, cast=int)
+FETCH_BACKOFF_MINUTES = config('FETCH_BACKOFF_MINUTES', default=60, cast=int)
+FETCH_MAX_BACKOFF_MINUTES = config('FETCH_MAX_BACKOFF_MINUTES', default=360, cast=int)
+
+# Streaming ingest pipeline (fetch -> dedup -> text -> image -> write, see analyzer/ingest_pipeline.py)
+INGEST_FETCH_WORKERS = config('INGEST_FETCH_WORKERS', default=4, cast=int)
+INGEST_IMAGE_WORKERS = config('INGEST_IMAGE_WORKERS', default=2, cast=int)
+INGEST_QUEUE_SIZE = config('INGEST_QUEUE_SIZE', default=256, cast=int)  # Items between two stages
+INGEST_DEDUP_BATCH = config('INGEST_DEDUP_BATCH', default=100, cast=int)
+INGEST_TEXT_BATCH = config('INGEST_TEXT_BATCH', default=64, cast=int)
+INGEST_IMAGE_BATCH = config('INGEST_IMAGE_BATCH', default=16, cast=int)
+INGEST_WRITE_BATCH = config('INGEST_WRITE_BATCH', default=50, cast=int)
+INGEST_BATCH_WAIT = config('INGEST_BATCH_WAIT', default=0.5, cast=float)  # Seconds to wait for a batch to fill
+
+# Incremental fetching and raw response cache (see analyzer/response_cache.py)
+FETCH_HIGH_WATER_OVERLAP_MINUTES = config('FETCH_HIGH_WATER_OVERLAP_MINUTES', default=10, cast=int)
+FETCH_CACHE_MODE = config('FETCH_CACHE_MODE', default='off')  # off, record or replay
+FETCH_CACHE_DIR = config('FETCH_CACHE_DIR', default=str(BASE_DIR / 'analyzer' / 'fetch_cache'))
+
+# Near-duplicate detection (MinHash LSH over title + description shingles, see analyzer/near_duplicates.py)
+NEAR_DUPLICATE_THRESHOLD = config('NEAR_DUPLICATE_THRESHOLD', default=0.6, cast=float)  # Estimated Jaccard
+NEAR_DUPLICATE_PERMUTATIONS = config('NEAR_DUPLICATE_PERMUTATIONS', default=64, cast=int)
+NEAR_DUPLICATE_ROWS = config('NEAR_DUPLICATE_ROWS', default=4, cast=int)  # Signature values per LSH band
+NEAR_DUPLICATE_WINDOW_HOURS = config('NEAR_DUPLICATE_WINDOW_HOURS', default=72, cast=int)
+
+# Story clustering (MinHash LSH over content words, see analyzer/story_clusters.py)
+STORY_CLUSTER_THRESHOLD = config('STORY_CLUSTER_THRESHOLD', default=0.25, cast=float)  # Estimated Jaccard
+STORY_CLUSTER_PERMUTATIONS = config('STORY_CLUSTER_PERMUTATIONS', default=64, cast=int)
+STORY_CLUSTER_ROWS = config('STORY_CLUSTER_ROWS', default=2, cast=int)  # Signature values per LSH band
+STORY_CLUSTER_WINDOW_HOURS = config('STORY_CLUSTER_WINDOW_HOURS', default=48, cast=int)
+
 # Email Service (Brevo)
 BREVO_API_KEY = config('BREVO_API_KEY', default='')
 BREVO_SENDER_EMAIL = config('BREVO_SENDER_EMAIL', default='noreply@ainewsanalyzer.com')
 BREVO_SENDER_NAME = config('BREVO_SENDER_NAME', default='AI News Analyzer')
+BREVO_API_HOST = config('BREVO_API_HOST', default='')  # e.g. http://localhost:8025/v3 for brevo_stub_server.py
+
+# Email dispatch (bounded worker pool + token-bucket rate limit on API calls)
+EMAIL_WORKERS = config('EMAIL_WORKERS', default=8, cast=int)
+EMAIL_RATE_LIMIT = config('EMAIL_RATE_LIMIT', default=10.0, cast=float)  # API calls per second
+EMAIL_RATE_BURST = config('EMAIL_RATE_BURST', default=20, cast=int)
+EMAIL_BATCH_SIZE = config('EMAIL_BATCH_SIZE', default=100, cast=int)  # Recipients per API call
+
+# Daily digest job (user_id shards claimed with a lease, resumable)
+DIGEST_SHARDS = config('DIGEST_SHARDS', default=8, cast=int)
+DIGEST_WORKERS = config('DIGEST_WORKERS', default=4, cast=int)
+DIGEST_SHARD_LEASE_SECONDS = config('DIGEST_SHARD_LEASE_SECONDS', default=600, cast=int)
+
+# Scheduler job leases (only one replica runs each job)
+SCHEDULER_LOCK_TTL_SECONDS = config('SCHEDULER_LOCK_TTL_SECONDS', default=300, cast=int)
+SCHEDULER_LOCK_MIN_HOLD_SECONDS = config('SCHEDULER_LOCK_MIN_HOLD_SECONDS', default=120, cast=int)
+
+# Collaborative Filtering Recommender
+CF_MODEL_PATH = config('CF_MODEL_PATH', default=str(BASE_DIR / 'analyzer' / 'cf_factors.npz'))
+CF_TRAINING_DAYS = config('CF_TRAINING_DAYS', default=90, cast=int)
+CF_FACTORS = config('CF_FACTORS', default=32, cast=int)
+CF_ITERATIONS = config('CF_ITERATIONS', default=10, cast=int)
+CF_REGULARIZATION = config('CF_REGULARIZATION', default=0.1, cast=float)
+CF_ALPHA = config('CF_ALPHA', default=10.0, cast=float)
+
+# Recommendation feed cache
+RECOMMENDATION_FEED_SIZE = config('RECOMMENDATION_FEED_SIZE', default=200, cast=int)
+RECOMMENDATION_FEED_TTL = config('RECOMMENDATION_FEED_TTL', default=1800, cast=int)  # seconds
+
+# Per-user "already seen" Bloom filters
+SEEN_FILTER_CAPACITY = config('SEEN_FILTER_CAPACITY', default=2000, cast=int)
+SEEN_FILTER_ERROR_RATE = config('SEEN_FILTER_ERROR_RATE', default=0.01, cast=float)
+RECOMMENDATION_OVERFETCH = config('RECOMMENDATION_OVERFETCH', default=3, cast=int)
+
+# Recommendation re-ranking (weights of each scoring feature)
+RECOMMENDATION_WEIGHTS = {
+    'recency': config('RECOMMENDATION_WEIGHT_RECENCY', default=1.0, cast=float),
+    'preference': config('RECOMMENDATION_WEIGHT_PREFERENCE', default=1.5, cast=float),
+    'popularity': config('RECOMMENDATION_WEIGHT_POPULARITY', default=0.75, cast=float),
+    'sentiment': config('RECOMMENDATION_WEIGHT_SENTIMENT', default=0.25, cast=float),
+    'collaborative': config('RECOMMENDATION_WEIGHT_COLLABORATIVE', default=1.0, cast=float),
+}
+RECOMMENDATION_RECENCY_HALF_LIFE_HOURS = config('RECOMMENDATION_RECENCY_HALF_LIFE_HOURS', default=24, cast=float)
+
+# Trending scores
+TRENDING_WINDOW_HOURS = config('TRENDING_WINDOW_HOURS', default=72, cast=int)
+TRENDING_HALF_LIFE_HOURS = config('TRENDING_HALF_LIFE_HOURS', default=12, cast=float)
+
+# Image sentiment cache (URL -> result, content digest -> result)
+IMAGE_CACHE_MAX_ENTRIES = config('IMAGE_CACHE_MAX_ENTRIES', default=10000, cast=int)
+IMAGE_CACHE_URL_TTL = config('IMAGE_CACHE_URL_TTL', default=7 * 24 * 3600, cast=int)  # seconds
+IMAGE_CACHE_DIGEST_TTL = config('IMAGE_CACHE_DIGEST_TTL', default=30 * 24 * 3600, cast=int)  # seconds
+IMAGE_CACHE_PERSIST = config('IMAGE_CACHE_PERSIST', default=True, cast=bool)
+
+# Model registry (versioned text/image model artifacts, hot-swapped when promoted)
+MODEL_STORE_DIR = config('MODEL_STORE_DIR', default=str(BASE_DIR / 'analyzer' / 'model_store'))
+MODEL_RELOAD_CHECK_SECONDS = config('MODEL_RELOAD_CHECK_SECONDS', default=30, cast=int)
+
+# Text model retraining (admin corrections + confident text/image agreement)
+RETRAIN_MIN_NEW_LABELS = config('RETRAIN_MIN_NEW_LABELS', default=200, cast=int)
+RETRAIN_AGREEMENT_CONFIDENCE = config('RETRAIN_AGREEMENT_CONFIDENCE', default=0.8, cast=float)
+RETRAIN_HOLDOUT_FRACTION = config('RETRAIN_HOLDOUT_FRACTION', default=0.1, cast=float)
+RETRAIN_EPOCHS = config('RETRAIN_EPOCHS', default=3, cast=int)
+RETRAIN_PATIENCE = config('RETRAIN_PATIENCE', default=2, cast=int)
+RETRAIN_THREADS = config('RETRAIN_THREADS', default=2, cast=int)
+RETRAIN_MIN_IMPROVEMENT = config('RETRAIN_MIN_IMPROVEMENT', default=0.0, cast=float)  # accuracy points
 
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
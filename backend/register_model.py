@@ -0,0 +1,62 @@
+"""
+Register a trained model in the local model registry (and optionally promote it)
+
+Usage:
+    python register_model.py text --file sentiment_cnn.pth=analyzer/sentiment_cnn.pth --file vocab.pkl=analyzer/vocab.pkl --promote
+    python register_model.py image --file image_sentiment.pth=analyzer/image_sentiment.pth --promote
+    python register_model.py image --promote-version v20250101120000
+    python register_model.py text --list
+
+Running servers pick up a promoted version in the background, without a restart.
+"""
+
+import os
+import argparse
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from analyzer.model_registry import ModelRegistry
+
+ARTIFACTS = {
+    'text': {'sentiment_cnn.pth', 'vocab.pkl'},
+    'image': {'image_sentiment.pth'},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('name', choices=sorted(ARTIFACTS))
+    parser.add_argument('--file', action='append', default=[], metavar='NAME=PATH', help='Artifact to store')
+    parser.add_argument('--version', help='Version name (default: timestamp)')
+    parser.add_argument('--promote', action='store_true', help='Make the new version current')
+    parser.add_argument('--promote-version', help='Promote an already registered version')
+    parser.add_argument('--list', action='store_true', help='List registered versions')
+    args = parser.parse_args()
+
+    registry = ModelRegistry()
+
+    if args.list:
+        current = registry.current_version(args.name)
+        for version in registry.versions(args.name):
+            marker = '*' if version == current else ' '
+            print(f"{marker} {version}  {registry.metadata(args.name, version).get('created_at', '')}")
+        return
+
+    if args.promote_version:
+        registry.verify(args.name, args.promote_version)
+        registry.promote(args.name, args.promote_version)
+        print(f"Promoted {args.name} {args.promote_version}")
+        return
+
+    artifacts = dict(item.split('=', 1) for item in args.file)
+    if set(artifacts) != ARTIFACTS[args.name]:
+        parser.error(f"{args.name} needs exactly: {', '.join(sorted(ARTIFACTS[args.name]))}")
+
+    version = registry.register(args.name, artifacts, version=args.version, promote=args.promote)
+    print(f"Registered {args.name} {version}{' (current)' if args.promote else ''}")
+
+
+if __name__ == '__main__':
+    main()